@@ -0,0 +1,108 @@
+"""
+Benchmark of replaying a long migration history into a State.
+
+Replays 500 migrations over 300 models, taking a snapshot after every migration like
+MigrationManager does, and reports the time and the peak memory of the replay.
+
+Usage:
+    python -m benchmarks.state_snapshots [--migrations 500] [--models 300] [--deepcopy]
+
+With --deepcopy, every snapshot deep-copies the schema instead, which shows the cost
+of snapshots that don't share the unchanged models.
+"""
+
+import argparse
+import copy
+import random
+import time
+import tracemalloc
+
+from tortoise.fields import BooleanField, CharField, DatetimeField, IntField, TextField
+
+from tortoise_pathway.operations import AddField, AlterField, CreateModel, Operation
+from tortoise_pathway.state import State
+
+
+def generate_migrations(migrations: int, models: int) -> list[list[Operation]]:
+    rnd = random.Random(42)
+    history: list[list[Operation]] = []
+
+    # the first migrations create the models, 10 models per migration
+    for start in range(0, models, 10):
+        history.append(
+            [
+                CreateModel(
+                    model=f"app.Model{i}",
+                    table=f"model_{i}",
+                    fields={
+                        "id": IntField(primary_key=True),
+                        "name": CharField(max_length=100),
+                        "description": TextField(null=True),
+                        "is_active": BooleanField(default=True),
+                        "created_at": DatetimeField(auto_now_add=True),
+                    },
+                )
+                for i in range(start, min(start + 10, models))
+            ]
+        )
+
+    # the rest add and alter fields of random models
+    while len(history) < migrations:
+        i = rnd.randrange(models)
+        history.append(
+            [
+                AddField(
+                    model=f"app.Model{i}",
+                    field_object=CharField(max_length=50, null=True),
+                    field_name=f"field_{len(history)}",
+                ),
+                AlterField(
+                    model=f"app.Model{i}",
+                    field_object=CharField(max_length=rnd.randrange(100, 200)),
+                    field_name="name",
+                ),
+            ]
+        )
+
+    return history
+
+
+def replay(history: list[list[Operation]], deepcopy: bool) -> list:
+    state = State()
+    snapshots = []
+    for n, operations in enumerate(history):
+        for operation in operations:
+            state.apply_operation(operation)
+        if deepcopy:
+            snapshots.append(copy.deepcopy(state.get_schema()))
+        else:
+            state.snapshot(f"migration_{n}")
+    return [state, snapshots]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--migrations", type=int, default=500)
+    parser.add_argument("--models", type=int, default=300)
+    parser.add_argument("--deepcopy", action="store_true")
+    args = parser.parse_args()
+
+    history = generate_migrations(args.migrations, args.models)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = replay(history, args.deepcopy)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    mode = "deepcopy" if args.deepcopy else "shared"
+    print(
+        f"{mode}: {len(history)} migrations over {args.models} models, "
+        f"{elapsed:.2f}s, peak memory {peak / 1024 / 1024:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
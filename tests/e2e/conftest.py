@@ -40,6 +40,8 @@ async def clean_migrations():
             if item.is_file() and item.name != "__init__.py" and "donotdelete" not in item.name:
                 print(f"Removing migration file: {item}")
                 item.unlink()
+        for item in test_migrations_dir.glob("*/migrations/*/manifest.json"):
+            item.unlink()
 
     _cleanup()
 
@@ -2,11 +2,19 @@
 Tests for application with applied migrations.
 """
 
+import os
+
 import pytest
 from pathlib import Path
+from unittest.mock import patch
 
 from tortoise import Tortoise
-from tortoise_pathway.migration_manager import MigrationManager
+from tortoise.exceptions import IntegrityError, OperationalError
+from tortoise.fields import IntField
+from tortoise.fields.relational import ManyToManyFieldInstance
+from tortoise_pathway.migration import Migration
+from tortoise_pathway.migration_manager import MigrationManager, tool_version
+from tortoise_pathway.operations import AddField, CreateModel, RunSQL
 
 
 @pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
@@ -56,3 +64,379 @@ async def test_applied_migrations(setup_test_db):
     assert len(new_manager.migrations) == 1
     assert len(new_manager.get_applied_migrations()) == 1
     assert len(new_manager.get_pending_migrations()) == 0
+
+
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_check_applied_state(setup_test_db):
+    """Test checking the recorded state against the fingerprints of the migrations."""
+    test_dir = Path(__file__).parent
+    migrations_dir = test_dir / "migrations"
+    app_names = ["test_applied_migrations"]
+
+    # the fingerprints are computed without a database, e.g. at build time
+    build_manager = MigrationManager(app_names=app_names, migrations_dir=str(migrations_dir))
+    build_manager.load_migrations()
+    expected = build_manager.get_fingerprints()
+    assert expected["test_applied_migrations"]["head"] == "20240401000000_initial_donotdelete"
+
+    # nothing is recorded before the migrations are applied
+    checker = MigrationManager(app_names=app_names, migrations_dir=str(migrations_dir))
+    assert await checker.check(expected) == ["test_applied_migrations"]
+
+    manager = MigrationManager(app_names=app_names, migrations_dir=str(migrations_dir))
+    await manager.initialize()
+    async for _ in manager.apply_migrations():
+        pass
+
+    assert await checker.check(expected) == []
+    assert checker.migrations == []
+
+    await manager.revert_migration(app="test_applied_migrations")
+    assert await checker.check(expected) == ["test_applied_migrations"]
+
+
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_apply_optimized(setup_test_db):
+    """Test applying the optimized operations of the pending migrations."""
+    migrations_dir = Path(__file__).parent / "migrations"
+
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(migrations_dir),
+    )
+    await manager.initialize()
+
+    applied = [migration async for migration in manager.apply_migrations(optimize=True)]
+    assert len(applied) == 1
+    assert len(manager.get_pending_migrations()) == 0
+
+    conn = Tortoise.get_connection("default")
+    await conn.execute_query("SELECT * FROM products")
+    await conn.execute_query("SELECT * FROM categories")
+
+    # the applied state is the same as without the optimization
+    assert manager.applied_state.fingerprint() == manager.migration_state.fingerprint()
+
+
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_bootstrap(setup_test_db):
+    """Test creating the schema from the final state instead of applying the migrations."""
+    migrations_dir = Path(__file__).parent / "migrations"
+
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(migrations_dir),
+    )
+    await manager.initialize()
+
+    assert "CREATE TABLE" in manager.get_bootstrap_sql()
+
+    migrations = await manager.bootstrap()
+    assert len(migrations) == 1
+    assert len(manager.get_pending_migrations()) == 0
+
+    conn = Tortoise.get_connection("default")
+    await conn.execute_query("SELECT * FROM products")
+    await conn.execute_query("SELECT * FROM categories")
+
+    # a restarted manager sees all migrations as applied
+    new_manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(migrations_dir),
+    )
+    await new_manager.initialize()
+    assert len(new_manager.get_pending_migrations()) == 0
+    assert new_manager.applied_state.fingerprint() == new_manager.migration_state.fingerprint()
+
+    # only new databases can be bootstrapped
+    with pytest.raises(ValueError, match="already has applied migrations"):
+        await new_manager.bootstrap()
+
+
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_record_migrations(setup_test_db):
+    """Test recording migrations with one parameterized INSERT."""
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(Path(__file__).parent / "migrations"),
+    )
+    await manager.initialize()
+
+    class Squashed(Migration):
+        dependencies = []
+        replaces = [("other", "0001_a'b"), ("other", "0002_c")]
+        operations = []
+
+    Squashed.app_name = "other"
+    squashed_name = Squashed.name()
+
+    conn = Tortoise.get_connection("default")
+    with patch.object(conn, "execute_query", wraps=conn.execute_query) as execute_query:
+        recorded = await manager.record_migrations([Squashed])
+
+    assert execute_query.call_count == 1
+    # the replaced migrations are recorded before the migration that replaces them
+    assert list(recorded) == [("other", "0001_a'b"), ("other", "0002_c"), ("other", squashed_name)]
+    timestamps = list(recorded.values())
+    assert timestamps == sorted(set(timestamps))
+    assert ("other", squashed_name) in manager.applied_migrations
+
+    _, records = await conn.execute_query(
+        "SELECT name FROM tortoise_migrations WHERE app = 'other' ORDER BY applied_at"
+    )
+    assert [record["name"] for record in records] == ["0001_a'b", "0002_c", squashed_name]
+
+
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_upgrade_migration_table(setup_test_db):
+    """Test upgrading a migration table of an older version."""
+    conn = Tortoise.get_connection("default")
+    await conn.execute_script(
+        """
+        CREATE TABLE tortoise_migrations (
+            app VARCHAR(100) NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+        """
+    )
+    # older versions could record a migration twice
+    for applied_at in ["2024-04-01T00:00:00", "2024-04-02T00:00:00"]:
+        await conn.execute_query(
+            "INSERT INTO tortoise_migrations (app, name, applied_at) VALUES (?, ?, ?)",
+            ["test_applied_migrations", "20240401000000_initial_donotdelete", applied_at],
+        )
+
+    for _ in range(2):
+        # the upgrade is idempotent
+        manager = MigrationManager(
+            app_names=["test_applied_migrations"],
+            migrations_dir=str(Path(__file__).parent / "migrations"),
+        )
+        await manager.initialize()
+        assert len(manager.get_pending_migrations()) == 0
+
+    _, records = await conn.execute_query(
+        "SELECT app, name, applied_at, checksum, duration_ms, tool_version FROM tortoise_migrations"
+    )
+    assert [dict(record) for record in records] == [
+        {
+            "app": "test_applied_migrations",
+            "name": "20240401000000_initial_donotdelete",
+            "applied_at": "2024-04-01T00:00:00",
+            "checksum": None,
+            "duration_ms": None,
+            "tool_version": None,
+        }
+    ]
+    _, indexes = await conn.execute_query("PRAGMA index_list(tortoise_migrations)")
+    assert {index["name"] for index in indexes} >= {"idx_tortoise_migrations_applied_at"}
+
+
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_migration_history(setup_test_db):
+    """Test that the checksum, the duration and the tool version are recorded."""
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(Path(__file__).parent / "migrations"),
+    )
+    await manager.initialize()
+    [migration] = [migration async for migration in manager.apply_migrations()]
+
+    conn = Tortoise.get_connection("default")
+    _, records = await conn.execute_query(
+        "SELECT checksum, duration_ms, tool_version FROM tortoise_migrations"
+    )
+    assert len(records) == 1
+    assert records[0]["checksum"] == migration.checksum()
+    assert records[0]["duration_ms"] >= 0
+    assert records[0]["tool_version"] == tool_version()
+
+    # the records are keyed by app and name
+    with pytest.raises(IntegrityError):
+        await manager.record_migrations([migration])
+
+
+def make_migration(name: str, operations: list, atomic: bool = True) -> type[Migration]:
+    return type(
+        "Migration",
+        (Migration,),
+        {
+            "__module__": f"migrations.test_applied_migrations.{name}",
+            "app_name": "test_applied_migrations",
+            "dependencies": [],
+            "operations": operations,
+            "atomic": atomic,
+        },
+    )
+
+
+async def table_exists(table: str) -> bool:
+    conn = Tortoise.get_connection("default")
+    _, records = await conn.execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [table]
+    )
+    return bool(records)
+
+
+@pytest.mark.skipif(
+    "TORTOISE_TEST_DB" in os.environ, reason="checks the tables of the SQLite database"
+)
+@pytest.mark.parametrize(
+    "transaction, atomic, applied, created",
+    [
+        # the failing migration is rolled back, the previous one is committed
+        ("migration", True, 1, False),
+        # the whole batch is rolled back
+        ("batch", True, 0, False),
+        # nothing is rolled back
+        ("none", True, 1, True),
+        ("migration", False, 1, True),
+    ],
+)
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_transaction_modes(setup_test_db, transaction, atomic, applied, created):
+    """Test that the operations of a failing migration are rolled back in a transaction."""
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(Path(__file__).parent / "migrations"),
+    )
+    await manager.initialize()
+    broken = make_migration(
+        "20240402000000_broken",
+        [RunSQL("CREATE TABLE created (id INT); INSERT INTO created VALUES (1)"), RunSQL("BROKEN")],
+        atomic=atomic,
+    )
+    manager.migrations.append(broken)
+    fingerprint = manager.applied_state.fingerprint()
+
+    migrations = []
+    with pytest.raises(OperationalError):
+        async for migration in manager.apply_migrations(transaction=transaction):
+            migrations.append(migration)
+
+    assert len(migrations) == applied
+    assert await table_exists("products") == bool(applied)
+    assert await table_exists("created") == created
+    assert len(manager.get_applied_migrations()) == applied
+    if not applied:
+        assert manager.applied_state.fingerprint() == fingerprint
+
+    # the database has the same migrations recorded as the manager
+    new_manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(Path(__file__).parent / "migrations"),
+    )
+    await new_manager.initialize()
+    assert new_manager.applied_migrations == manager.applied_migrations
+
+
+async def columns(table: str) -> set[str]:
+    conn = Tortoise.get_connection("default")
+    _, records = await conn.execute_query(f"PRAGMA table_info({table})")
+    return {record["name"] for record in records}
+
+
+@pytest.mark.skipif(
+    os.environ.get("TORTOISE_TEST_DB", "sqlite").startswith("postgres"),
+    reason="inspects the SQLite schema",
+)
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_bootstrap_many_to_many(setup_test_db):
+    """Test that a many-to-many field is bootstrapped like the migrations create it."""
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(Path(__file__).parent / "migrations"),
+    )
+    await manager.initialize()
+    manager.migrations = [
+        make_migration(
+            "20240401000000_tags",
+            [
+                CreateModel(
+                    "test_applied_migrations.Article",
+                    "article",
+                    {"id": IntField(primary_key=True)},
+                ),
+                CreateModel(
+                    "test_applied_migrations.Tag", "tag", {"id": IntField(primary_key=True)}
+                ),
+                AddField(
+                    "test_applied_migrations.Article",
+                    ManyToManyFieldInstance(
+                        "test_applied_migrations.Tag",
+                        related_name="articles",
+                        through="article_tag",
+                        null=True,
+                    ),
+                    "tags",
+                ),
+            ],
+        )
+    ]
+    manager._rebuild_state()
+
+    await manager.bootstrap()
+
+    # the field is added once, the other side of the relation has no column
+    assert await columns("article") == {"id", "tags_id"}
+    assert await columns("tag") == {"id"}
+    assert len(manager.get_pending_migrations()) == 0
+
+
+@pytest.mark.skipif(
+    os.environ.get("TORTOISE_TEST_DB", "sqlite").startswith("postgres"),
+    reason="inspects the SQLite schema",
+)
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_bootstrap_rolls_back(setup_test_db):
+    """Test that a failing bootstrap leaves no tables and no records behind."""
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(Path(__file__).parent / "migrations"),
+    )
+    await manager.initialize()
+    manager.migrations.append(make_migration("20240402000000_broken", [RunSQL("BROKEN")]))
+
+    with pytest.raises(OperationalError):
+        await manager.bootstrap(run_sql=True)
+
+    assert not await table_exists("products")
+    assert manager.applied_migrations == set()
+    conn = Tortoise.get_connection("default")
+    _, records = await conn.execute_query("SELECT * FROM tortoise_migrations")
+    assert records == []
+
+
+@pytest.mark.parametrize("tortoise_config", ["test_applied_migrations"], indirect=True)
+async def test_revert_migration_by_name(setup_test_db):
+    """Test that a migration is reverted by its name alone, which is looked up in the apps."""
+    migrations_dir = Path(__file__).parent / "migrations"
+    manager = MigrationManager(
+        app_names=["test_applied_migrations"],
+        migrations_dir=str(migrations_dir),
+    )
+    await manager.initialize()
+    async for _ in manager.apply_migrations():
+        pass
+
+    with pytest.raises(ValueError, match="not found"):
+        await manager.revert_migration(migration_name="20240401000000_missing")
+
+    reverted = await manager.revert_migration(
+        migration_name="20240401000000_initial_donotdelete"
+    )
+    assert reverted.app_name == "test_applied_migrations"
+    assert manager.get_applied_migrations() == []
+
+    # the same name in two apps needs the app
+    class OtherMigration(Migration):
+        app_name = "other_app"
+
+        @classmethod
+        def name(cls) -> str:
+            return "20240401000000_initial_donotdelete"
+
+    manager.migrations.append(OtherMigration)
+    with pytest.raises(ValueError, match="several apps"):
+        await manager.revert_migration(migration_name="20240401000000_initial_donotdelete")
@@ -150,3 +150,36 @@ class TestPostgresDialect:
         )
 
         assert sql == expected_sql
+
+    def test_add_foreign_key_online(self):
+        """Test that an online foreign key is added as NOT VALID and validated separately."""
+        state = State(
+            schema={
+                "test": {
+                    "models": {
+                        "TestModel": {"table": "test_table"},
+                        "Category": {"table": "categories"},
+                    }
+                }
+            },
+        )
+
+        operation = AddField(
+            model="test.TestModel",
+            field_object=fields.ForeignKeyField(
+                "test.Category", related_name="test_models", null=True
+            ),
+            field_name="category",
+            online=True,
+        )
+        assert not operation.atomic
+
+        sql = operation.forward_sql(state=state, schema_manager=PostgresSchemaManager())
+
+        assert sql == (
+            "ALTER TABLE test_table ADD COLUMN IF NOT EXISTS category_id INT;\n"
+            "ALTER TABLE test_table DROP CONSTRAINT IF EXISTS fk_test_table_category_id;\n"
+            "ALTER TABLE test_table ADD CONSTRAINT fk_test_table_category_id "
+            "FOREIGN KEY (category_id) REFERENCES categories(id) NOT VALID;\n"
+            "ALTER TABLE test_table VALIDATE CONSTRAINT fk_test_table_category_id;"
+        )
@@ -2,10 +2,13 @@
 Tests for AddIndex operation.
 """
 
+from unittest.mock import AsyncMock, Mock
+
 from tortoise import Tortoise, fields
 from tortoise.indexes import Index
 from tortoise_pathway.operations import CreateModel, AddIndex
 from tortoise_pathway.schema.postgres import PostgresSchemaManager
+from tortoise_pathway.schema.sqlite import SqliteSchemaManager
 from tortoise_pathway.state import State
 
 
@@ -85,3 +88,76 @@ def test_forward_sql_with_custom_index_type():
         forward_sql
         == "CREATE INDEX idx_test_model_name_description ON test_index_type (name, description) USING BLOOM"
     )
+
+
+async def test_add_index_concurrently(setup_test_db):
+    """Test AddIndex operation that builds the index concurrently."""
+    state = State()
+
+    create_op = CreateModel(
+        model="tests.TestModel",
+        table="test_add_index_concurrently",
+        fields={
+            "id": fields.IntField(primary_key=True),
+            "name": fields.CharField(max_length=100),
+        },
+    )
+    await create_op.apply(state=state)
+    state.apply_operation(create_op)
+
+    operation = AddIndex(
+        model="tests.TestModel",
+        index=Index(name="idx_test_model_name", fields=["name"]),
+        concurrently=True,
+    )
+    assert not operation.atomic
+    await operation.apply(state=state)
+
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "sqlite":
+        indices = await conn.execute_query(
+            "SELECT name FROM sqlite_master WHERE type='index' "
+            "AND tbl_name='test_add_index_concurrently'"
+        )
+        assert "idx_test_model_name" in [index["name"] for index in indices[1]]
+
+    assert (
+        operation.forward_sql(state, PostgresSchemaManager())
+        == "CREATE INDEX CONCURRENTLY idx_test_model_name ON test_add_index_concurrently (name)"
+    )
+    assert (
+        operation.backward_sql(state, PostgresSchemaManager())
+        == "DROP INDEX CONCURRENTLY IF EXISTS idx_test_model_name"
+    )
+    # SQLite doesn't lock the table the way PostgreSQL does, the index is built normally
+    assert (
+        operation.forward_sql(state, SqliteSchemaManager())
+        == "CREATE INDEX idx_test_model_name ON test_add_index_concurrently (name)"
+    )
+    assert "    concurrently=True," in operation.to_migration()
+
+
+async def test_add_index_concurrently_drops_invalid_index():
+    """Test that an invalid index left by a failed concurrent build is dropped first."""
+    connection = Mock()
+    connection.capabilities.dialect = "postgres"
+    connection.execute_query = AsyncMock(return_value=(1, [{"?column?": 1}]))
+    connection.execute_script = AsyncMock()
+
+    operation = AddIndex(
+        model="tests.TestModel",
+        index=Index(name="idx_test_model_name", fields=["name"]),
+        concurrently=True,
+    )
+    await operation.prepare(State(), connection)
+
+    assert "idx_test_model_name" in connection.execute_query.await_args.args[0]
+    connection.execute_script.assert_awaited_once_with(
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_test_model_name"
+    )
+
+    # a valid or missing index is left alone
+    connection.execute_query.return_value = (0, [])
+    connection.execute_script.reset_mock()
+    await operation.prepare(State(), connection)
+    connection.execute_script.assert_not_awaited()
@@ -3,6 +3,8 @@ Tests for AlterField operation.
 """
 
 from enum import Enum
+from unittest.mock import AsyncMock, Mock
+
 from tortoise import fields
 from tortoise.fields.data import CharEnumFieldInstance
 from tortoise_pathway.operations import AlterField
@@ -46,7 +48,7 @@ class TestSqliteDialect:
         sql = operation.forward_sql(state=state, schema_manager=SqliteSchemaManager())
         assert (
             sql
-            == """BEGIN TRANSACTION;
+            == """SAVEPOINT alter_field;
 CREATE TABLE "__new__test_table" (
     name VARCHAR(50)
 );;
@@ -54,7 +56,7 @@ INSERT INTO __new__test_table (name)
 SELECT name FROM test_table;
 DROP TABLE test_table;
 ALTER TABLE __new__test_table RENAME TO test_table;
-COMMIT;"""
+RELEASE SAVEPOINT alter_field;"""
         )
 
     def test_alter_field_default(self):
@@ -83,7 +85,7 @@ COMMIT;"""
         sql = operation.forward_sql(state=state, schema_manager=SqliteSchemaManager())
         assert (
             sql
-            == """BEGIN TRANSACTION;
+            == """SAVEPOINT alter_field;
 CREATE TABLE "__new__test_table" (
     count INT NOT NULL DEFAULT 10
 );;
@@ -91,7 +93,7 @@ INSERT INTO __new__test_table (count)
 SELECT count FROM test_table;
 DROP TABLE test_table;
 ALTER TABLE __new__test_table RENAME TO test_table;
-COMMIT;"""
+RELEASE SAVEPOINT alter_field;"""
         )
 
 
@@ -124,6 +126,33 @@ class TestPostgresDialect:
         sql = operation.forward_sql(state=state, schema_manager=PostgresSchemaManager())
         assert sql == "ALTER TABLE test_table ALTER COLUMN count TYPE BIGINT;"
 
+    def test_backward_change_type(self):
+        """Test SQL generation for reverting a field type change in PostgreSQL."""
+        state = State(
+            schema={
+                "test": {
+                    "models": {
+                        "TestModel": {
+                            "table": "test_table",
+                            "fields": {"count": fields.IntField()},
+                        }
+                    }
+                }
+            },
+        )
+        state.snapshot("0001_initial")
+
+        operation = AlterField(
+            model="test.TestModel",
+            field_object=fields.BigIntField(),
+            field_name="count",
+        )
+        state.apply_operation(operation)
+        state.snapshot("0002_count_bigint")
+
+        sql = operation.backward_sql(state=state, schema_manager=PostgresSchemaManager())
+        assert sql == "ALTER TABLE test_table ALTER COLUMN count TYPE INT;"
+
     def test_change_default(self):
         """Test SQL generation for altering a field's default value in PostgreSQL."""
         # Create state with proper model and field with default
@@ -335,6 +364,61 @@ ALTER TABLE test_table ADD CONSTRAINT count_key UNIQUE (count);"""
 )"""
         )
 
+    def test_set_not_null_online(self):
+        """Test that an online AlterField validates a check before setting NOT NULL."""
+        state = State(
+            schema={
+                "test": {
+                    "models": {
+                        "TestModel": {
+                            "table": "test_table",
+                            "fields": {"name": fields.CharField(max_length=100, null=True)},
+                        }
+                    }
+                }
+            },
+        )
+
+        operation = AlterField(
+            model="test.TestModel",
+            field_object=fields.CharField(max_length=100),
+            field_name="name",
+            online=True,
+        )
+        assert not operation.atomic
+        assert "    online=True," in operation.to_migration()
+
+        sql = operation.forward_sql(state=state, schema_manager=PostgresSchemaManager())
+        assert sql == (
+            "ALTER TABLE test_table DROP CONSTRAINT IF EXISTS test_table_name_not_null;\n"
+            "ALTER TABLE test_table ADD CONSTRAINT test_table_name_not_null "
+            "CHECK (name IS NOT NULL) NOT VALID;\n"
+            "ALTER TABLE test_table VALIDATE CONSTRAINT test_table_name_not_null;\n"
+            "ALTER TABLE test_table ALTER COLUMN name SET NOT NULL;\n"
+            "ALTER TABLE test_table DROP CONSTRAINT test_table_name_not_null;"
+        )
+
+    async def test_online_statements_run_one_by_one(self):
+        """Test that the statements of an online AlterField are committed one by one."""
+        connection = Mock()
+        connection.capabilities.dialect = "postgres"
+        connection.execute_script = AsyncMock()
+
+        operation = AlterField(
+            model="test.TestModel",
+            field_object=fields.CharField(max_length=100),
+            field_name="name",
+            online=True,
+        )
+        await operation._execute(
+            connection, "ALTER TABLE a VALIDATE CONSTRAINT c;\nALTER TABLE a DROP CONSTRAINT c;"
+        )
+
+        assert [call.args[0] for call in connection.execute_script.await_args_list] == [
+            "ALTER TABLE a VALIDATE CONSTRAINT c;",
+            "ALTER TABLE a DROP CONSTRAINT c;",
+        ]
+
     def test_char_to_enum(self):
         """Test converting CharField to CharEnumField in PostgreSQL.
 
@@ -0,0 +1,191 @@
+"""
+Tests for BackfillField operation.
+"""
+
+import itertools
+
+import pytest
+from tortoise import Tortoise, fields
+
+from tortoise_pathway.operations import BackfillField, CreateModel
+from tortoise_pathway.schema.postgres import PostgresSchemaManager
+from tortoise_pathway.state import State
+
+counter = itertools.count(1)
+
+
+def next_code() -> str:
+    return f"code-{next(counter)}"
+
+
+async def create_table(state: State, rows: int) -> None:
+    create_op = CreateModel(
+        model="tests.TestModel",
+        table="test_backfill",
+        fields={
+            "id": fields.IntField(primary_key=True),
+            "name": fields.CharField(max_length=100),
+        },
+    )
+    await create_op.apply(state=state)
+    state.apply_operation(create_op)
+
+    conn = Tortoise.get_connection("default")
+    for i in range(rows):
+        await conn.execute_query(f"INSERT INTO test_backfill (id, name) VALUES ({i + 1}, 'n{i}')")
+
+
+async def test_backfill_field(setup_test_db):
+    """Test that the rows are filled in batches and the column is made NOT NULL."""
+    state = State()
+    await create_table(state, rows=5)
+
+    operation = BackfillField(
+        model="tests.TestModel",
+        field_object=fields.CharField(max_length=20),
+        field_name="code",
+        default=next_code,
+        batch_size=2,
+    )
+    assert not operation.atomic
+    await operation.apply(state=state)
+    state.apply_operation(operation)
+
+    conn = Tortoise.get_connection("default")
+    _, rows = await conn.execute_query("SELECT code FROM test_backfill ORDER BY id")
+    codes = [row["code"] for row in rows]
+    # the callable is called for every row
+    assert len(set(codes)) == 5
+    assert all(code.startswith("code-") for code in codes)
+
+    _, columns = await conn.execute_query("PRAGMA table_info(test_backfill)")
+    assert {column["name"]: column["notnull"] for column in columns}["code"] == 1
+
+
+async def test_backfill_resumes(setup_test_db):
+    """Test that an interrupted backfill only fills the rows that are left."""
+    state = State()
+    await create_table(state, rows=3)
+
+    conn = Tortoise.get_connection("default")
+    # the column was added and the first row filled before the interruption
+    await conn.execute_script("ALTER TABLE test_backfill ADD COLUMN code VARCHAR(20)")
+    await conn.execute_query("UPDATE test_backfill SET code = 'done' WHERE id = 1")
+
+    operation = BackfillField(
+        model="tests.TestModel",
+        field_object=fields.CharField(max_length=20, default="new"),
+        field_name="code",
+    )
+    await operation.apply(state=state)
+
+    _, rows = await conn.execute_query("SELECT code FROM test_backfill ORDER BY id")
+    assert [row["code"] for row in rows] == ["done", "new", "new"]
+
+
+def test_forward_sql():
+    """Test SQL generation and the code of the operation in a migration."""
+    state = State(
+        schema={
+            "test": {
+                "models": {
+                    "TestModel": {
+                        "table": "test_table",
+                        "fields": {"id": fields.IntField(primary_key=True)},
+                    }
+                }
+            }
+        },
+    )
+
+    operation = BackfillField(
+        model="test.TestModel",
+        field_object=fields.CharField(max_length=20),
+        field_name="code",
+        default=next_code,
+        batch_size=500,
+    )
+
+    sql = operation.forward_sql(state=state, schema_manager=PostgresSchemaManager())
+    assert sql.startswith(
+        "ALTER TABLE test_table ADD COLUMN code VARCHAR(20);\n"
+        "-- test_table.code is filled in batches of 500 rows\n"
+    )
+    assert sql.endswith(
+        "ALTER TABLE test_table ALTER COLUMN code SET NOT NULL;\n"
+        "ALTER TABLE test_table DROP CONSTRAINT test_table_code_not_null;"
+    )
+    assert "CHECK (code IS NOT NULL) NOT VALID" in sql
+
+    migration = operation.to_migration()
+    assert "    default=next_code," in migration
+    assert "    batch_size=500," in migration
+
+
+def test_invalid_fields():
+    """Test that fields that can't be backfilled are rejected."""
+    with pytest.raises(ValueError, match="Nullable"):
+        BackfillField("test.TestModel", fields.CharField(max_length=20, null=True), "code")
+
+    with pytest.raises(ValueError, match="no default"):
+        BackfillField("test.TestModel", fields.CharField(max_length=20), "code")
+
+
+async def test_backfill_constant_default(setup_test_db):
+    """Test that a constant default fills the rows of every batch at once."""
+    state = State()
+    await create_table(state, rows=5)
+
+    operation = BackfillField(
+        model="tests.TestModel",
+        field_object=fields.CharField(max_length=20),
+        field_name="code",
+        default="fixed",
+        batch_size=2,
+    )
+    await operation.apply(state=state)
+    state.apply_operation(operation)
+
+    conn = Tortoise.get_connection("default")
+    _, rows = await conn.execute_query("SELECT code FROM test_backfill ORDER BY id")
+    assert [row["code"] for row in rows] == ["fixed"] * 5
+    assert state.get_field("tests", "TestModel", "code").default == "fixed"
+
+
+def test_lambda_default():
+    """Test that a default that can't be imported by a migration is rejected."""
+    operation = BackfillField(
+        model="test.TestModel",
+        field_object=fields.CharField(max_length=20),
+        field_name="code",
+        default=lambda: "x",
+    )
+
+    with pytest.raises(ValueError, match="module level"):
+        operation.to_migration()
+
+
+def test_state_keeps_callable_default():
+    """Test that the state has the default of the operation, not the field of the migration."""
+    state = State(
+        schema={
+            "test": {
+                "models": {
+                    "TestModel": {
+                        "table": "test_table",
+                        "fields": {"id": fields.IntField(primary_key=True)},
+                    }
+                }
+            }
+        },
+    )
+    state.apply_operation(
+        BackfillField(
+            model="test.TestModel",
+            field_object=fields.CharField(max_length=20),
+            field_name="code",
+            default=next_code,
+        )
+    )
+
+    assert state.get_field("test", "TestModel", "code").default is next_code
@@ -75,3 +75,50 @@ async def test_drop_index(setup_test_db):
         )
         index_names = [index["name"] for index in indices[1]]
         assert "idx_test_model_name" not in index_names
+
+
+def test_drop_index_concurrently():
+    """Test DropIndex operation that drops the index concurrently."""
+    state = State()
+    state.apply_operation(
+        CreateModel(
+            model="tests.TestModel",
+            table="test_drop_index",
+            fields={
+                "id": fields.IntField(primary_key=True),
+                "name": fields.CharField(max_length=100),
+            },
+        )
+    )
+    state.apply_operation(
+        AddIndex(
+            model="tests.TestModel",
+            index=Index(name="idx_test_model_name", fields=["name"]),
+        )
+    )
+    state.snapshot("index_added")
+
+    operation = DropIndex(
+        model="tests.TestModel",
+        index_name="idx_test_model_name",
+        concurrently=True,
+    )
+    assert not operation.atomic
+    assert (
+        operation.forward_sql(state=state, schema_manager=PostgresSchemaManager())
+        == "DROP INDEX CONCURRENTLY IF EXISTS idx_test_model_name"
+    )
+
+    state.apply_operation(operation)
+    state.snapshot("index_dropped")
+    assert (
+        operation.backward_sql(state=state, schema_manager=PostgresSchemaManager())
+        == "CREATE INDEX CONCURRENTLY idx_test_model_name ON test_drop_index (name)"
+    )
+    assert operation.to_migration() == (
+        "DropIndex(\n"
+        '    model="tests.TestModel",\n'
+        '    index_name="idx_test_model_name",\n'
+        "    concurrently=True,\n"
+        ")"
+    )
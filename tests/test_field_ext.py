@@ -0,0 +1,106 @@
+"""
+Tests for the FieldSpec class.
+"""
+
+import pickle
+from enum import Enum, IntEnum
+
+import pytest
+from tortoise.fields import (
+    BooleanField,
+    CharEnumField,
+    CharField,
+    DatetimeField,
+    DecimalField,
+    ForeignKeyField,
+    IntEnumField,
+    IntField,
+    ManyToManyField,
+    OneToOneField,
+    TextField,
+)
+
+from tortoise_pathway.field_ext import FieldSpec, field_to_migration
+
+
+class Color(Enum):
+    RED = "red"
+    GREEN = "green"
+
+
+class Priority(IntEnum):
+    LOW = 1
+    HIGH = 2
+
+
+FIELDS = [
+    IntField(primary_key=True),
+    CharField(max_length=100, null=True, unique=True, description="Name"),
+    CharField(max_length=50, db_index=True, source_field="custom_column"),
+    TextField(null=True),
+    BooleanField(default=True),
+    DecimalField(max_digits=10, decimal_places=2, default=0),
+    DatetimeField(auto_now_add=True),
+    DatetimeField(auto_now=True),
+    CharEnumField(Color, default=Color.RED),
+    IntEnumField(Priority),
+    ForeignKeyField("models.User", related_name="posts", on_delete="SET NULL", null=True),
+    OneToOneField("models.User", related_name="profile"),
+    ManyToManyField("models.Tag", related_name="posts", through="post_tags"),
+]
+
+
+@pytest.mark.parametrize("field", FIELDS)
+def test_field_round_trip(field):
+    """Test that a Field created from a spec is described by the same spec."""
+    spec = FieldSpec.from_field(field)
+    rebuilt = spec.to_field()
+
+    assert isinstance(rebuilt, field.__class__)
+    assert rebuilt is not field
+    assert FieldSpec.from_field(rebuilt) == spec
+    assert field_to_migration(spec) == field_to_migration(field)
+
+
+def test_equality_and_hash():
+    """Test that specs are compared by value."""
+    spec = FieldSpec.from_field(CharField(max_length=100))
+
+    assert spec == FieldSpec.from_field(CharField(max_length=100))
+    assert hash(spec) == hash(FieldSpec.from_field(CharField(max_length=100)))
+    assert spec != FieldSpec.from_field(CharField(max_length=200))
+    assert spec != FieldSpec.from_field(TextField())
+    assert len({spec, FieldSpec.from_field(CharField(max_length=100))}) == 1
+
+    # unhashable defaults don't make the spec unhashable
+    hash(FieldSpec.from_field(CharField(max_length=100, default=[])))
+
+
+def test_attribute_access():
+    """Test that the attributes are accessible like on the field."""
+    spec = FieldSpec.from_field(CharField(max_length=100, null=True))
+
+    assert spec.field_class is CharField
+    assert spec.max_length == 100
+    assert spec.null is True
+    assert not hasattr(spec, "max_digits")
+    assert getattr(spec, "auto_now", False) is False
+
+
+def test_spec_is_immutable():
+    """Test that a spec can only be changed by creating a new one."""
+    spec = FieldSpec.from_field(CharField(max_length=100))
+
+    with pytest.raises(AttributeError):
+        spec.max_length = 200
+
+    renamed = spec.replace(source_field="name_column")
+    assert renamed.source_field == "name_column"
+    assert spec.source_field is None
+
+
+def test_pickle():
+    """Test that specs survive pickling."""
+    spec = FieldSpec.from_field(CharEnumField(Color, default=Color.GREEN))
+
+    assert pickle.loads(pickle.dumps(spec)) == spec
@@ -0,0 +1,122 @@
+"""
+Tests for the fingerprints of schemas and states.
+"""
+
+from unittest.mock import patch
+
+from tortoise.fields import CharField, IntField, TextField
+from tortoise.indexes import Index
+
+from tortoise_pathway.fingerprint import hash_model, hash_schema
+from tortoise_pathway.operations import AddIndex, AlterField, CreateModel
+from tortoise_pathway.schema_differ import SchemaDiffer
+from tortoise_pathway.state import State
+
+
+def make_state() -> State:
+    state = State()
+    state.apply_operation(
+        CreateModel(
+            model="blog.User",
+            table="users",
+            fields={
+                "id": IntField(primary_key=True),
+                "name": CharField(max_length=100),
+            },
+        )
+    )
+    state.apply_operation(
+        CreateModel(
+            model="blog.Post",
+            table="posts",
+            fields={
+                "id": IntField(primary_key=True),
+                "body": TextField(null=True),
+            },
+        )
+    )
+    state.apply_operation(
+        AddIndex(model="blog.User", index=Index(fields=["name"], name="idx_users_name"))
+    )
+    state.snapshot("0001_initial")
+    return state
+
+
+def make_model_schema() -> dict:
+    return {
+        "blog": {
+            "models": {
+                "Post": {
+                    "table": "posts",
+                    # the order of the fields doesn't matter
+                    "fields": {
+                        "body": TextField(null=True),
+                        "id": IntField(primary_key=True),
+                    },
+                    "indexes": {},
+                },
+                "User": {
+                    "table": "users",
+                    "fields": {
+                        "id": IntField(primary_key=True),
+                        "name": CharField(max_length=100),
+                    },
+                    "indexes": {
+                        "idx_users_name": Index(fields=["name"], name="idx_users_name"),
+                    },
+                },
+            }
+        },
+        "empty": {"models": {}},
+    }
+
+
+def test_state_and_model_schema_fingerprints_match():
+    """Test that the same schema has the same fingerprint however it was built."""
+    state = make_state()
+    model_schema = make_model_schema()
+
+    assert state.fingerprint() == hash_schema(model_schema)
+    assert state.model_fingerprint("blog", "User") == hash_model(
+        model_schema["blog"]["models"]["User"]
+    )
+    assert state.model_fingerprint("blog", "User") != state.model_fingerprint("blog", "Post")
+
+
+def test_fingerprint_changes_with_the_model():
+    """Test that changing a model changes the fingerprints of its app only."""
+    state = make_state()
+    fingerprint = state.fingerprint()
+    app_fingerprint = state.app_fingerprint("blog")
+    user_fingerprint = state.model_fingerprint("blog", "User")
+    post_fingerprint = state.model_fingerprint("blog", "Post")
+
+    state.apply_operation(AlterField("blog.User", CharField(max_length=200), "name"))
+
+    assert state.fingerprint() != fingerprint
+    assert state.app_fingerprint("blog") != app_fingerprint
+    assert state.model_fingerprint("blog", "User") != user_fingerprint
+    assert state.model_fingerprint("blog", "Post") == post_fingerprint
+
+    # the fingerprints of the snapshots are not affected
+    assert state.rewind(1).fingerprint() == fingerprint
+
+
+async def test_differ_skips_identical_models():
+    """Test that the differ doesn't compare the fields of identical models."""
+    state = make_state()
+    model_schema = make_model_schema()
+    differ = SchemaDiffer(state)
+    differ.get_model_schema = lambda: model_schema
+
+    with patch.object(
+        SchemaDiffer, "_are_fields_different", autospec=True, return_value=False
+    ) as are_fields_different:
+        assert await differ.detect_changes() == []
+        assert are_fields_different.call_count == 0
+
+        model_schema["blog"]["models"]["User"]["fields"]["name"] = CharField(max_length=200)
+        await differ.detect_changes()
+
+    # only the fields of the changed model are compared
+    assert are_fields_different.call_count == 2
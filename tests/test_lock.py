@@ -0,0 +1,87 @@
+"""
+Tests for the lock that serializes migrations across processes.
+"""
+
+import asyncio
+import datetime
+
+import pytest
+from tortoise import Tortoise
+
+from tortoise_pathway.lock import get_migration_lock
+
+
+async def test_lock_waits_for_holder(setup_test_db):
+    """Test that a lock waits until the holder releases it."""
+    conn = Tortoise.get_connection("default")
+    holder = get_migration_lock(conn)
+    waiter = get_migration_lock(conn, timeout=5)
+    waiter.poll_interval = 0.01
+    # locks of other processes have other owners
+    waiter.owner = "other"
+
+    await holder.acquire()
+    acquire = asyncio.create_task(waiter.acquire())
+    await asyncio.sleep(0.05)
+    assert not acquire.done()
+
+    await holder.release()
+    await asyncio.wait_for(acquire, timeout=1)
+    await waiter.release()
+
+
+async def test_lock_timeout(setup_test_db):
+    """Test that waiting for the lock times out."""
+    conn = Tortoise.get_connection("default")
+    waiter = get_migration_lock(conn, timeout=0.05)
+    waiter.poll_interval = 0.01
+    waiter.owner = "other"
+
+    async with get_migration_lock(conn):
+        with pytest.raises(TimeoutError, match="Could not acquire the migration lock"):
+            await waiter.acquire()
+
+    # the lock is released when the holder exits
+    async with waiter:
+        pass
+
+
+async def test_expired_lock_is_taken_over(setup_test_db):
+    """Test that a lock which wasn't refreshed within its TTL is taken over."""
+    conn = Tortoise.get_connection("default")
+    holder = get_migration_lock(conn, ttl=60)
+    waiter = get_migration_lock(conn, timeout=0.05, ttl=60)
+    waiter.poll_interval = 0.01
+    waiter.owner = "other"
+
+    await holder.acquire()
+    with pytest.raises(TimeoutError, match="expires"):
+        await waiter.acquire()
+
+    # the holder was killed two minutes ago
+    await conn.execute_query(
+        "UPDATE tortoise_migrations_lock SET acquired_at = ?",
+        [(datetime.datetime.now() - datetime.timedelta(minutes=2)).isoformat()],
+    )
+    await waiter.acquire()
+    _, records = await conn.execute_query("SELECT owner FROM tortoise_migrations_lock")
+    assert records[0]["owner"] == "other"
+
+    # the lock of the waiter isn't released by the former holder
+    await holder.release()
+    _, records = await conn.execute_query("SELECT owner FROM tortoise_migrations_lock")
+    assert records[0]["owner"] == "other"
+    await waiter.release()
+
+
+async def test_lock_is_refreshed(setup_test_db):
+    """Test that the holder keeps refreshing the lock while it holds it."""
+    conn = Tortoise.get_connection("default")
+    holder = get_migration_lock(conn, ttl=0.15)
+    waiter = get_migration_lock(conn, timeout=0.3, ttl=0.15)
+    waiter.poll_interval = 0.01
+    waiter.owner = "other"
+
+    async with holder:
+        with pytest.raises(TimeoutError):
+            await waiter.acquire()
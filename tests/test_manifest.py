@@ -0,0 +1,118 @@
+"""
+Tests for the migration manifest.
+"""
+
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from tortoise_pathway import manifest as manifest_module
+from tortoise_pathway.manifest import MigrationManifest, manifest_entry
+from tortoise_pathway.migration_manager import load_migrations_from_disk
+
+INITIAL = '''
+from tortoise.fields import IntField
+
+from tortoise_pathway.migration import Migration
+from tortoise_pathway.operations import CreateModel, RunSQL
+
+
+class InitialMigration(Migration):
+    dependencies = []
+    operations = [
+        CreateModel(
+            model="blog.User",
+            table="users",
+            fields={"id": IntField(primary_key=True)},
+        ),
+        RunSQL("SELECT 1"),
+    ]
+'''
+
+SECOND = '''
+from tortoise.fields import CharField
+
+from tortoise_pathway.migration import Migration
+from tortoise_pathway.operations import AddField
+
+
+class UserNameMigration(Migration):
+    dependencies = [("blog", "0001_initial")]
+    operations = [
+        AddField("blog.User", CharField(max_length=100), "name"),
+    ]
+'''
+
+
+def write_migrations(migrations_dir: Path) -> None:
+    migrations_dir.mkdir(parents=True, exist_ok=True)
+    (migrations_dir / "0001_initial.py").write_text(INITIAL)
+    (migrations_dir / "0002_user_name.py").write_text(SECOND)
+
+
+def test_manifest_entry(tmp_path):
+    """Test that the entry describes the migration without importing it."""
+    write_migrations(tmp_path)
+
+    entry = manifest_entry(tmp_path / "0001_initial.py")
+
+    assert entry["class"] == "InitialMigration"
+    assert entry["attributes"] == {"dependencies": []}
+    assert entry["operations"] == ["CreateModel blog.User", "RunSQL"]
+    assert entry["models"] == ["blog.User"]
+    assert entry["tables"] == ["users"]
+
+    entry = manifest_entry(tmp_path / "0002_user_name.py")
+    assert entry["operations"] == ["AddField blog.User"]
+
+
+def test_refresh_parses_changed_files_only(tmp_path):
+    """Test that only new and modified files are parsed again."""
+    write_migrations(tmp_path)
+    manifest = MigrationManifest(tmp_path)
+    manifest.refresh()
+    manifest.save()
+
+    def refresh() -> int:
+        manifest = MigrationManifest(tmp_path)
+        manifest.load()
+        with patch.object(
+            manifest_module, "manifest_entry", side_effect=manifest_entry
+        ) as parse:
+            manifest.refresh()
+        manifest.save()
+        return parse.call_count
+
+    assert refresh() == 0
+
+    # the modification time changed, e.g. in a fresh checkout, but not the content
+    manifest_text = (tmp_path / "manifest.json").read_text()
+    os.utime(tmp_path / "0001_initial.py", ns=(0, 0))
+    assert refresh() == 0
+    assert (tmp_path / "manifest.json").read_text() == manifest_text
+
+    (tmp_path / "0002_user_name.py").write_text(SECOND.replace("100", "200"))
+    assert refresh() == 1
+
+    (tmp_path / "0002_user_name.py").unlink()
+    assert refresh() == 0
+    manifest.load()
+    assert list(manifest.entries) == ["0001_initial"]
+
+
+def test_lazy_discovery_uses_the_manifest(tmp_path):
+    """Test that the migrations are discovered from the manifest alone."""
+    write_migrations(tmp_path)
+    manifest = MigrationManifest(tmp_path)
+    manifest.refresh()
+    manifest.save()
+
+    with patch.object(manifest_module.ast, "parse") as parse:
+        migrations = load_migrations_from_disk("blog", tmp_path, lazy=True)
+
+    assert parse.call_count == 0
+    assert [migration.__name__ for migration in migrations] == [
+        "InitialMigration",
+        "UserNameMigration",
+    ]
+    assert migrations[1].dependencies == [("blog", "0001_initial")]
@@ -1,15 +1,26 @@
+import sys
+import tomllib
+from pathlib import Path
+
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from typing import List, Dict
 from tortoise.fields import CharField, IntField, Field
+from tortoise.fields.relational import ForeignKeyFieldInstance
+from tortoise.indexes import Index
 
+from tortoise_pathway import __version__
 from tortoise_pathway.migration import Migration
 from tortoise_pathway.migration_manager import (
     sort_migrations,
     gen_name_from_changes,
+    find_leaves,
+    load_migrations_from_disk,
+    parse_migration_file,
+    schema_operations,
     MigrationManager,
 )
-from tortoise_pathway.operations import Operation, CreateModel, AddField, AlterField
+from tortoise_pathway.operations import Operation, CreateModel, AddField, AddIndex, AlterField
 from tortoise_pathway.state import State
 
 
@@ -88,40 +99,97 @@ class TestSortMigrations:
         assert result_names.index("migration2") < result_names.index("migration4")
         assert result_names.index("migration3") < result_names.index("migration4")
 
-    def test_multiple_root_migrations_error(self):
-        """Test that an error is raised when multiple root migrations are found."""
+    def test_multiple_root_migrations(self):
+        """Test that several root migrations are sorted by name."""
         migration1 = Mock(spec=Migration)
+        migration1.app_name = "app"
         migration1.name.return_value = "migration1"
         migration1.dependencies = []
 
         migration2 = Mock(spec=Migration)
+        migration2.app_name = "app"
         migration2.name.return_value = "migration2"
         migration2.dependencies = []
 
-        with pytest.raises(ValueError, match="Multiple root migrations found"):
-            sort_migrations([migration1, migration2])
+        migration3 = Mock(spec=Migration)
+        migration3.app_name = "app"
+        migration3.name.return_value = "migration3"
+        migration3.dependencies = [("app", "migration2")]
+
+        result = sort_migrations([migration3, migration2, migration1])
+
+        assert [m.name() for m in result] == ["migration1", "migration2", "migration3"]
 
     def test_circular_dependency_error(self):
         """Test that an error is raised when circular dependencies are detected."""
         migration0 = Mock(spec=Migration, name="migration0")
+        migration0.app_name = "app"
         migration0.name.return_value = "migration0"
         migration0.dependencies = []
 
         migration1 = Mock(spec=Migration, name="migration1")
+        migration1.app_name = "app"
         migration1.name.return_value = "migration1"
-        migration1.dependencies = ["migration2", "migration0"]
+        migration1.dependencies = [("app", "migration2"), ("app", "migration0")]
 
         migration2 = Mock(spec=Migration, name="migration2")
+        migration2.app_name = "app"
         migration2.name.return_value = "migration2"
-        migration2.dependencies = ["migration3"]
+        migration2.dependencies = [("app", "migration3")]
 
         migration3 = Mock(spec=Migration, name="migration3")
+        migration3.app_name = "app"
         migration3.name.return_value = "migration3"
-        migration3.dependencies = ["migration1"]
+        migration3.dependencies = [("app", "migration1")]
 
-        with pytest.raises(ValueError, match="Circular dependency detected"):
+        with pytest.raises(ValueError, match="Circular dependency detected: ") as e:
             sort_migrations([migration0, migration1, migration2, migration3])
 
+        # the cycle is reported, not the migration where the sort stopped
+        for name in ("migration1", "migration2", "migration3"):
+            assert name in str(e.value)
+        assert "migration0" not in str(e.value)
+
+    def test_missing_dependency_error(self):
+        """Test that an error is raised when a dependency doesn't exist."""
+        migration1 = Mock(spec=Migration)
+        migration1.app_name = "app"
+        migration1.name.return_value = "migration1"
+        migration1.dependencies = []
+
+        migration2 = Mock(spec=Migration)
+        migration2.app_name = "app"
+        migration2.name.return_value = "migration2"
+        migration2.dependencies = [("app", "deleted")]
+
+        with pytest.raises(
+            ValueError,
+            match="Migration app -> migration2 depends on missing migration app -> deleted",
+        ):
+            sort_migrations([migration1, migration2])
+
+    def test_branches_and_leaves(self):
+        """Test that independent branches are sorted by name and both are leaves."""
+        migration1 = Mock(spec=Migration)
+        migration1.app_name = "app"
+        migration1.name.return_value = "0001_initial"
+        migration1.dependencies = []
+
+        branch_b = Mock(spec=Migration)
+        branch_b.app_name = "app"
+        branch_b.name.return_value = "0002_b"
+        branch_b.dependencies = [("app", "0001_initial")]
+
+        branch_a = Mock(spec=Migration)
+        branch_a.app_name = "app"
+        branch_a.name.return_value = "0002_a"
+        branch_a.dependencies = [("app", "0001_initial")]
+
+        result = sort_migrations([branch_b, migration1, branch_a])
+
+        assert [m.name() for m in result] == ["0001_initial", "0002_a", "0002_b"]
+        assert find_leaves(result) == [branch_a, branch_b]
+
     def test_no_root_migration_error(self):
         """Test that an error is raised when no root migration is found."""
         migration1 = Mock(spec=Migration)
@@ -245,3 +313,512 @@ CREATE TABLE "users" (
 ALTER TABLE users ADD COLUMN email VARCHAR(255) NOT NULL"""
 
         assert result == expected_sql
+
+
+class TestRebuildState:
+    """Test building the migration and applied states."""
+
+    def setup_method(self):
+        """Set up a history of three migrations."""
+        self.migrations = [
+            self._make_migration(
+                "0001_initial",
+                [CreateModel("test_app.User", "users", {"id": IntField(primary_key=True)})],
+            ),
+            self._make_migration(
+                "0002_user_email",
+                [AddField("test_app.User", CharField(max_length=255), "email")],
+            ),
+            self._make_migration(
+                "0003_user_name",
+                [AddField("test_app.User", CharField(max_length=100), "name")],
+            ),
+        ]
+        self.manager = MigrationManager(["test_app"])
+        self.manager.migrations = self.migrations
+
+    @staticmethod
+    def _make_migration(name: str, operations: List[Operation]) -> Mock:
+        migration = Mock(spec=Migration)
+        migration.app_name = "test_app"
+        migration.name.return_value = name
+        migration.operations = operations
+        return migration
+
+    def _rebuild_state(self, applied: List[str]) -> int:
+        """Rebuild the state and return the number of applied operations."""
+        self.manager.applied_migrations = {("test_app", name) for name in applied}
+        with patch.object(
+            State, "apply_operation", autospec=True, side_effect=State.apply_operation
+        ) as apply_operation:
+            self.manager._rebuild_state()
+        return apply_operation.call_count
+
+    def test_fully_applied_history_is_replayed_once(self):
+        """Test that the applied state shares the replay of the migration state."""
+        replayed = self._rebuild_state(["0001_initial", "0002_user_email", "0003_user_name"])
+
+        # every operation is applied once instead of once per state
+        assert replayed == 3
+        fields = {"id", "email", "name"}
+        assert set(self.manager.migration_state.get_fields("test_app", "User")) == fields
+        assert set(self.manager.applied_state.get_fields("test_app", "User")) == fields
+        assert set(self.manager.applied_state.prev().get_fields("test_app", "User")) == {
+            "id",
+            "email",
+        }
+
+    def test_applied_prefix(self):
+        """Test that the applied state forks after the applied migrations."""
+        replayed = self._rebuild_state(["0001_initial"])
+
+        assert replayed == 3
+        assert set(self.manager.applied_state.get_fields("test_app", "User")) == {"id"}
+        assert set(self.manager.migration_state.get_fields("test_app", "User")) == {
+            "id",
+            "email",
+            "name",
+        }
+
+        # the applied state is not affected by the rest of the replay and vice versa
+        self.manager.applied_state.apply_operation(
+            AddField("test_app.User", CharField(max_length=50), "nickname")
+        )
+        assert "nickname" not in self.manager.migration_state.get_fields("test_app", "User")
+
+    def test_applied_out_of_order(self):
+        """Test that applied migrations after a pending one are replayed separately."""
+        replayed = self._rebuild_state(["0001_initial", "0003_user_name"])
+
+        assert replayed == 4
+        assert set(self.manager.applied_state.get_fields("test_app", "User")) == {"id", "name"}
+        assert set(self.manager.migration_state.get_fields("test_app", "User")) == {
+            "id",
+            "email",
+            "name",
+        }
+
+
+class TestLazyDiscovery:
+    """Test discovering migrations without importing them."""
+
+    migrations_dir = Path("tests/e2e/test_applied_migrations/migrations/test_applied_migrations")
+    module = (
+        "tests.e2e.test_applied_migrations.migrations.test_applied_migrations."
+        "20240401000000_initial_donotdelete"
+    )
+
+    def test_parse_migration_file(self, tmp_path):
+        """Test that the literal attributes are parsed and the operations are skipped."""
+        path = tmp_path / "0002_second.py"
+        path.write_text(
+            "from tortoise_pathway import migration\n"
+            "\n"
+            "class SecondMigration(migration.Migration):\n"
+            "    dependencies = [('app', '0001_initial')]\n"
+            "    operations = [undefined_name]\n"
+        )
+
+        assert parse_migration_file(path) == (
+            "SecondMigration",
+            {"dependencies": [("app", "0001_initial")]},
+        )
+
+    def test_parse_migration_file_with_computed_dependencies(self, tmp_path):
+        """Test that the dependencies must be a literal to be parsed."""
+        path = tmp_path / "0002_second.py"
+        path.write_text(
+            "from tortoise_pathway.migration import Migration\n"
+            "\n"
+            "class SecondMigration(Migration):\n"
+            "    dependencies = [('app', '0001_' + 'initial')]\n"
+            "    operations = []\n"
+        )
+
+        with pytest.raises(ValueError):
+            parse_migration_file(path)
+
+    def test_operations_are_imported_on_access(self):
+        """Test that the module is imported only when the operations are accessed."""
+        sys.modules.pop(self.module, None)
+
+        migrations = load_migrations_from_disk(
+            "test_applied_migrations", self.migrations_dir, lazy=True
+        )
+
+        assert len(migrations) == 1
+        migration = migrations[0]
+        assert migration.__name__ == "InitialMigration"
+        assert migration.name() == "20240401000000_initial_donotdelete"
+        assert migration.app_name == "test_applied_migrations"
+        assert migration.dependencies == []
+        assert self.module not in sys.modules
+
+        assert [operation.model_name for operation in migration.operations] == [
+            "Product",
+            "Category",
+        ]
+        assert self.module in sys.modules
+        assert migration.operations[0].app_name == "test_applied_migrations"
+
+
+@pytest.fixture
+def importable_tmp_path(tmp_path, monkeypatch):
+    """Make the migration files created in the temporary directory importable."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, "modules", dict(sys.modules))
+    return tmp_path
+
+
+def write_migration(path: Path, class_name: str, dependencies: list) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        "from tortoise_pathway.migration import Migration\n"
+        "\n"
+        f"class {class_name}(Migration):\n"
+        f"    dependencies = {dependencies!r}\n"
+        "    operations = []\n"
+    )
+
+
+class TestParallelImport:
+    """Test importing the migration files on a thread pool."""
+
+    @pytest.fixture
+    def migrations_dir(self, importable_tmp_path):
+        """Create migration files in an importable directory."""
+        app_dir = Path("parallel_migrations") / "app"
+        previous = []
+        for i in range(1, 9):
+            name = f"{i:04d}_migration"
+            write_migration(app_dir / f"{name}.py", f"Migration{i}", previous)
+            previous = [("app", name)]
+        (app_dir / "0009_broken.py").write_text("raise ImportError('broken')\n")
+        return Path("parallel_migrations")
+
+    def test_parallel_import(self, migrations_dir, capsys):
+        """Test that the result and the errors don't depend on the number of threads."""
+        manager = MigrationManager(["app"], str(migrations_dir), jobs=4)
+        manager.load_migrations()
+        parallel_output = capsys.readouterr().out
+
+        assert [migration.__name__ for migration in manager.migrations] == [
+            f"Migration{i}" for i in range(1, 9)
+        ]
+        assert parallel_output == "Error loading migration 0009_broken: broken\n"
+
+        serial = load_migrations_from_disk("app", migrations_dir / "app")
+        assert serial == manager.migrations
+        assert capsys.readouterr().out == parallel_output
+
+
+class TestMergeMigration:
+    """Test merging the branches of the migration graph."""
+
+    @pytest.fixture
+    def manager(self, importable_tmp_path):
+        """Create two branches of migrations developed in parallel."""
+        app_dir = Path("merge_migrations") / "app"
+        write_migration(app_dir / "0001_initial.py", "InitialMigration", [])
+        write_migration(app_dir / "0002_a.py", "AMigration", [("app", "0001_initial")])
+        write_migration(app_dir / "0002_b.py", "BMigration", [("app", "0001_initial")])
+
+        manager = MigrationManager(["app"], "merge_migrations")
+        manager.load_migrations()
+        return manager
+
+    async def test_create_migration_with_multiple_leaves(self, manager):
+        """Test that new migrations are not created on top of a single branch."""
+        assert [leaf.name() for leaf in manager.get_leaves()] == ["0002_a", "0002_b"]
+
+        with pytest.raises(ValueError, match="Conflicting migrations detected"):
+            async for _ in manager.create_migrations(app="app", auto=False):
+                pass
+
+    def test_merge(self, manager):
+        """Test that the merge migration depends on all leaves."""
+        merge = manager.create_merge_migration()
+
+        assert merge.name().endswith("_merge")
+        assert merge.dependencies == [("app", "0002_a"), ("app", "0002_b")]
+        assert manager.get_leaves() == [merge]
+        assert manager.create_merge_migration() is None
+
+        reloaded = MigrationManager(["app"], "merge_migrations")
+        reloaded.load_migrations()
+        assert [migration.name() for migration in reloaded.migrations] == [
+            "0001_initial",
+            "0002_a",
+            "0002_b",
+            merge.name(),
+        ]
+
+
+class TestSquashMigrations:
+    """Test squashing migrations and using squashed migrations."""
+
+    @pytest.fixture
+    def app_dir(self, importable_tmp_path):
+        """Create a history of migrations with churn."""
+        app_dir = Path("squash_migrations") / "app"
+        app_dir.mkdir(parents=True)
+        imports = (
+            "from tortoise.fields import CharField, IntField\n"
+            "from tortoise_pathway.migration import Migration\n"
+            "from tortoise_pathway.operations import AddField, AlterField, CreateModel\n"
+            "\n"
+        )
+        (app_dir / "0001_initial.py").write_text(
+            imports + "class InitialMigration(Migration):\n"
+            "    dependencies = []\n"
+            "    operations = [\n"
+            "        CreateModel('app.User', 'users', {'id': IntField(primary_key=True)}),\n"
+            "    ]\n"
+        )
+        (app_dir / "0002_email.py").write_text(
+            imports + "class EmailMigration(Migration):\n"
+            "    dependencies = [('app', '0001_initial')]\n"
+            "    operations = [AddField('app.User', CharField(max_length=100), 'email')]\n"
+        )
+        (app_dir / "0003_email_length.py").write_text(
+            imports + "class EmailLengthMigration(Migration):\n"
+            "    dependencies = [('app', '0002_email')]\n"
+            "    operations = [AlterField('app.User', CharField(max_length=255), 'email')]\n"
+        )
+        (app_dir / "0004_name.py").write_text(
+            imports + "class NameMigration(Migration):\n"
+            "    dependencies = [('app', '0003_email_length')]\n"
+            "    operations = [AddField('app.User', CharField(max_length=50), 'name')]\n"
+        )
+        return app_dir
+
+    def test_squash(self, app_dir):
+        """Test that the squashed migration replaces the range with one CreateModel."""
+        manager = MigrationManager(["app"], "squash_migrations")
+        manager.load_migrations()
+        fingerprint = manager.migration_state.fingerprint()
+
+        squashed = manager.squash_migrations("app", "0003_email_length")
+
+        assert squashed.replaces == [
+            ("app", "0001_initial"),
+            ("app", "0002_email"),
+            ("app", "0003_email_length"),
+        ]
+        assert len(squashed.operations) == 1
+        assert squashed.operations[0].fields["email"].max_length == 255
+
+        # the later migrations depend on the squashed migration instead
+        assert [m.name() for m in manager.migrations] == [squashed.name(), "0004_name"]
+        assert manager.migration_state.fingerprint() == fingerprint
+
+    def test_squash_with_foreign_key(self, importable_tmp_path):
+        """Test that fields are folded into a model past the models that refer to it."""
+        app_dir = Path("squash_fk_migrations") / "app"
+        app_dir.mkdir(parents=True)
+        imports = (
+            "from tortoise.fields import CharField, ForeignKeyField, IntField\n"
+            "from tortoise_pathway.migration import Migration\n"
+            "from tortoise_pathway.operations import AddField, BackfillField, CreateModel\n"
+            "\n"
+        )
+        (app_dir / "0001_initial.py").write_text(
+            imports + "class InitialMigration(Migration):\n"
+            "    dependencies = []\n"
+            "    operations = [\n"
+            "        CreateModel('app.Author', 'authors', {'id': IntField(primary_key=True)}),\n"
+            "        CreateModel('app.Book', 'books', {\n"
+            "            'id': IntField(primary_key=True),\n"
+            "            'author': ForeignKeyField('app.Author', related_name='books'),\n"
+            "        }),\n"
+            "    ]\n"
+        )
+        (app_dir / "0002_fields.py").write_text(
+            imports + "class FieldsMigration(Migration):\n"
+            "    dependencies = [('app', '0001_initial')]\n"
+            "    operations = [\n"
+            "        AddField('app.Author', CharField(max_length=100, null=True), 'bio'),\n"
+            "        BackfillField('app.Author', CharField(max_length=10), 'code', default='x'),\n"
+            "        AddField('app.Book', IntField(default=0), 'pages'),\n"
+            "    ]\n"
+        )
+        manager = MigrationManager(["app"], "squash_fk_migrations")
+        manager.load_migrations()
+        fingerprint = manager.migration_state.fingerprint()
+
+        squashed = manager.squash_migrations("app", "0002_fields")
+
+        assert [type(op).__name__ for op in squashed.operations] == [
+            "CreateModel",
+            "CreateModel",
+        ]
+        author, book = squashed.operations
+        assert list(author.fields) == ["id", "bio", "code"]
+        assert list(book.fields) == ["id", "author", "pages"]
+        assert manager.migration_state.fingerprint() == fingerprint
+
+    def test_resolve_replacements(self, app_dir):
+        """Test choosing between the squashed and the replaced migrations."""
+        manager = MigrationManager(["app"], "squash_migrations")
+        manager.load_migrations()
+        squashed = manager.squash_migrations("app", "0003_email_length", name="squashed")
+        key = ("app", squashed.name())
+
+        def resolve(applied: list[str]) -> tuple[list[str], bool]:
+            manager = MigrationManager(["app"], "squash_migrations")
+            manager.applied_migrations = {("app", name) for name in applied}
+            manager.load_migrations()
+            return [m.name() for m in manager.migrations], key in manager.applied_migrations
+
+        # a new database and a database that applied all replaced migrations use the
+        # squashed migration
+        assert resolve([]) == ([squashed.name(), "0004_name"], False)
+        assert resolve(["0001_initial", "0002_email", "0003_email_length"]) == (
+            [squashed.name(), "0004_name"],
+            True,
+        )
+
+        # a database in the middle of the range continues with the replaced migrations
+        names, applied = resolve(["0001_initial"])
+        assert names == ["0001_initial", "0002_email", "0003_email_length", "0004_name"]
+        assert not applied
+
+        # the replaced migrations can be deleted once all databases are past them
+        for name in ("0001_initial", "0002_email", "0003_email_length"):
+            (app_dir / f"{name}.py").unlink()
+        assert resolve([]) == ([squashed.name(), "0004_name"], False)
+
+
+class TestSchemaOperations:
+    def test_foreign_key_order(self):
+        """Test that the models are created after the models they refer to."""
+        state = State()
+        state.apply_operation(
+            CreateModel(
+                model="blog.Post",
+                table="posts",
+                fields={
+                    "id": IntField(primary_key=True),
+                    "author": ForeignKeyFieldInstance("blog.User", related_name="posts"),
+                    "parent": ForeignKeyFieldInstance("blog.Post", null=True),
+                },
+            )
+        )
+        state.apply_operation(
+            CreateModel(
+                model="blog.User",
+                table="users",
+                fields={"id": IntField(primary_key=True), "name": CharField(max_length=100)},
+            )
+        )
+        state.apply_operation(
+            AddIndex(model="blog.User", index=Index(fields=["name"], name="idx_users_name"))
+        )
+
+        operations = schema_operations(state)
+
+        assert [(type(op).__name__, op.model) for op in operations] == [
+            ("CreateModel", "blog.User"),
+            ("CreateModel", "blog.Post"),
+            ("AddIndex", "blog.User"),
+        ]
+        assert set(operations[1].fields) == {"id", "author", "parent"}
+
+    def test_circular_foreign_keys(self):
+        """Test that circular foreign keys are reported."""
+        state = State()
+        for model, target in [("A", "blog.B"), ("B", "blog.A")]:
+            state.apply_operation(
+                CreateModel(
+                    model=f"blog.{model}",
+                    table=model.lower(),
+                    fields={
+                        "id": IntField(primary_key=True),
+                        "other": ForeignKeyFieldInstance(target, null=True),
+                    },
+                )
+            )
+
+        with pytest.raises(ValueError, match="Circular foreign keys"):
+            schema_operations(state)
+
+
+class TestExecuteOperations:
+    @staticmethod
+    def make_connection(dialect: str) -> Mock:
+        connection = Mock()
+        connection.capabilities.dialect = dialect
+        connection.connection_name = "default"
+        connection.execute_script = AsyncMock()
+        return connection
+
+    @staticmethod
+    def make_operations() -> list[Operation]:
+        return [
+            CreateModel(
+                model="blog.User",
+                table="users",
+                fields={"id": IntField(primary_key=True), "name": CharField(max_length=100)},
+            ),
+            AddIndex(model="blog.User", index=Index(fields=["name"], name="idx_users_name")),
+            AddField("blog.User", CharField(max_length=100, null=True), "email"),
+        ]
+
+    async def test_one_script_in_transaction(self):
+        """Test that the operations run in one script in a transaction on PostgreSQL."""
+        connection = self.make_connection("postgres")
+        state = State()
+
+        await MigrationManager([]).execute_operations(
+            self.make_operations(), state, connection, atomic=True
+        )
+
+        assert connection.execute_script.await_count == 1
+        script = connection.execute_script.await_args.args[0]
+        assert script.startswith("SAVEPOINT pathway_operations;")
+        assert 'CREATE TABLE "users"' in script
+        assert "idx_users_name" in script
+        assert "email" in script
+        # the state follows the operations
+        assert set(state.get_fields("blog", "User")) == {"id", "name", "email"}
+
+    async def test_one_script_per_operation_without_transaction(self):
+        """Test that every operation runs by itself outside of a transaction."""
+        connection = self.make_connection("postgres")
+
+        await MigrationManager([]).execute_operations(
+            self.make_operations(), State(), connection, atomic=False
+        )
+
+        assert connection.execute_script.await_count == 3
+
+    async def test_failed_operation(self):
+        """Test that the operation that fails is reported."""
+        connection = self.make_connection("postgres")
+
+        async def execute_script(sql: str) -> None:
+            if "idx_users_name" in sql:
+                raise RuntimeError("failed")
+
+        connection.execute_script.side_effect = execute_script
+
+        with pytest.raises(RuntimeError) as exc_info:
+            await MigrationManager([]).execute_operations(
+                self.make_operations(), State(), connection, atomic=True
+            )
+
+        assert exc_info.value.__notes__ == [
+            "The failed operation: "
+            + str(AddIndex(model="blog.User", index=Index(fields=["name"], name="idx_users_name")))
+        ]
+        scripts = [call.args[0] for call in connection.execute_script.await_args_list]
+        assert scripts[1] == "ROLLBACK TO SAVEPOINT pathway_operations"
+        # the operations after the failed one are not run
+        assert not any("email" in script for script in scripts[2:])
+
+
+def test_version_matches_the_package():
+    """Test that the version recorded without package metadata is the released one."""
+    pyproject = Path(__file__).parent.parent / "pyproject.toml"
+    assert __version__ == tomllib.loads(pyproject.read_text())["project"]["version"]
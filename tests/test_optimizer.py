@@ -0,0 +1,136 @@
+"""
+Tests for the optimizer of operation lists.
+"""
+
+from typing import List
+
+from tortoise.fields import CharField, ForeignKeyField, IntField, TextField
+from tortoise.indexes import Index
+
+from tortoise_pathway.operations import (
+    AddField,
+    AddIndex,
+    AlterField,
+    CreateModel,
+    DropField,
+    DropModel,
+    Operation,
+    RenameField,
+    RenameModel,
+    RunSQL,
+)
+from tortoise_pathway.optimizer import optimize_operations
+from tortoise_pathway.state import State
+
+
+def create_user() -> CreateModel:
+    return CreateModel(
+        model="blog.User",
+        table="users",
+        fields={"id": IntField(primary_key=True), "name": CharField(max_length=100)},
+    )
+
+
+def assert_same_schema(operations: List[Operation], optimized: List[Operation]) -> None:
+    state, optimized_state = State(), State()
+    for operation in operations:
+        state.apply_operation(operation)
+    for operation in optimized:
+        optimized_state.apply_operation(operation)
+    assert optimized_state.fingerprint() == state.fingerprint()
+
+
+def test_fold_field_operations_into_create_model():
+    """Test that the fields of a created model end up in its CreateModel."""
+    operations = [
+        create_user(),
+        AddField("blog.User", CharField(max_length=255), "email"),
+        AlterField("blog.User", CharField(max_length=200), "name"),
+        AddField("blog.User", TextField(), "bio"),
+        RenameField("blog.User", "bio", new_field_name="about", new_column_name="about_text"),
+        DropField("blog.User", "email"),
+        RenameModel("blog.User", new_model_name="Author", new_table_name="authors"),
+    ]
+
+    optimized = optimize_operations(operations)
+
+    assert len(optimized) == 1
+    create_model = optimized[0]
+    assert isinstance(create_model, CreateModel)
+    assert create_model.model == "blog.Author"
+    assert create_model.table == "authors"
+    assert list(create_model.fields) == ["id", "name", "about"]
+    assert create_model.fields["name"].max_length == 200
+    assert create_model.fields["about"].source_field == "about_text"
+    assert_same_schema(operations, optimized)
+
+
+def test_cancelled_operations():
+    """Test that operations undone later are dropped."""
+    operations = [
+        create_user(),
+        AddField("blog.Post", CharField(max_length=10), "draft"),
+        CreateModel("blog.Tmp", "tmp", {"id": IntField(primary_key=True)}),
+        DropField("blog.Post", "draft"),
+        DropModel("blog.Tmp"),
+    ]
+
+    assert optimize_operations(operations) == [operations[0]]
+
+
+def test_operations_are_not_moved_past_dependencies():
+    """Test that operations are not combined across operations they depend on."""
+    operations = [
+        create_user(),
+        CreateModel("blog.Post", "posts", {"id": IntField(primary_key=True)}),
+        AddField("blog.User", ForeignKeyField("blog.Post"), "pinned_post"),
+        RunSQL("UPDATE users SET name = 'x'"),
+        AddField("blog.User", CharField(max_length=255), "email"),
+        AddIndex("blog.Post", Index(fields=["id"], name="idx_posts_id")),
+    ]
+
+    optimized = optimize_operations(operations)
+
+    # the foreign key is only added after the referenced model is created and no operation
+    # is moved past the raw SQL, which may depend on any of them
+    assert optimized == operations
+
+
+def test_coalesce_field_operations():
+    """Test that consecutive changes of the same field are coalesced."""
+    operations = [
+        AddField("blog.Post", CharField(max_length=10), "title"),
+        AlterField("blog.Post", CharField(max_length=20), "title"),
+        AddField("blog.Post", TextField(), "body"),
+        RenameField("blog.Post", "title", new_field_name="headline"),
+        AlterField("blog.Post", TextField(), "body"),
+        AlterField("blog.Post", TextField(null=True), "body"),
+        AlterField("blog.Post", CharField(max_length=5), "slug"),
+        RenameField("blog.Post", "slug", new_field_name="old_slug"),
+        DropField("blog.Post", "old_slug"),
+    ]
+
+    optimized = optimize_operations(operations)
+
+    assert [type(operation) for operation in optimized] == [AddField, AddField, DropField]
+    assert optimized[0].field_name == "headline"
+    assert optimized[0].field_object.max_length == 20
+    assert optimized[1].field_name == "body"
+    assert optimized[1].field_object.null is True
+    assert optimized[2].field_name == "slug"
+
+
+def test_changes_of_a_dropped_model():
+    """Test that changes of a model before it's dropped are dropped."""
+    operations = [
+        AddField("blog.Post", CharField(max_length=10), "title"),
+        AddIndex("blog.Post", Index(fields=["title"], name="idx_posts_title")),
+        AlterField("blog.User", CharField(max_length=20), "name"),
+        DropModel("blog.Post"),
+    ]
+
+    optimized = optimize_operations(operations)
+
+    assert [type(operation) for operation in optimized] == [DropModel, AlterField]
+    assert optimized[0] is operations[3]
+    assert optimized[1] is operations[2]
@@ -0,0 +1,42 @@
+"""
+Tests for the helpers of the schema package.
+"""
+
+from tortoise_pathway.schema import split_statements
+
+
+def test_split_statements():
+    """Test that SQL is split at the semicolons that end statements."""
+    sql = """
+    -- a comment; with a semicolon
+    CREATE INDEX CONCURRENTLY idx ON t (a);
+    INSERT INTO t (a, "b;c") VALUES ('x; y', 'it''s');
+    /* block; comment */
+    SELECT 1
+    """
+
+    assert split_statements(sql) == [
+        "-- a comment; with a semicolon\n    CREATE INDEX CONCURRENTLY idx ON t (a);",
+        """INSERT INTO t (a, "b;c") VALUES ('x; y', 'it''s');""",
+        "/* block; comment */\n    SELECT 1",
+    ]
+
+
+def test_split_statements_with_bodies():
+    """Test that the bodies of PostgreSQL functions and SQLite triggers are not split."""
+    function = (
+        "CREATE FUNCTION f() RETURNS trigger AS $body$ BEGIN NEW.a := 1; RETURN NEW; END; "
+        "$body$ LANGUAGE plpgsql;"
+    )
+    trigger = (
+        "CREATE TRIGGER tr AFTER INSERT ON t BEGIN "
+        "UPDATE t SET a = 1; UPDATE t SET b = 'end;'; END;"
+    )
+    postgres_trigger = "CREATE TRIGGER tr BEFORE INSERT ON t EXECUTE FUNCTION f();"
+
+    assert split_statements(f"{function}\n{trigger}\n{postgres_trigger}\nSELECT 1;") == [
+        function,
+        trigger,
+        postgres_trigger,
+        "SELECT 1;",
+    ]
@@ -3,6 +3,9 @@ Tests for the SchemaDiffer's ability to detect field changes.
 """
 
 from enum import IntEnum, Enum
+from uuid import uuid4
+
+import pytest
 from tortoise.fields import (
     IntField,
     CharField,
@@ -10,6 +13,7 @@ from tortoise.fields import (
     BooleanField,
     IntEnumField,
     CharEnumField,
+    UUIDField,
 )
 from tortoise.fields.data import IntEnumFieldInstance, CharEnumFieldInstance
 from tortoise.fields.relational import ManyToManyFieldInstance
@@ -19,6 +23,7 @@ from tortoise_pathway.schema_differ import SchemaDiffer
 from tortoise_pathway.operations import (
     AddField,
     AlterField,
+    BackfillField,
     DropField,
     CreateModel,
 )
@@ -57,7 +62,7 @@ async def test_detect_field_additions():
                     "TestModel": {
                         "table": "test_model",
                         "fields": updated_fields,
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -121,7 +126,7 @@ async def test_detect_field_removals():
                     "TestModel": {
                         "table": "test_model",
                         "fields": updated_fields,
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -184,7 +189,7 @@ async def test_detect_field_alterations():
                     "TestModel": {
                         "table": "test_model",
                         "fields": updated_fields,
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -264,7 +269,7 @@ async def test_detect_field_type_changes():
                     "TestModel": {
                         "table": "test_model",
                         "fields": updated_fields,
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -332,7 +337,7 @@ async def test_detect_multiple_field_changes():
                     "TestModel": {
                         "table": "test_model",
                         "fields": updated_fields,
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -406,7 +411,7 @@ async def test_detect_enum_field_additions():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -429,7 +434,7 @@ async def test_detect_enum_field_additions():
                     "TestModel": {
                         "table": "test_model",
                         "fields": updated_fields,
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -487,7 +492,7 @@ async def test_detect_m2m_field_additions_to_existing_models():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Project": {
                         "table": "project",
@@ -495,7 +500,7 @@ async def test_detect_m2m_field_additions_to_existing_models():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             }
@@ -518,7 +523,7 @@ async def test_detect_m2m_field_additions_to_existing_models():
                             "test.Project", related_name="users", through="user_project"
                         ),
                     },
-                    "indexes": [],
+                    "indexes": {},
                 },
                 "Project": {
                     "table": "project",
@@ -529,7 +534,7 @@ async def test_detect_m2m_field_additions_to_existing_models():
                             "test.User", related_name="projects", through="user_project"
                         ),
                     },
-                    "indexes": [],
+                    "indexes": {},
                 },
             }
         }
@@ -620,3 +625,79 @@ async def test_detect_field_index_addition():
 
     changes = await differ.detect_changes()
     assert len(changes) == 0
+
+
+async def test_detect_field_addition_with_callable_default():
+    """Test that a NOT NULL field with a callable default is backfilled."""
+    state = State()
+
+    fields = {
+        "id": IntField(primary_key=True),
+        "name": CharField(max_length=100),
+    }
+    state.apply_operation(
+        CreateModel(model="test.TestModel", table="test_model", fields=fields)
+    )
+
+    differ = SchemaDiffer(state)
+
+    def mock_get_model_schema():
+        return {
+            "test": {
+                "models": {
+                    "TestModel": {
+                        "table": "test_model",
+                        "fields": {**fields, "token": UUIDField(default=uuid4)},
+                        "indexes": {},
+                    }
+                }
+            }
+        }
+
+    differ.get_model_schema = mock_get_model_schema
+
+    changes = await differ.detect_changes()
+
+    assert len(changes) == 1
+    assert isinstance(changes[0], BackfillField)
+    assert changes[0].field_name == "token"
+    assert changes[0].default is uuid4
+
+    for change in changes:
+        state.apply_operation(change)
+
+    changes = await differ.detect_changes()
+    assert len(changes) == 0
+
+
+async def test_detect_field_addition_with_lambda_default():
+    """Test that a callable default which a migration can't import is rejected."""
+    state = State()
+
+    fields = {"id": IntField(primary_key=True)}
+    state.apply_operation(
+        CreateModel(model="test.TestModel", table="test_model", fields=fields)
+    )
+
+    differ = SchemaDiffer(state)
+
+    def mock_get_model_schema():
+        return {
+            "test": {
+                "models": {
+                    "TestModel": {
+                        "table": "test_model",
+                        "fields": {
+                            **fields,
+                            "code": CharField(max_length=10, default=lambda: "x"),
+                        },
+                        "indexes": {},
+                    }
+                }
+            }
+        }
+
+    differ.get_model_schema = mock_get_model_schema
+
+    with pytest.raises(ValueError, match="test.TestModel.code"):
+        await differ.detect_changes()
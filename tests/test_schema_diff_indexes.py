@@ -40,12 +40,12 @@ async def test_detect_index_additions():
                     "TestModel": {
                         "table": "test_model",
                         "fields": fields,
-                        "indexes": [
-                            Index(
+                        "indexes": {
+                            "idx_test_model_created_at": Index(
                                 fields=["created_at"],
                                 name="idx_test_model_created_at",
                             )
-                        ],
+                        },
                     }
                 }
             }
@@ -108,7 +108,7 @@ async def test_detect_index_removals():
                     "TestModel": {
                         "table": "test_model",
                         "fields": fields,
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -170,12 +170,12 @@ async def test_detect_change_to_unique():
                     "TestModel": {
                         "table": "test_model",
                         "fields": fields,
-                        "indexes": [
-                            UniqueIndex(
+                        "indexes": {
+                            "idx_test_model_created_at": UniqueIndex(
                                 fields=["created_at"],
                                 name="idx_test_model_created_at",
                             )
-                        ],
+                        },
                     }
                 }
             }
@@ -204,3 +204,67 @@ async def test_detect_change_to_unique():
 
     changes = await differ.detect_changes()
     assert len(changes) == 0
+
+
+async def test_detect_index_changes_concurrently():
+    """Test that the indexes of existing tables are changed concurrently when configured."""
+    state = State()
+
+    fields = {
+        "id": IntField(primary_key=True),
+        "name": CharField(max_length=100),
+        "created_at": DatetimeField(auto_now_add=True),
+    }
+    state.apply_operation(
+        CreateModel(model="test.TestModel", table="test_model", fields=fields)
+    )
+    state.apply_operation(
+        AddIndex(
+            model="test.TestModel",
+            index=Index(fields=["name"], name="idx_test_model_name"),
+        )
+    )
+
+    differ = SchemaDiffer(state, concurrent_indexes=True)
+
+    def mock_get_model_schema() -> Schema:
+        return {
+            "test": {
+                "models": {
+                    "TestModel": {
+                        "table": "test_model",
+                        "fields": fields,
+                        "indexes": {
+                            "idx_test_model_created_at": Index(
+                                fields=["created_at"], name="idx_test_model_created_at"
+                            )
+                        },
+                    },
+                    "NewModel": {
+                        "table": "new_model",
+                        "fields": fields,
+                        "indexes": {
+                            "idx_new_model_name": Index(
+                                fields=["name"], name="idx_new_model_name"
+                            )
+                        },
+                    },
+                }
+            }
+        }
+
+    differ.get_model_schema = mock_get_model_schema
+
+    changes = await differ.detect_changes()
+
+    concurrently = {
+        change.index_name: change.concurrently
+        for change in changes
+        if isinstance(change, (AddIndex, DropIndex))
+    }
+    # the index of the new table is built together with the table
+    assert concurrently == {
+        "idx_new_model_name": False,
+        "idx_test_model_created_at": True,
+        "idx_test_model_name": True,
+    }
@@ -37,7 +37,7 @@ async def test_detect_basic_model_creation():
                             "name": CharField(max_length=100),
                             "created_at": DatetimeField(auto_now_add=True),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -101,12 +101,12 @@ async def test_detect_single_relation_model_creation():
                     "User": {
                         "table": "user",
                         "fields": user_fields,
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Post": {
                         "table": "post",
                         "fields": post_fields,
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             }
@@ -167,7 +167,7 @@ async def test_detect_multiple_relations_model_creation():
                                 "test.User", related_name="posts", to_field="id"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "User": {
                         "table": "user",
@@ -175,7 +175,7 @@ async def test_detect_multiple_relations_model_creation():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Comment": {
                         "table": "comment",
@@ -189,7 +189,7 @@ async def test_detect_multiple_relations_model_creation():
                                 "test.Post", related_name="comments", to_field="id"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             }
@@ -246,7 +246,7 @@ async def test_detect_circular_reference_model_creation():
                                 "test.Teacher", related_name="courses", to_field="id"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Teacher": {
                         "table": "teacher",
@@ -259,7 +259,7 @@ async def test_detect_circular_reference_model_creation():
                                 to_field="id",
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Department": {
                         "table": "department",
@@ -270,7 +270,7 @@ async def test_detect_circular_reference_model_creation():
                                 "test.School", related_name="departments", to_field="id"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "School": {
                         "table": "school",
@@ -281,7 +281,7 @@ async def test_detect_circular_reference_model_creation():
                                 "test.Admin", related_name="schools", to_field="id"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Admin": {
                         "table": "admin",
@@ -289,7 +289,7 @@ async def test_detect_circular_reference_model_creation():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Student": {
                         "table": "student",
@@ -297,7 +297,7 @@ async def test_detect_circular_reference_model_creation():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "StudentCourse": {
                         "table": "student_course",
@@ -311,7 +311,7 @@ async def test_detect_circular_reference_model_creation():
                             ),
                             "grade": CharField(max_length=2, null=True),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             }
@@ -386,7 +386,7 @@ async def test_detect_both_m2m_models_created():
                                 through="student_course",
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Course": {
                         "table": "course",
@@ -399,7 +399,7 @@ async def test_detect_both_m2m_models_created():
                                 through="student_course",
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             }
@@ -446,7 +446,7 @@ async def test_detect_one_m2m_model_exists():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -472,7 +472,7 @@ async def test_detect_one_m2m_model_exists():
                                 through="student_course",
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Course": {
                         "table": "course",
@@ -485,7 +485,7 @@ async def test_detect_one_m2m_model_exists():
                                 through="student_course",
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             }
@@ -538,7 +538,7 @@ async def test_verify_cross_app_creation_dependencies():
                                 "school.Teacher", related_name="courses", to_field="id"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "Teacher": {
                         "table": "teacher",
@@ -551,7 +551,7 @@ async def test_verify_cross_app_creation_dependencies():
                                 to_field="id",
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             },
@@ -563,7 +563,7 @@ async def test_verify_cross_app_creation_dependencies():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             },
@@ -615,7 +615,7 @@ async def test_detect_field_dependencies_on_fk_add_for_new_model():
                             "id": IntField(primary_key=True),
                             "name": CharField(max_length=100),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     }
                 }
             }
@@ -638,7 +638,7 @@ async def test_detect_field_dependencies_on_fk_add_for_new_model():
                             "user.User", related_name="teacher", to_field="id"
                         ),
                     },
-                    "indexes": [],
+                    "indexes": {},
                 }
             }
         },
@@ -650,7 +650,7 @@ async def test_detect_field_dependencies_on_fk_add_for_new_model():
                         "id": IntField(primary_key=True),
                         "name": CharField(max_length=100),
                     },
-                    "indexes": [],
+                    "indexes": {},
                 }
             }
         },
@@ -729,7 +729,7 @@ async def test_detect_cycle_error_on_creation():
                                 "test.ModelB", related_name="a_s"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                     "ModelB": {
                         "table": "model_b",
@@ -739,7 +739,7 @@ async def test_detect_cycle_error_on_creation():
                                 "test.ModelA", related_name="b_s"
                             ),
                         },
-                        "indexes": [],
+                        "indexes": {},
                     },
                 }
             }
@@ -0,0 +1,193 @@
+"""
+Tests for the JSON serialization of schemas and states.
+"""
+
+import json
+from decimal import Decimal
+from enum import Enum, IntEnum
+
+import pytest
+from tortoise.fields import (
+    CharEnumField,
+    CharField,
+    DatetimeField,
+    DecimalField,
+    ForeignKeyField,
+    IntEnumField,
+    IntField,
+    JSONField,
+    ManyToManyField,
+)
+from tortoise.contrib.postgres.indexes import PostgreSQLIndex
+from tortoise.indexes import Index
+
+from tortoise_pathway.index_ext import UniqueIndex
+from tortoise_pathway.operations import AddField, AddIndex, CreateModel
+from tortoise_pathway.serialization import (
+    schema_from_json,
+    schema_to_json,
+    state_from_json,
+    state_to_json,
+)
+from tortoise_pathway.state import State
+
+
+class Status(Enum):
+    DRAFT = "draft"
+    PUBLISHED = "published"
+
+
+class Priority(IntEnum):
+    LOW = 1
+    HIGH = 2
+
+
+lambda_default = lambda: "x"  # noqa: E731
+
+
+def make_state() -> State:
+    state = State()
+    state.apply_operation(
+        CreateModel(
+            model="blog.User",
+            table="users",
+            fields={
+                "id": IntField(primary_key=True),
+                "name": CharField(max_length=100, description="Full name"),
+            },
+        )
+    )
+    state.apply_operation(
+        CreateModel(
+            model="blog.Post",
+            table="posts",
+            fields={
+                "id": IntField(primary_key=True),
+                "status": CharEnumField(Status, default=Status.DRAFT),
+                "priority": IntEnumField(Priority, default=Priority.LOW),
+                "price": DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00")),
+                "created_at": DatetimeField(auto_now_add=True),
+                "meta": JSONField(default={"tags": [], "draft": True}),
+                "author": ForeignKeyField(
+                    "blog.User", related_name="posts", on_delete="SET NULL", null=True
+                ),
+            },
+        )
+    )
+    state.apply_operation(
+        AddField(
+            model="blog.Post",
+            field_object=ManyToManyField(
+                "blog.User", related_name="liked_posts", through="post_likes"
+            ),
+            field_name="likes",
+        )
+    )
+    state.apply_operation(
+        AddIndex(model="blog.Post", index=Index(fields=["created_at"], name="idx_created"))
+    )
+    state.apply_operation(
+        AddIndex(
+            model="blog.Post",
+            index=UniqueIndex(fields=["author", "status"], name="uniq_author_status"),
+        )
+    )
+    state.apply_operation(
+        AddIndex(
+            model="blog.Post",
+            index=PostgreSQLIndex(
+                fields=["status"], name="idx_published", condition={"status": "published"}
+            ),
+        )
+    )
+    return state
+
+
+def test_state_round_trip():
+    """Test that a state is restored from its JSON representation."""
+    state = make_state()
+
+    restored = state_from_json(state_to_json(state))
+
+    assert restored.fingerprint() == state.fingerprint()
+    for model_name in ["User", "Post"]:
+        assert restored.get_table_name("blog", model_name) == state.get_table_name(
+            "blog", model_name
+        )
+        assert restored.get_fields("blog", model_name) == state.get_fields("blog", model_name)
+        assert sorted(restored.get_indexes("blog", model_name)) == sorted(
+            state.get_indexes("blog", model_name)
+        )
+
+    # M2M fields are serialized on both sides of the relation
+    likes = restored.get_field("blog", "Post", "likes")
+    assert likes.through == "post_likes"
+    assert restored.get_field("blog", "User", "liked_posts").model_name == "blog.Post"
+
+    unique_index = restored.get_index("blog", "Post", "uniq_author_status")
+    assert isinstance(unique_index, UniqueIndex)
+    assert unique_index.fields == ["author", "status"]
+
+    # the condition of a partial index is only kept in its attributes
+    partial_index = restored.get_index("blog", "Post", "idx_published")
+    assert isinstance(partial_index, PostgreSQLIndex)
+    assert partial_index.extra == " WHERE status = 'published'"
+
+    assert restored.get_field("blog", "Post", "meta").default == {"tags": [], "draft": True}
+
+    status = restored.get_field("blog", "Post", "status")
+    assert status.default is Status.DRAFT
+    assert status.to_field().enum_type is Status
+
+
+def test_json_is_compact_and_versioned():
+    """Test the format of the serialized schema."""
+    data = state_to_json(make_state())
+
+    assert '": ' not in data and '", "' not in data
+    assert json.loads(data)["version"] == 1
+
+
+def test_unsupported_version():
+    """Test that the data of an unknown format version is rejected."""
+    data = json.loads(state_to_json(make_state()))
+    data["version"] = 999
+
+    with pytest.raises(ValueError, match="version"):
+        schema_from_json(json.dumps(data))
+
+
+def test_unserializable_value():
+    """Test that values without a JSON representation are rejected."""
+    schema = {
+        "app": {
+            "models": {
+                "Model": {
+                    "table": "model",
+                    "fields": {"name": CharField(max_length=10, default=object())},
+                    "indexes": {},
+                }
+            }
+        }
+    }
+
+    with pytest.raises(TypeError):
+        schema_to_json(schema)
+
+
+def test_lambda_default_is_not_serializable():
+    """Test that a lambda default is rejected, even one defined at the module level."""
+    schema = {
+        "app": {
+            "models": {
+                "Model": {
+                    "table": "model",
+                    "fields": {"name": CharField(max_length=10, default=lambda_default)},
+                    "indexes": {},
+                }
+            }
+        }
+    }
+
+    with pytest.raises(TypeError, match="<lambda>"):
+        schema_to_json(schema)
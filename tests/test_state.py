@@ -2,19 +2,30 @@
 Tests for the State class.
 """
 
+import pytest
 from tortoise.fields import IntField, CharField, TextField, DatetimeField
+from tortoise.indexes import Index
 
+from tortoise_pathway.field_ext import FieldSpec
 from tortoise_pathway.state import State
 from tortoise_pathway.operations import (
+    Operation,
     CreateModel,
     AddField,
+    AddIndex,
     DropField,
+    DropIndex,
     AlterField,
     RenameField,
     RenameModel,
+    RunSQL,
 )
 
 
+def field_specs(fields):
+    return {name: FieldSpec.from_field(field) for name, field in fields.items()}
+
+
 async def test_build_empty_state():
     """Test building an empty state."""
     state = State()
@@ -48,8 +59,8 @@ async def test_apply_create_model():
             "models": {
                 "TestModel": {
                     "table": "test_model",
-                    "fields": fields,
-                    "indexes": [],
+                    "fields": field_specs(fields),
+                    "indexes": {},
                 },
             }
         }
@@ -99,8 +110,8 @@ async def test_apply_add_field():
             "models": {
                 "TestModel": {
                     "table": "test_model",
-                    "fields": expected_fields,
-                    "indexes": [],
+                    "fields": field_specs(expected_fields),
+                    "indexes": {},
                 },
             }
         }
@@ -148,8 +159,8 @@ async def test_apply_drop_field():
             "models": {
                 "TestModel": {
                     "table": "test_model",
-                    "fields": expected_fields,
-                    "indexes": [],
+                    "fields": field_specs(expected_fields),
+                    "indexes": {},
                 },
             }
         }
@@ -200,8 +211,8 @@ async def test_apply_alter_field():
             "models": {
                 "TestModel": {
                     "table": "test_model",
-                    "fields": expected_fields,
-                    "indexes": [],
+                    "fields": field_specs(expected_fields),
+                    "indexes": {},
                 },
             }
         }
@@ -252,8 +263,8 @@ async def test_apply_rename_field():
             "models": {
                 "TestModel": {
                     "table": "test_model",
-                    "fields": expected_fields,
-                    "indexes": [],
+                    "fields": field_specs(expected_fields),
+                    "indexes": {},
                 },
             }
         }
@@ -289,22 +300,72 @@ async def test_apply_rename_field_with_new_column_name():
 
     state.apply_operation(rename_field_op)
 
+    details_field = state.get_field("test_app", "TestModel", "details")
     assert state.get_schema() == {
         "test_app": {
             "models": {
                 "TestModel": {
                     "table": "test_model",
                     "fields": {
-                        "id": fields["id"],
-                        "name": fields["name"],
-                        "details": fields["description"],
+                        "id": FieldSpec.from_field(fields["id"]),
+                        "name": FieldSpec.from_field(fields["name"]),
+                        "details": FieldSpec.from_field(TextField(source_field="details_column")),
                     },
-                    "indexes": [],
+                    "indexes": {},
                 },
             }
         }
     }
+    assert details_field.field_class is TextField
     assert state.get_column_name("test_app", "TestModel", "details") == "details_column"
+    # the field of the operation is not modified
+    assert fields["description"].source_field is None
+
+
+async def test_snapshots_are_not_affected_by_later_operations():
+    """Test that snapshots share the schema with the state but are not modified by it."""
+    state = State()
+
+    fields = {
+        "id": IntField(primary_key=True),
+        "name": CharField(max_length=100),
+    }
+    state.apply_operation(
+        CreateModel(model="test_app.TestModel", table="test_model", fields=fields)
+    )
+    state.apply_operation(
+        CreateModel(model="test_app.OtherModel", table="other_model", fields=fields)
+    )
+    state.snapshot("initial")
+
+    state.apply_operation(
+        AddField(
+            model="test_app.TestModel",
+            field_object=CharField(max_length=255),
+            field_name="email",
+        )
+    )
+    state.apply_operation(
+        RenameField(
+            model="test_app.TestModel", field_name="name", new_column_name="title"
+        )
+    )
+    state.snapshot("changed")
+
+    prev = state.prev()
+    assert set(prev.get_fields("test_app", "TestModel")) == {"id", "name"}
+    assert prev.get_column_name("test_app", "TestModel", "name") == "name"
+    assert set(state.get_fields("test_app", "TestModel")) == {"id", "name", "email"}
+    assert state.get_column_name("test_app", "TestModel", "name") == "title"
+
+    # the untouched model is shared between the copies
+    assert state.copy().get_model("test_app", "OtherModel") is state.get_model(
+        "test_app", "OtherModel"
+    )
+
+    # modifying the previous state doesn't affect the snapshots
+    prev.apply_operation(DropField(model="test_app.TestModel", field_name="name"))
+    assert set(state.prev().get_fields("test_app", "TestModel")) == {"id", "name"}
 
 
 async def test_apply_rename_model_with_new_table_name():
@@ -338,8 +399,8 @@ async def test_apply_rename_model_with_new_table_name():
             "models": {
                 "TestModel": {
                     "table": "new_test_model",  # Table name changed
-                    "fields": fields,
-                    "indexes": [],
+                    "fields": field_specs(fields),
+                    "indexes": {},
                 },
             }
         }
@@ -377,8 +438,8 @@ async def test_apply_rename_model_with_new_model_name():
             "models": {
                 "NewTestModel": {
                     "table": "test_model",
-                    "fields": fields,
-                    "indexes": [],
+                    "fields": field_specs(fields),
+                    "indexes": {},
                 },
             }
         }
@@ -412,8 +473,8 @@ async def test_get_schema():
             "models": {
                 "TestModel": {
                     "table": "test_model",
-                    "fields": fields,
-                    "indexes": [],
+                    "fields": field_specs(fields),
+                    "indexes": {},
                 },
             }
         }
@@ -441,8 +502,8 @@ async def test_get_model():
     # Compare the model to the expected model
     assert state.get_model("test_app", "TestModel") == {
         "table": "test_model",
-        "fields": fields,
-        "indexes": [],
+        "fields": field_specs(fields),
+        "indexes": {},
     }
 
 
@@ -506,3 +567,144 @@ async def test_get_column_name():
     assert id_column == "id"  # Default column name
     assert name_column == "name"  # Default column name
     assert custom_column == "custom_column"  # Custom column name from source_field
+
+
+async def test_rewind_from_checkpoints():
+    """Test rebuilding historical states from the checkpoints and the journal."""
+    state = State()
+    state.checkpoint_interval = 3
+
+    state.apply_operation(
+        CreateModel(
+            model="test_app.TestModel",
+            table="test_model",
+            fields={"id": IntField(primary_key=True)},
+        )
+    )
+    state.snapshot("0")
+    for i in range(1, 10):
+        state.apply_operation(
+            AddField(
+                model="test_app.TestModel",
+                field_object=CharField(max_length=100),
+                field_name=f"field_{i}",
+            )
+        )
+        state.snapshot(str(i))
+
+    # only every third snapshot is stored as a full state
+    assert sorted(state._checkpoints) == [3, 6, 9]
+
+    for count in range(1, 11):
+        rewound = state.rewind(count)
+        assert len(rewound.get_fields("test_app", "TestModel")) == count
+        if count > 1:
+            # the rewound state has its own history, so it can be rewound further
+            previous = rewound.prev()
+            assert len(previous.get_fields("test_app", "TestModel")) == count - 1
+
+    assert state.rewind(0).get_schema() == {}
+
+
+async def test_apply_add_and_drop_index():
+    """Test that indexes are kept by name in the order they were added."""
+    state = State(
+        schema={
+            "test_app": {
+                "models": {
+                    "TestModel": {
+                        "table": "test_model",
+                        "fields": {"id": IntField(primary_key=True)},
+                        "indexes": [Index(fields=["id"], name="idx_id")],
+                    }
+                }
+            }
+        }
+    )
+    name_index = Index(fields=["name"], name="idx_name")
+    email_index = Index(fields=["email"], name="idx_email")
+
+    state.apply_operation(AddIndex(model="test_app.TestModel", index=name_index))
+    state.apply_operation(AddIndex(model="test_app.TestModel", index=email_index))
+    state.apply_operation(DropIndex(model="test_app.TestModel", index_name="idx_id"))
+
+    indexes = state.get_indexes("test_app", "TestModel")
+    assert list(indexes) == ["idx_name", "idx_email"]
+    assert state.get_index("test_app", "TestModel", "idx_email") is email_index
+
+    with pytest.raises(KeyError):
+        state.apply_operation(DropIndex(model="test_app.TestModel", index_name="idx_id"))
+
+
+class AddTimestamps(Operation):
+    """A custom operation that adds the created_at and updated_at fields."""
+
+    def forward_sql(self, state, schema_manager):
+        return ""
+
+    def backward_sql(self, state, schema_manager):
+        return ""
+
+
+def apply_add_timestamps(state: State, operation: AddTimestamps) -> None:
+    state.apply_operation(
+        AddField(operation.model, DatetimeField(auto_now_add=True), "created_at")
+    )
+    state.apply_operation(
+        AddField(operation.model, DatetimeField(auto_now=True), "updated_at")
+    )
+
+
+class AddAuditTimestamps(AddTimestamps):
+    """A subclass of a registered custom operation."""
+
+
+@pytest.fixture
+def handler_registry(monkeypatch):
+    """Keep the handlers registered by a test out of the other tests."""
+    monkeypatch.setattr(State, "_handlers", dict(State._handlers))
+    monkeypatch.setattr(State, "_resolved_handlers", {})
+
+
+async def test_apply_custom_operation(handler_registry):
+    """Test that custom operations are applied by their registered handlers."""
+    State.register_operation(AddTimestamps, apply_add_timestamps)
+    state = State()
+    for model_name in ["TestModel", "OtherModel"]:
+        state.apply_operation(
+            CreateModel(
+                model=f"test_app.{model_name}",
+                table=model_name.lower(),
+                fields={"id": IntField(primary_key=True)},
+            )
+        )
+    state.snapshot("0001_initial")
+    state.apply_operation(AddTimestamps(model="test_app.TestModel"))
+    state.apply_operation(AddAuditTimestamps(model="test_app.OtherModel"))
+    state.snapshot("0002_timestamps")
+
+    timestamped = {"id", "created_at", "updated_at"}
+    assert set(state.get_fields("test_app", "TestModel")) == timestamped
+    assert set(state.get_fields("test_app", "OtherModel")) == timestamped
+    # only the custom operation is journaled, so rewinding applies the built-in ones once
+    assert state.rewind(2).get_schema() == state.get_schema()
+    assert set(state.prev().get_fields("test_app", "TestModel")) == {"id"}
+
+
+async def test_apply_run_sql():
+    """Test that RunSQL doesn't change the state."""
+    state = State()
+    state.apply_operation(RunSQL("UPDATE test_model SET name = 'test'"))
+    assert state.get_schema() == {}
+
+
+async def test_apply_unknown_operation(handler_registry):
+    """Test that operations without a registered handler are skipped with a warning."""
+
+    class UnknownOperation(Operation):
+        pass
+
+    state = State()
+    with pytest.warns(UserWarning, match="UnknownOperation"):
+        state.apply_operation(UnknownOperation(model="test_app.TestModel"))
+    assert state.get_schema() == {}
@@ -0,0 +1,161 @@
+"""
+Tests for the on-disk cache of the replayed state.
+"""
+
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from tortoise.fields import CharField, IntField
+
+from tortoise_pathway.migration import Migration
+from tortoise_pathway.migration_manager import MigrationManager
+from tortoise_pathway.operations import AddField, CreateModel
+from tortoise_pathway.state import State
+from tortoise_pathway.state_cache import StateCache
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_every_snapshot(monkeypatch):
+    """Make rewinding free, so that only the replayed migrations are counted."""
+    monkeypatch.setattr(State, "checkpoint_interval", 1)
+
+
+def make_migration(name: str, operations: list, checksum: str | None = None) -> Mock:
+    migration = Mock(spec=Migration)
+    migration.app_name = "app"
+    migration.name.return_value = name
+    migration.checksum.return_value = checksum or f"checksum-{name}"
+    migration.operations = operations
+    return migration
+
+
+def make_manager(cache_path: Path, migrations: list) -> MigrationManager:
+    manager = MigrationManager(["app"], state_cache=True)
+    manager.state_cache = StateCache(cache_path)
+    manager.migrations = migrations
+    manager.applied_migrations = {("app", m.name()) for m in migrations}
+    return manager
+
+
+def count_replayed_operations(manager: MigrationManager) -> int:
+    with patch.object(
+        State, "apply_operation", autospec=True, side_effect=State.apply_operation
+    ) as apply_operation:
+        manager._rebuild_state()
+    return apply_operation.call_count
+
+
+def test_cache_hit_skips_replay(tmp_path: Path):
+    """Test that an unchanged set of migrations is restored without replaying it."""
+    cache_path = tmp_path / "cache"
+    migrations = [
+        make_migration(
+            "0001_initial",
+            [CreateModel("app.User", "users", {"id": IntField(primary_key=True)})],
+        ),
+        make_migration(
+            "0002_user_email",
+            [AddField("app.User", CharField(max_length=255), "email")],
+        ),
+    ]
+
+    assert count_replayed_operations(make_manager(cache_path, migrations)) == 2
+    assert cache_path.exists()
+
+    manager = make_manager(cache_path, migrations)
+    assert count_replayed_operations(manager) == 0
+
+    assert set(manager.migration_state.get_fields("app", "User")) == {"id", "email"}
+    assert set(manager.applied_state.get_fields("app", "User")) == {"id", "email"}
+    assert set(manager.applied_state.prev().get_fields("app", "User")) == {"id"}
+
+
+def test_cache_resumes_from_prefix(tmp_path: Path):
+    """Test that only the appended migrations are replayed."""
+    cache_path = tmp_path / "cache"
+    initial = make_migration(
+        "0001_initial",
+        [CreateModel("app.User", "users", {"id": IntField(primary_key=True)})],
+    )
+    count_replayed_operations(make_manager(cache_path, [initial]))
+
+    appended = make_migration(
+        "0002_user_email",
+        [AddField("app.User", CharField(max_length=255), "email")],
+    )
+    manager = make_manager(cache_path, [initial, appended])
+    manager.applied_migrations = {("app", "0001_initial")}
+
+    assert count_replayed_operations(manager) == 1
+    assert set(manager.migration_state.get_fields("app", "User")) == {"id", "email"}
+    assert set(manager.applied_state.get_fields("app", "User")) == {"id"}
+
+
+def test_changed_migration_invalidates_cache(tmp_path: Path):
+    """Test that the replay restarts from the first migration whose content changed."""
+    cache_path = tmp_path / "cache"
+    migrations = [
+        make_migration(
+            "0001_initial",
+            [CreateModel("app.User", "users", {"id": IntField(primary_key=True)})],
+        ),
+        make_migration(
+            "0002_user_email",
+            [AddField("app.User", CharField(max_length=255), "email")],
+        ),
+    ]
+    count_replayed_operations(make_manager(cache_path, migrations))
+
+    migrations[1] = make_migration(
+        "0002_user_email",
+        [AddField("app.User", CharField(max_length=100), "email")],
+        checksum="edited",
+    )
+    manager = make_manager(cache_path, migrations)
+
+    assert count_replayed_operations(manager) == 1
+    email = manager.migration_state.get_field("app", "User", "email")
+    assert email.max_length == 100
+
+
+def test_corrupted_cache_is_ignored(tmp_path: Path):
+    """Test that an unreadable cache file is treated as a cache miss."""
+    cache_path = tmp_path / "cache"
+    cache_path.write_bytes(b"not a pickle")
+
+    migrations = [
+        make_migration(
+            "0001_initial",
+            [CreateModel("app.User", "users", {"id": IntField(primary_key=True)})],
+        ),
+    ]
+
+    assert count_replayed_operations(make_manager(cache_path, migrations)) == 1
+    assert count_replayed_operations(make_manager(cache_path, migrations)) == 0
+
+
+def test_unpicklable_state_is_not_cached(tmp_path: Path):
+    """Test that a state that can't be pickled is replayed instead of failing."""
+    cache_path = tmp_path / "cache"
+    migrations = [
+        make_migration(
+            "0001_initial",
+            [
+                CreateModel(
+                    "app.User",
+                    "users",
+                    {
+                        "id": IntField(primary_key=True),
+                        "name": CharField(max_length=255, default=lambda: "anonymous"),
+                    },
+                )
+            ],
+        ),
+    ]
+
+    assert count_replayed_operations(make_manager(cache_path, migrations)) == 1
+    assert not cache_path.exists()
+    assert not cache_path.with_name("cache.tmp").exists()
+    assert count_replayed_operations(make_manager(cache_path, migrations)) == 1
@@ -2,4 +2,4 @@
 TortoisePath - A schema migration tool for Tortoise ORM
 """
 
-__version__ = "0.1.0"
+__version__ = "0.2.1"
@@ -5,21 +5,26 @@ This module provides a command-line interface for managing migrations.
 """
 
 import sys
+import json
 import asyncio
 import argparse
 import importlib
 import functools
 import traceback
+from contextlib import nullcontext
+from pathlib import Path
 from typing import Dict, Any, Callable, TypeVar, Coroutine
 
 from tortoise import Tortoise
 from tortoise.exceptions import ConfigurationError
 
-from tortoise_pathway.migration_manager import MigrationManager
+from tortoise_pathway.migration_manager import TRANSACTION_MODES, MigrationManager
 
 
 T = TypeVar("T")
 
+FINGERPRINT_FILE = "fingerprint.json"
+
 
 def close_connections_after(
     func: Callable[..., Coroutine[Any, Any, T]],
@@ -107,22 +112,78 @@ async def make(args: argparse.Namespace) -> None:
     # The migrations directory is now the base directory, no need to join with app name
     migration_dir = args.directory or "migrations"
 
-    manager = MigrationManager(apps, migration_dir)
+    manager = MigrationManager(
+        apps, migration_dir, state_cache=args.state_cache, lazy=args.lazy, jobs=args.jobs
+    )
     await manager.initialize()
 
     name = args.name or None
     auto = not args.empty
 
     migrations = []
-    async for migration in manager.create_migrations(name, app=app, auto=auto):
-        print(f"Created migration {migration.display_name()} at {migration.path()}")
-        migrations.append(migration)
+    try:
+        async for migration in manager.create_migrations(
+            name, app=app, auto=auto, concurrent_indexes=args.concurrent_indexes
+        ):
+            print(f"Created migration {migration.display_name()} at {migration.path()}")
+            migrations.append(migration)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
     if not migrations:
         print("No changes detected.")
         return
 
 
+@close_connections_after
+async def merge(args: argparse.Namespace) -> None:
+    """Create a migration that merges the branches of the migration graph."""
+    config = await init_tortoise(args.config)
+    app, apps = get_app_name(args, config), get_app_names(config)
+
+    migration_dir = args.directory or "migrations"
+
+    # the merge migration only needs the names and the dependencies of the migrations
+    manager = MigrationManager(apps, migration_dir, lazy=True, jobs=args.jobs)
+    manager.load_migrations(rebuild_state=False)
+
+    try:
+        migration = manager.create_merge_migration(app=app, name=args.name)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if migration is None:
+        print("No branches to merge.")
+        return
+
+    print(f"Created migration {migration.display_name()} at {migration.path()}")
+
+
+@close_connections_after
+async def squash(args: argparse.Namespace) -> None:
+    """Squash a range of migrations of an app into one migration."""
+    config = await init_tortoise(args.config)
+    app, apps = get_app_name(args, config), get_app_names(config)
+
+    migration_dir = args.directory or "migrations"
+
+    manager = MigrationManager(
+        apps, migration_dir, state_cache=args.state_cache, lazy=args.lazy, jobs=args.jobs
+    )
+    await manager.initialize()
+
+    try:
+        migration = manager.squash_migrations(app, args.end, start=args.start, name=args.name)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Created migration {migration.display_name()} at {migration.path()}")
+    print(f"It replaces {len(migration.replaces)} migration(s) and can be applied instead of them.")
+
+
 @close_connections_after
 async def migrate(args: argparse.Namespace) -> None:
     """Apply migrations to the database."""
@@ -132,12 +193,37 @@ async def migrate(args: argparse.Namespace) -> None:
     # The migrations directory is now the base directory, no need to join with app name
     migration_dir = args.directory or "migrations"
 
-    manager = MigrationManager(apps, migration_dir)
-    await manager.initialize()
+    manager = MigrationManager(
+        apps, migration_dir, state_cache=args.state_cache, lazy=args.lazy, jobs=args.jobs
+    )
+
+    lock = nullcontext() if args.dry_run else manager.lock(timeout=args.lock_timeout)
+    try:
+        async with lock:
+            # the migrations are loaded once the lock is acquired, a process that waited
+            # for another one finds the migrations applied and has nothing left to do
+            await manager.initialize()
+            await apply_pending_migrations(manager, args, app, apps)
+    except TimeoutError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+async def apply_pending_migrations(
+    manager: MigrationManager, args: argparse.Namespace, app: str | None, apps: list[str]
+) -> None:
+    """Apply the pending migrations, or bootstrap the database."""
+    if args.bootstrap:
+        await bootstrap(manager, app, run_sql=args.run_sql, dry_run=args.dry_run)
+        return
 
     pending = manager.get_pending_migrations(app=app)
 
     if not pending:
+        if not args.dry_run:
+            # databases migrated before the state was recorded pass the check after a migrate
+            for app_name in [app] if app else apps:
+                await manager.record_applied_state(app_name)
         print("No pending migrations.")
         return
 
@@ -152,7 +238,9 @@ async def migrate(args: argparse.Namespace) -> None:
 
     try:
         migrations = []
-        async for migration in manager.apply_migrations(app=app):
+        async for migration in manager.apply_migrations(
+            app=app, optimize=args.optimize, transaction=args.transaction
+        ):
             print(f"Applied migration: {migration.display_name()}")
             migrations.append(migration)
 
@@ -167,6 +255,36 @@ async def migrate(args: argparse.Namespace) -> None:
         print(traceback.format_exc())
 
 
+async def bootstrap(
+    manager: MigrationManager, app: str | None, run_sql: bool, dry_run: bool
+) -> None:
+    """Create the schema of a new database and record all migrations as applied."""
+    if app:
+        print("Error: --bootstrap creates the schema of all apps and can't be used with --app")
+        sys.exit(1)
+
+    if dry_run:
+        print("SQL to bootstrap the database:")
+        print(manager.get_bootstrap_sql(run_sql=run_sql))
+        return
+
+    try:
+        migrations = await manager.bootstrap(run_sql=run_sql)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Created the schema and recorded {len(migrations)} migration(s) as applied.")
+
+    run_sql_migrations = manager.get_run_sql_migrations()
+    if run_sql_migrations:
+        print("Ran the RunSQL operations of:" if run_sql else "Skipped the RunSQL operations of:")
+        for migration in run_sql_migrations:
+            print(f"  - {migration.display_name()}")
+        if not run_sql:
+            print("Use --run-sql to run them, e.g. if they insert data.")
+
+
 @close_connections_after
 async def rollback(args: argparse.Namespace) -> None:
     """Revert the most recent migration."""
@@ -176,22 +294,27 @@ async def rollback(args: argparse.Namespace) -> None:
     # The migrations directory is now the base directory, no need to join with app name
     migration_dir = args.directory or "migrations"
 
-    manager = MigrationManager(apps, migration_dir)
-    await manager.initialize()
+    manager = MigrationManager(
+        apps, migration_dir, state_cache=args.state_cache, lazy=args.lazy, jobs=args.jobs
+    )
 
     try:
-        if args.migration:
-            reverted = await manager.revert_migration(args.migration, app=app)
-        else:
-            reverted = await manager.revert_migration(app=app)
+        async with manager.lock(timeout=args.lock_timeout):
+            await manager.initialize()
 
-        if reverted:
-            print(f"Successfully reverted migration: {reverted.display_name()}")
-        else:
-            print("No migration was reverted.")
-    except Exception:
-        print("Error reverting migration:")
-        print(traceback.format_exc())
+            try:
+                reverted = await manager.revert_migration(app=app, migration_name=args.migration)
+
+                if reverted:
+                    print(f"Successfully reverted migration: {reverted.display_name()}")
+                else:
+                    print("No migration was reverted.")
+            except Exception:
+                print("Error reverting migration:")
+                print(traceback.format_exc())
+    except TimeoutError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
 
 @close_connections_after
@@ -203,8 +326,10 @@ async def showmigrations(args: argparse.Namespace) -> None:
     # The migrations directory is now the base directory, no need to join with app name
     migration_dir = args.directory or "migrations"
 
-    manager = MigrationManager(apps, migration_dir)
-    await manager.initialize()
+    # listing the migrations only needs their names and dependencies, which are parsed
+    # from the files without importing them
+    manager = MigrationManager(apps, migration_dir, lazy=True, jobs=args.jobs)
+    await manager.initialize(rebuild_state=False)
 
     applied = manager.get_applied_migrations(app=app)
     pending = manager.get_pending_migrations(app=app)
@@ -225,6 +350,49 @@ async def showmigrations(args: argparse.Namespace) -> None:
         print("  (none)")
 
 
+@close_connections_after
+async def fingerprint(args: argparse.Namespace) -> None:
+    """Write the fingerprints of the fully migrated database, for the check command."""
+    config = await init_tortoise(args.config)
+    apps = get_app_names(config)
+
+    migration_dir = args.directory or "migrations"
+    output = Path(args.output or Path(migration_dir) / FINGERPRINT_FILE)
+
+    manager = MigrationManager(
+        apps, migration_dir, state_cache=args.state_cache, lazy=args.lazy, jobs=args.jobs
+    )
+    manager.load_migrations()
+
+    output.write_text(json.dumps(manager.get_fingerprints(), indent=2, sort_keys=True) + "\n")
+    print(f"Fingerprints written to {output}")
+
+
+@close_connections_after
+async def check(args: argparse.Namespace) -> None:
+    """Check that the database is fully migrated, without loading the migrations."""
+    config = await init_tortoise(args.config)
+    apps = get_app_names(config)
+
+    migration_dir = args.directory or "migrations"
+    path = Path(args.fingerprint or Path(migration_dir) / FINGERPRINT_FILE)
+
+    try:
+        expected = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read fingerprints from {path}: {e}")
+        sys.exit(1)
+
+    manager = MigrationManager(apps, migration_dir)
+    outdated = await manager.check(expected)
+
+    if outdated:
+        print(f"Database is not up to date: {', '.join(outdated)}")
+        sys.exit(1)
+
+    print("Database is up to date.")
+
+
 def print_warning():
     RED = "\033[91m"
     RESET = "\033[0m"
@@ -234,6 +402,15 @@ def print_warning():
     )
 
 
+def add_lock_timeout_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--lock-timeout",
+        type=float,
+        default=300,
+        help="Seconds to wait for other processes that migrate the database (default: 300)",
+    )
+
+
 def main() -> None:
     """Main entry point for the command-line interface."""
     parser = argparse.ArgumentParser(description="Tortoise ORM migrations")
@@ -244,6 +421,22 @@ def main() -> None:
         required=True,
         help="Path to the Tortoise ORM configuration variable in dot notation (e.g., 'myapp.config.TORTOISE_ORM')",
     )
+    parser.add_argument(
+        "--state-cache",
+        action="store_true",
+        help="Cache the state replayed from migrations in the migrations directory",
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Import the migration files only when their operations are needed",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of threads to import the migration files on (default: 1)",
+    )
 
     subparsers = parser.add_subparsers(dest="command", help="Command to execute")
 
@@ -257,6 +450,35 @@ def main() -> None:
     make_parser.add_argument(
         "--directory", help="Base migrations directory (default: 'migrations')"
     )
+    make_parser.add_argument(
+        "--concurrent-indexes",
+        action="store_true",
+        help="Add and drop the indexes of existing tables concurrently (PostgreSQL)",
+    )
+
+    # merge command
+    merge_parser = subparsers.add_parser(
+        "merge", help="Create a migration that merges the leaves of the migration graph"
+    )
+    merge_parser.add_argument("--app", help="App name (default: the app of the leaves)")
+    merge_parser.add_argument("--name", help="Migration name (default: 'merge')")
+    merge_parser.add_argument(
+        "--directory", help="Base migrations directory (default: 'migrations')"
+    )
+
+    # squash command
+    squash_parser = subparsers.add_parser(
+        "squash", help="Squash a range of migrations into one migration"
+    )
+    squash_parser.add_argument("--app", required=True, help="App name")
+    squash_parser.add_argument(
+        "--start", help="First migration to squash (default: the first migration of the app)"
+    )
+    squash_parser.add_argument("--end", required=True, help="Last migration to squash")
+    squash_parser.add_argument("--name", help="Migration name (default: 'squashed')")
+    squash_parser.add_argument(
+        "--directory", help="Base migrations directory (default: 'migrations')"
+    )
 
     # migrate command
     migrate_parser = subparsers.add_parser("migrate", help="Apply migrations")
@@ -265,6 +487,30 @@ def main() -> None:
         "--directory", help="Base migrations directory (default: 'migrations')"
     )
     migrate_parser.add_argument("--dry-run", action="store_true", help="Show SQL without applying")
+    migrate_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Optimize the operations of all pending migrations together before applying them",
+    )
+    migrate_parser.add_argument(
+        "--transaction",
+        choices=TRANSACTION_MODES,
+        default="migration",
+        help="Apply every migration in a transaction, all pending migrations in one transaction, "
+        "or no transactions (default: migration)",
+    )
+    migrate_parser.add_argument(
+        "--bootstrap",
+        action="store_true",
+        help="Create the schema of a new database from the final state of the migrations "
+        "and record all migrations as applied",
+    )
+    migrate_parser.add_argument(
+        "--run-sql",
+        action="store_true",
+        help="With --bootstrap, also run the RunSQL operations of the migrations",
+    )
+    add_lock_timeout_argument(migrate_parser)
 
     # rollback command
     rollback_parser = subparsers.add_parser("rollback", help="Revert migrations")
@@ -273,6 +519,7 @@ def main() -> None:
     rollback_parser.add_argument(
         "--directory", help="Base migrations directory (default: 'migrations')"
     )
+    add_lock_timeout_argument(rollback_parser)
 
     # showmigrations command
     show_parser = subparsers.add_parser(
@@ -283,6 +530,29 @@ def main() -> None:
         "--directory", help="Base migrations directory (default: 'migrations')"
     )
 
+    # fingerprint command
+    fingerprint_parser = subparsers.add_parser(
+        "fingerprint", help="Write the fingerprints of the migrations for the check command"
+    )
+    fingerprint_parser.add_argument(
+        "--directory", help="Base migrations directory (default: 'migrations')"
+    )
+    fingerprint_parser.add_argument(
+        "--output", help=f"Output file (default: '<directory>/{FINGERPRINT_FILE}')"
+    )
+
+    # check command
+    check_parser = subparsers.add_parser(
+        "check", help="Check that the database is fully migrated"
+    )
+    check_parser.add_argument(
+        "--directory", help="Base migrations directory (default: 'migrations')"
+    )
+    check_parser.add_argument(
+        "--fingerprint",
+        help=f"File written by the fingerprint command (default: '<directory>/{FINGERPRINT_FILE}')",
+    )
+
     args = parser.parse_args()
 
     print_warning()
@@ -293,12 +563,20 @@ def main() -> None:
 
     if args.command == "make":
         asyncio.run(make(args))
+    elif args.command == "merge":
+        asyncio.run(merge(args))
+    elif args.command == "squash":
+        asyncio.run(squash(args))
     elif args.command == "migrate":
         asyncio.run(migrate(args))
     elif args.command == "rollback":
         asyncio.run(rollback(args))
     elif args.command == "showmigrations":
         asyncio.run(showmigrations(args))
+    elif args.command == "fingerprint":
+        asyncio.run(fingerprint(args))
+    elif args.command == "check":
+        asyncio.run(check(args))
 
 
 if __name__ == "__main__":
@@ -2,11 +2,170 @@
 Utility functions for Tortoise Field objects.
 """
 
+from typing import Any, Dict, Tuple, Type
+
 from tortoise.fields import Field, CharField, DatetimeField
-from tortoise.fields.relational import RelationalField
+from tortoise.fields.relational import OneToOneFieldInstance, RelationalField
+
+
+# The attributes of Tortoise fields that describe the database column. Not every field has
+# all of them, e.g. only CharField has max_length.
+FIELD_SPEC_ATTRS = (
+    "source_field",
+    "pk",
+    "null",
+    "default",
+    "unique",
+    "index",
+    "description",
+    "max_length",
+    "max_digits",
+    "decimal_places",
+    "enum_type",
+    "auto_now",
+    "auto_now_add",
+    "model_name",
+    "related_name",
+    "on_delete",
+    "to_field",
+    "db_constraint",
+    "through",
+    "forward_key",
+    "backward_key",
+)
+
+
+class FieldSpec:
+    """
+    An immutable description of a Tortoise field.
+
+    Tortoise Field objects are mutable and carry references to models, validators and the
+    like, so State keeps a FieldSpec instead: the field class and the attributes from
+    FIELD_SPEC_ATTRS that the field has. The attributes are accessible the same way as on
+    the field itself, e.g. `spec.max_length`, and `hasattr` tells whether the field has them.
+
+    Field specs are hashable and compared by value, so they can be shared between states
+    and compared cheaply.
+
+    Args:
+        field_class: The class of the described field.
+        attrs: The attributes of the field.
+    """
+
+    __slots__ = ("field_class", "_attrs", "_hash")
+
+    field_class: Type[Field]
+    _attrs: Dict[str, Any]
+    _hash: int
+
+    def __init__(self, field_class: Type[Field], attrs: Dict[str, Any]):
+        object.__setattr__(self, "field_class", field_class)
+        object.__setattr__(self, "_attrs", dict(attrs))
+        object.__setattr__(self, "_hash", hash((field_class, self._hashable_attrs())))
+
+    @classmethod
+    def from_field(cls, field: "Field | FieldSpec") -> "FieldSpec":
+        """Describe a Field object. A FieldSpec is returned as is."""
+        if isinstance(field, FieldSpec):
+            return field
+
+        attrs = {attr: getattr(field, attr) for attr in FIELD_SPEC_ATTRS if hasattr(field, attr)}
+        return cls(field.__class__, attrs)
+
+    def to_field(self) -> Field:
+        """
+        Create a new Field object from the spec.
+
+        The field is constructed with the keyword arguments that correspond to the attributes,
+        so it is not bound to any model.
+        """
+        kwargs: Dict[str, Any] = {}
+        for attr, value in self._attrs.items():
+            if attr in ("pk", "index", "auto_now", "auto_now_add"):
+                continue
+            if attr in ("source_field", "default", "description") and value is None:
+                continue
+            kwargs[attr] = value
 
+        # primary keys and one-to-one relations are always unique, and Tortoise rejects
+        # the explicit flags on some of them
+        if self._attrs.get("pk"):
+            kwargs["primary_key"] = True
+            kwargs.pop("unique", None)
+        else:
+            kwargs["db_index"] = self._attrs.get("index", False)
+            if issubclass(self.field_class, OneToOneFieldInstance):
+                kwargs.pop("unique", None)
+
+        # Tortoise sets auto_now_add whenever auto_now is set, but only one of them can be passed
+        if self._attrs.get("auto_now"):
+            kwargs["auto_now"] = True
+        elif self._attrs.get("auto_now_add"):
+            kwargs["auto_now_add"] = True
+
+        return self.field_class(**kwargs)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get the attributes of the spec."""
+        return dict(self._attrs)
+
+    def replace(self, **changes: Any) -> "FieldSpec":
+        """Return a copy of the spec with the given attributes changed."""
+        return FieldSpec(self.field_class, {**self._attrs, **changes})
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for names that are not slots, guard the private ones for unpickling
+        if not name.startswith("_"):
+            try:
+                return self._attrs[name]
+            except KeyError:
+                pass
+        raise AttributeError(f"{self.field_class.__name__} has no attribute {name}")
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("FieldSpec is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("FieldSpec is immutable")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FieldSpec):
+            return NotImplemented
+        return (
+            self._hash == other._hash
+            and self.field_class is other.field_class
+            and self._attrs == other._attrs
+        )
 
-def field_db_column(field: Field, field_name: str) -> str:
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __copy__(self) -> "FieldSpec":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "FieldSpec":
+        return self
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (FieldSpec, (self.field_class, self._attrs))
+
+    def __repr__(self) -> str:
+        attrs = ", ".join(f"{attr}={value!r}" for attr, value in self._attrs.items())
+        return f"FieldSpec({self.field_class.__name__}, {attrs})"
+
+    def _hashable_attrs(self) -> Tuple[Tuple[str, Any], ...]:
+        items = []
+        for attr, value in sorted(self._attrs.items()):
+            try:
+                hash(value)
+            except TypeError:
+                # e.g. a list or dict default, the repr of a dict depends on the order of its keys
+                value = type(value).__name__
+            items.append((attr, value))
+        return tuple(items)
+
+
+def field_db_column(field: "Field | FieldSpec", field_name: str) -> str:
     """
     Get the database column name for a field. Usually you can get the column name from the Field object,
     however, it requires to initialize the Tortoise models which is not always possible in a migration.
@@ -14,25 +173,26 @@ def field_db_column(field: Field, field_name: str) -> str:
     source_field = getattr(field, "source_field", None)
     if source_field:
         return source_field
-    elif isinstance(field, RelationalField):
+    elif issubclass(_field_class(field), RelationalField):
         # Default to tortoise convention: field_name + "_id"
         return f"{field_name}_id"
     else:
         return field_name
 
 
-def field_to_migration(field: Field) -> str:
+def field_to_migration(field: "Field | FieldSpec") -> str:
     """
     Convert a Field object to its string representation for migrations.
 
     Args:
-        field: The Field object to convert.
+        field: The Field object or its FieldSpec to convert.
 
     Returns:
         A string representation of the Field that can be used in migrations.
     """
-    field_type = field.__class__.__name__
-    field_module = field.__class__.__module__
+    field_class = _field_class(field)
+    field_type = field_class.__name__
+    field_module = field_class.__module__
 
     # Start with importing the field if needed
     if "tortoise.fields" not in field_module:
@@ -71,7 +231,7 @@ def field_to_migration(field: Field) -> str:
         params.append(f"source_field='{field.source_field}'")
 
     # Handle field-specific attributes
-    if isinstance(field, CharField) and hasattr(field, "max_length"):
+    if issubclass(field_class, CharField) and hasattr(field, "max_length"):
         # The hasattr check ensures the attribute exists before accessing
         max_length = getattr(field, "max_length")
         params.append(f"max_length={max_length}")
@@ -84,7 +244,7 @@ def field_to_migration(field: Field) -> str:
             decimal_places = getattr(field, "decimal_places")
             params.append(f"decimal_places={decimal_places}")
 
-    if isinstance(field, RelationalField):
+    if issubclass(field_class, RelationalField):
         related_model = getattr(field, "model_name")
         params.append(f"model_name='{related_model}'")
 
@@ -97,7 +257,7 @@ def field_to_migration(field: Field) -> str:
             on_delete = getattr(field, "on_delete")
             params.append(f"on_delete='{on_delete}'")
 
-    if isinstance(field, DatetimeField):
+    if issubclass(field_class, DatetimeField):
         # Tortoise will set both auto_now and auto_now_add to True if auto_now_add is True,
         # even though you cannot pass both to the field constructor.
         # The following code ensures that both of them aren't True at the same time.
@@ -108,3 +268,7 @@ def field_to_migration(field: Field) -> str:
 
     # Generate the final string representation
     return f"{field_type}({', '.join(params)})"
+
+
+def _field_class(field: "Field | FieldSpec") -> Type[Field]:
+    return field.field_class if isinstance(field, FieldSpec) else field.__class__
@@ -0,0 +1,138 @@
+"""
+Content fingerprints of schemas.
+
+A fingerprint is a sha256 hash of a canonical representation of the schema, limited to what
+SchemaDiffer compares. It is built as a Merkle tree: the fingerprint of a model covers its
+table, fields and indexes, the fingerprint of an app covers the fingerprints of its models,
+and the fingerprint of a schema covers the fingerprints of its apps. Two schemas with the same
+fingerprint have no differences that would require a migration, and comparing the
+fingerprints of two apps or models tells whether they differ without comparing their fields.
+
+Values without a stable representation, e.g. default values of custom classes without
+`__repr__`, get a different fingerprint in every process. Such schemas never compare equal
+by their fingerprints, which only makes the comparison fall back to a full diff.
+"""
+
+from enum import Enum
+from hashlib import sha256
+from typing import TYPE_CHECKING, Any, Mapping
+
+from tortoise.fields import Field
+from tortoise.indexes import Index
+
+from tortoise_pathway.field_ext import FieldSpec
+
+if TYPE_CHECKING:
+    from tortoise_pathway.state import ModelSchema, Schema
+
+
+# The field attributes that SchemaDiffer compares. Other attributes, e.g. to_field, are
+# filled in by Tortoise when the models are initialized, but not in the migrations.
+FINGERPRINT_FIELD_ATTRS = (
+    "pk",
+    "null",
+    "default",
+    "unique",
+    "index",
+    "max_length",
+    "description",
+    "auto_now_add",
+    "model_name",
+    "related_name",
+)
+
+
+def hash_model(model: "ModelSchema") -> str:
+    """
+    Get the fingerprint of a model.
+
+    Args:
+        model: The model schema. The fields can be Field objects or FieldSpecs.
+    """
+    fields = model.get("fields", {})
+    indexes = model.get("indexes", {})
+    if not isinstance(indexes, Mapping):
+        indexes = {index.name: index for index in indexes}
+
+    parts = [f"table:{model['table']}"]
+    for name in sorted(fields):
+        parts.append(f"field:{name}:{_canonical(fields[name])}")
+    for name in sorted(indexes):
+        parts.append(f"index:{name}:{_canonical(indexes[name])}")
+    return _hash("\n".join(parts))
+
+
+def hash_tree(children: Mapping[str, str]) -> str:
+    """
+    Get the fingerprint of a node of the tree from the fingerprints of its children.
+
+    Args:
+        children: Mapping of the names of the children to their fingerprints.
+    """
+    return _hash("\n".join(f"{name}:{children[name]}" for name in sorted(children)))
+
+
+def hash_schema(schema: "Schema") -> str:
+    """
+    Get the fingerprint of a schema, e.g. the one derived from the Tortoise models.
+
+    Apps without models don't affect the fingerprint.
+    """
+    return hash_tree(
+        {
+            app_name: hash_tree(
+                {name: hash_model(model) for name, model in app["models"].items()}
+            )
+            for app_name, app in schema.items()
+            if app.get("models")
+        }
+    )
+
+
+def _hash(value: str) -> str:
+    return sha256(value.encode("utf-8")).hexdigest()
+
+
+def _canonical(value: Any) -> str:
+    """Get a representation of the value that is the same in every process."""
+    if isinstance(value, Field):
+        value = FieldSpec.from_field(value)
+
+    if isinstance(value, FieldSpec):
+        attrs = value.as_dict()
+        return "%s(%s)" % (
+            _qualified_name(value.field_class),
+            ", ".join(
+                f"{attr}={_canonical(attrs[attr])}"
+                for attr in FINGERPRINT_FIELD_ATTRS
+                if attr in attrs
+            ),
+        )
+    if isinstance(value, Index):
+        attrs = vars(value)
+        return "%s(%s)" % (
+            _qualified_name(value.__class__),
+            ", ".join(f"{attr}={_canonical(attrs[attr])}" for attr in sorted(attrs)),
+        )
+    if isinstance(value, Enum):
+        if isinstance(value, (str, int)):
+            # equal to its plain value
+            return repr(value.value)
+        return f"{_qualified_name(value.__class__)}.{value.name}"
+    if isinstance(value, list):
+        return "[%s]" % ", ".join(_canonical(item) for item in value)
+    if isinstance(value, tuple):
+        return "(%s)" % ", ".join(_canonical(item) for item in value)
+    if isinstance(value, dict):
+        return "{%s}" % ", ".join(
+            f"{_canonical(key)}: {_canonical(value[key])}" for key in sorted(value, key=repr)
+        )
+    if isinstance(value, type) or callable(value):
+        return _qualified_name(value)
+    return repr(value)
+
+
+def _qualified_name(value: Any) -> str:
+    module = getattr(value, "__module__", None)
+    name = getattr(value, "__qualname__", None) or getattr(value, "__name__", repr(value))
+    return f"{module}.{name}" if module else name
@@ -17,9 +17,10 @@ from tortoise_pathway.operations import (
     Operation,
     CreateModel,
     AddIndex,
-    DropIndex,
+    BackfillField,
 )
 from tortoise_pathway.operations.alter_field import AlterField
+from tortoise_pathway.optimizer import optimize_operations
 
 
 def generate_migration_class_name(migration_name: str) -> str:
@@ -50,12 +51,18 @@ def generate_timestamp() -> str:
     return datetime.datetime.now().strftime("%Y%m%d%H%M%S")
 
 
-def generate_empty_migration(migration_name: str, dependencies: list[tuple[str, str]] = []) -> str:
+def generate_empty_migration(
+    migration_name: str,
+    dependencies: list[tuple[str, str]] = [],
+    replaces: list[tuple[str, str]] | None = None,
+) -> str:
     """
     Generate content for an empty migration file.
 
     Args:
         migration_name: Name of the migration.
+        dependencies: The migrations this migration depends on.
+        replaces: The migrations this migration replaces, for squashed migrations.
 
     Returns:
         String content for the migration file.
@@ -81,14 +88,52 @@ class {class_name}(Migration):
     """
 
     dependencies = [{dependencies_str}]
-    operations = [
+{generate_replaces(replaces)}    operations = [
         # Define your operations here
     ]
 '''
 
 
+def generate_merge_migration(migration_name: str, dependencies: list[tuple[str, str]]) -> str:
+    """
+    Generate content for a migration that merges the branches of the migration graph.
+
+    Args:
+        migration_name: Name of the migration.
+        dependencies: The leaf migrations of the branches.
+
+    Returns:
+        String content for the migration file.
+    """
+    class_name = generate_migration_class_name(migration_name)
+
+    dependencies_str = "".join(
+        f'        ("{app_name}", "{migration_name}"),\n' for app_name, migration_name in dependencies
+    )
+
+    return f'''"""
+{migration_name} migration
+"""
+
+from tortoise_pathway.migration import Migration
+
+
+class {class_name}(Migration):
+    """
+    Merge migration.
+    """
+
+    dependencies = [
+{dependencies_str}    ]
+    operations = []
+'''
+
+
 def generate_auto_migration(
-    migration_name: str, changes: list[Operation], dependencies: list[tuple[str, str]] = []
+    migration_name: str,
+    changes: list[Operation],
+    dependencies: list[tuple[str, str]] = [],
+    replaces: list[tuple[str, str]] | None = None,
 ) -> str:
     """
     Generate migration file content based on detected changes.
@@ -96,6 +141,8 @@ def generate_auto_migration(
     Args:
         migration_name: Name of the migration.
         changes: List of schema changes to include in the migration.
+        dependencies: The migrations this migration depends on.
+        replaces: The migrations this migration replaces, for squashed migrations.
 
     Returns:
         String content for the migration file.
@@ -106,6 +153,8 @@ def generate_auto_migration(
     if not changes:
         raise ValueError("No changes")
 
+    changes = optimize_operations(changes)
+
     # Prepare imports for schema change classes and models
     schema_changes_used = set()
     model_imports = set()
@@ -124,7 +173,10 @@ def generate_auto_migration(
 
         elif isinstance(change, AddField) or isinstance(change, AlterField):
             field_imports.update(field_to_imports(change.field_object))
-        elif isinstance(change, AddIndex) or isinstance(change, DropIndex):
+            if isinstance(change, BackfillField) and callable(change.default):
+                default = change.default
+                field_imports.add(f"from {default.__module__} import {default.__name__}")
+        elif isinstance(change, AddIndex):
             index_imports.update(index_to_imports(change.index))
 
     schema_imports = ", ".join(sorted(schema_changes_used))
@@ -187,12 +239,23 @@ class {class_name}(Migration):
     """
 
     dependencies = [{dependencies_str}]
-    operations = [
+{generate_replaces(replaces)}    operations = [
 {operations_str}
     ]
 '''
 
 
+def generate_replaces(replaces: list[tuple[str, str]] | None) -> str:
+    """Generate the replaces attribute of a squashed migration, or nothing."""
+    if not replaces:
+        return ""
+
+    replaces_str = "".join(
+        f'        ("{app_name}", "{migration_name}"),\n' for app_name, migration_name in replaces
+    )
+    return f"    replaces = [\n{replaces_str}    ]\n"
+
+
 def field_to_imports(field: Field) -> List[str]:
     """
     Convert a field object to an import string.
@@ -0,0 +1,241 @@
+"""
+Lock that serializes migrations across processes.
+
+When every instance of an application runs `migrate` on startup, the instances race to apply
+the same migrations. The lock lets one process migrate the database while the others wait;
+once they get the lock, they find the migrations applied and have nothing left to do.
+
+On PostgreSQL the lock is a session-level advisory lock, which the database releases when the
+process dies. Other databases use a row in the `tortoise_migrations_lock` table. The process
+holding it refreshes the time of the row while it runs, and a row that wasn't refreshed for
+longer than the TTL of the lock, e.g. because the process was killed, is taken over by the
+next process. The TTL must be longer than the longest transaction of a migration, which
+delays the refresh on SQLite.
+"""
+
+import asyncio
+import contextlib
+import datetime
+import os
+import socket
+import time
+from hashlib import sha256
+from typing import Any, Optional
+
+from pypika_tortoise import Table
+from tortoise import BaseDBAsyncClient
+from tortoise.exceptions import IntegrityError
+
+from tortoise_pathway.schema import get_schema_manager
+
+LOCK_TABLE = "tortoise_migrations_lock"
+
+# How long a lock row lives without being refreshed, in seconds.
+LOCK_TTL = 300.0
+
+# The key of the PostgreSQL advisory lock, derived from the name of the migration table.
+ADVISORY_LOCK_KEY = int.from_bytes(sha256(b"tortoise_migrations").digest()[:8], "big", signed=True)
+
+
+class MigrationLock:
+    """
+    A lock held by a row in the lock table. Use it as an async context manager.
+
+    Args:
+        connection: The database connection.
+        timeout: How long to wait for the lock in seconds, None to wait indefinitely.
+        poll_interval: How often to check whether the lock was released in seconds.
+        ttl: How long the lock lives without being refreshed in seconds, None to keep it
+            until it's released. The holder refreshes it three times per TTL.
+    """
+
+    def __init__(
+        self,
+        connection: BaseDBAsyncClient,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.5,
+        ttl: Optional[float] = LOCK_TTL,
+    ):
+        self.connection = connection
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> None:
+        """
+        Wait until the lock is acquired.
+
+        Raises:
+            TimeoutError: If the lock wasn't acquired within the timeout.
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        await self._prepare()
+        while not await self._try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Could not acquire the migration lock within {self.timeout} seconds"
+                    f"{await self._holder()}"
+                )
+            await asyncio.sleep(self.poll_interval)
+        if self.ttl is not None:
+            self._heartbeat = asyncio.create_task(self._refresh_periodically())
+
+    async def release(self) -> None:
+        """Release the lock."""
+        heartbeat, self._heartbeat = self._heartbeat, None
+        if heartbeat is not None:
+            heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat
+
+        table = Table(LOCK_TABLE)
+        query = (
+            self.connection.query_class.from_(table)
+            .where((table.id == 1) & (table.owner == self.owner))
+            .delete()
+        )
+        await self.connection.execute_query(*query.get_parameterized_sql())
+
+    async def __aenter__(self) -> "MigrationLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.release()
+
+    async def _prepare(self) -> None:
+        await self.connection.execute_script(
+            f"""
+        CREATE TABLE IF NOT EXISTS {LOCK_TABLE} (
+            id INT NOT NULL PRIMARY KEY,
+            owner VARCHAR(255) NOT NULL,
+            acquired_at TIMESTAMP NOT NULL
+        )
+        """
+        )
+
+    async def _try_acquire(self) -> bool:
+        schema_manager = get_schema_manager(self.connection)
+        now = datetime.datetime.now()
+        table = Table(LOCK_TABLE)
+
+        if self.ttl is not None:
+            # the holder didn't refresh the lock in time, it's gone
+            expired_at = schema_manager.timestamp_parameter(
+                now - datetime.timedelta(seconds=self.ttl)
+            )
+            query = (
+                self.connection.query_class.from_(table)
+                .where((table.id == 1) & (table.acquired_at < expired_at))
+                .delete()
+            )
+            await self.connection.execute_query(*query.get_parameterized_sql())
+
+        query = (
+            self.connection.query_class.into(table)
+            .columns("id", "owner", "acquired_at")
+            .insert(1, self.owner, schema_manager.timestamp_parameter(now))
+        )
+        try:
+            await self.connection.execute_query(*query.get_parameterized_sql())
+        except IntegrityError:
+            return False
+        return True
+
+    async def _refresh(self) -> None:
+        table = Table(LOCK_TABLE)
+        acquired_at = get_schema_manager(self.connection).timestamp_parameter(
+            datetime.datetime.now()
+        )
+        query = (
+            self.connection.query_class.update(table)
+            .set(table.acquired_at, acquired_at)
+            .where((table.id == 1) & (table.owner == self.owner))
+        )
+        await self.connection.execute_query(*query.get_parameterized_sql())
+
+    async def _refresh_periodically(self) -> None:
+        assert self.ttl is not None
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await self._refresh()
+
+    async def _holder(self) -> str:
+        _, records = await self.connection.execute_query(
+            f"SELECT owner, acquired_at FROM {LOCK_TABLE} WHERE id = 1"
+        )
+        if not records:
+            return ""
+        if self.ttl is None:
+            advice = f"If that process is gone, delete the row from {LOCK_TABLE}"
+        else:
+            advice = f"If that process is gone, the lock expires {self.ttl} seconds after its last refresh"
+        return f", it is held by {records[0]['owner']} since {records[0]['acquired_at']}. {advice}"
+
+
+class PostgresMigrationLock(MigrationLock):
+    """
+    A lock held by a PostgreSQL advisory lock.
+
+    The advisory lock belongs to a database session, so the lock keeps a connection of the
+    pool for itself until it's released.
+    """
+
+    def __init__(
+        self,
+        connection: BaseDBAsyncClient,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.5,
+    ):
+        # the database releases the lock of a dead session, it doesn't need to expire
+        super().__init__(connection, timeout, poll_interval, ttl=None)
+        self._connection_context: Any = None
+        self._raw_connection: Any = None
+
+    async def acquire(self) -> None:
+        try:
+            await super().acquire()
+        except BaseException:
+            await self._close()
+            raise
+
+    async def release(self) -> None:
+        try:
+            await self._fetchval(f"SELECT pg_advisory_unlock({ADVISORY_LOCK_KEY})")
+        finally:
+            await self._close()
+
+    async def _prepare(self) -> None:
+        self._connection_context = self.connection.acquire_connection()
+        self._raw_connection = await self._connection_context.__aenter__()
+
+    async def _try_acquire(self) -> bool:
+        return bool(await self._fetchval(f"SELECT pg_try_advisory_lock({ADVISORY_LOCK_KEY})"))
+
+    async def _holder(self) -> str:
+        return ""
+
+    async def _fetchval(self, sql: str) -> Any:
+        if hasattr(self._raw_connection, "fetchval"):
+            # asyncpg
+            return await self._raw_connection.fetchval(sql)
+        # psycopg
+        cursor = await self._raw_connection.execute(sql)
+        return (await cursor.fetchone())[0]
+
+    async def _close(self) -> None:
+        context, self._connection_context = self._connection_context, None
+        self._raw_connection = None
+        if context is not None:
+            await context.__aexit__(None, None, None)
+
+
+def get_migration_lock(
+    connection: BaseDBAsyncClient, timeout: Optional[float] = None, ttl: Optional[float] = LOCK_TTL
+) -> MigrationLock:
+    """Get the migration lock for the dialect of the connection."""
+    if connection.capabilities.dialect == "postgres":
+        return PostgresMigrationLock(connection, timeout)
+    return MigrationLock(connection, timeout, ttl=ttl)
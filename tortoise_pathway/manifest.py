@@ -0,0 +1,262 @@
+"""
+Manifest of the migrations of an app.
+
+Discovering migrations requires the name, the class and the dependencies of every migration.
+The manifest stores them in `migrations/<app>/manifest.json` together with the content hash
+and a summary of the operations of each migration file, so that the migrations can be
+discovered and sorted without parsing the files. The manifest is updated by `make` and
+validated against the sizes and content hashes of the files when it's loaded: only the files
+that changed since are parsed again. It describes the files and nothing about the machine, so
+it can be committed with the migrations.
+
+The files are parsed with `ast`, they are never imported.
+"""
+
+import ast
+import json
+import os
+import re
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict
+
+from tortoise_pathway.migration import Migration
+
+MANIFEST_FILE = "manifest.json"
+
+# Bump when the structure of the manifest changes.
+MANIFEST_VERSION = 2
+
+ManifestEntry = Dict[str, Any]
+
+MODEL_REFERENCE = re.compile(r"^\w+\.\w+$")
+
+
+class MigrationManifest:
+    """
+    The manifest of the migrations in a directory, keyed by the migration name.
+
+    Args:
+        migrations_dir: The directory of the app migrations.
+    """
+
+    def __init__(self, migrations_dir: Path):
+        self.migrations_dir = migrations_dir
+        self.path = migrations_dir / MANIFEST_FILE
+        self.entries: dict[str, ManifestEntry] = {}
+        self._changed = False
+
+    def load(self) -> None:
+        """Load the manifest file. A missing, outdated or corrupted file is treated as empty."""
+        self.entries = {}
+        self._changed = False
+        if not self.path.exists():
+            return
+
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return
+
+        self.entries = data["migrations"]
+
+    def refresh(self) -> None:
+        """
+        Bring the entries up to date with the migration files.
+
+        The entries of unchanged files are kept, changed and new files are parsed and the
+        entries of deleted files are dropped. Files that can't be parsed have no entry.
+        """
+        names = set()
+        for file_path in sorted(self.migrations_dir.glob("*.py")):
+            if file_path.name.startswith("__"):
+                continue
+
+            name = file_path.stem
+            names.add(name)
+            entry = self.entries.get(name)
+            if entry is not None and self._is_fresh(entry, file_path):
+                continue
+
+            try:
+                self.entries[name] = manifest_entry(file_path)
+            except (ValueError, SyntaxError):
+                self.entries.pop(name, None)
+            self._changed = True
+
+        for name in set(self.entries) - names:
+            del self.entries[name]
+            self._changed = True
+
+    def parsed(self, name: str) -> tuple[str, dict[str, Any]] | None:
+        """
+        Get the class name and the literal attributes of a migration, like
+        `parse_migration_file` returns them, or None if the migration has no entry.
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+
+        return entry["class"], _with_dependency_tuples(entry["attributes"])
+
+    def save(self) -> None:
+        """Write the manifest file if the entries changed since it was loaded."""
+        if not self._changed and self.path.exists():
+            return
+
+        self.migrations_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {"version": MANIFEST_VERSION, "migrations": self.entries},
+                indent=2,
+                sort_keys=True,
+            )
+            + "\n"
+        )
+        # replace atomically so that concurrent readers never see a partial file
+        os.replace(tmp_path, self.path)
+        self._changed = False
+
+    def _is_fresh(self, entry: ManifestEntry, file_path: Path) -> bool:
+        # modification times differ on every checkout, the content decides
+        if entry["size"] != file_path.stat().st_size:
+            return False
+        return entry["checksum"] == sha256(file_path.read_bytes()).hexdigest()
+
+
+def manifest_entry(migration_path: Path) -> ManifestEntry:
+    """
+    Create the manifest entry of a migration file.
+
+    Raises:
+        ValueError: If the file can't be described by a manifest entry, see
+            `parse_migration_file`.
+    """
+    content = migration_path.read_bytes()
+    node = _find_migration_class(ast.parse(content, filename=str(migration_path)))
+    if node is None:
+        raise ValueError(f"No Migration class found in {migration_path}")
+
+    attributes = _literal_attributes(node, migration_path)
+    try:
+        json.dumps(attributes)
+    except TypeError:
+        raise ValueError(f"The attributes of {node.name} in {migration_path} are not JSON")
+
+    operations: list[str] = []
+    models: set[str] = set()
+    tables: set[str] = set()
+    for call in _operation_calls(node):
+        name = _base_name(call.func) or "?"
+        kwargs = {
+            keyword.arg: keyword.value for keyword in call.keywords if keyword.arg is not None
+        }
+        model = _literal_str(call.args[0] if call.args else kwargs.get("model"))
+        if model and not MODEL_REFERENCE.match(model):
+            # the first argument of e.g. RunSQL is not a model
+            model = None
+        operations.append(f"{name} {model}" if model else name)
+        if model:
+            models.add(model)
+        for argument in ("table", "new_table_name"):
+            table = _literal_str(kwargs.get(argument))
+            if table:
+                tables.add(table)
+
+    return {
+        "class": node.name,
+        "attributes": attributes,
+        "checksum": sha256(content).hexdigest(),
+        "size": len(content),
+        "operations": operations,
+        "models": sorted(models),
+        "tables": sorted(tables),
+    }
+
+
+def parse_migration_file(migration_path: Path) -> tuple[str, dict[str, Any]]:
+    """
+    Parse a migration file without importing it.
+
+    Returns:
+        A tuple of the name of the Migration class and its class attributes that are defined
+        as literals, e.g. `dependencies`. The operations are never included.
+
+    Raises:
+        ValueError: If the file has no Migration class or its dependencies are not a literal.
+    """
+    tree = ast.parse(migration_path.read_bytes(), filename=str(migration_path))
+    node = _find_migration_class(tree)
+    if node is None:
+        raise ValueError(f"No Migration class found in {migration_path}")
+
+    return node.name, _with_dependency_tuples(_literal_attributes(node, migration_path))
+
+
+def _find_migration_class(tree: ast.Module) -> ast.ClassDef | None:
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and any(
+            _base_name(base) == Migration.__name__ for base in node.bases
+        ):
+            return node
+    return None
+
+
+def _literal_attributes(node: ast.ClassDef, migration_path: Path) -> dict[str, Any]:
+    attributes: dict[str, Any] = {}
+    for statement in node.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+            target, value = statement.targets[0], statement.value
+        elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+            target, value = statement.target, statement.value
+        else:
+            continue
+        if not isinstance(target, ast.Name) or target.id == "operations":
+            continue
+        try:
+            attributes[target.id] = ast.literal_eval(value)
+        except ValueError:
+            continue
+
+    if "dependencies" not in attributes:
+        raise ValueError(f"The dependencies of {node.name} in {migration_path} are not a literal")
+    return attributes
+
+
+def _with_dependency_tuples(attributes: dict[str, Any]) -> dict[str, Any]:
+    """Make the dependencies tuples like in the migration files, JSON only has lists."""
+    return {
+        **attributes,
+        "dependencies": [tuple(dependency) for dependency in attributes["dependencies"]],
+    }
+
+
+def _operation_calls(node: ast.ClassDef) -> list[ast.Call]:
+    for statement in node.body:
+        if (
+            isinstance(statement, ast.Assign)
+            and len(statement.targets) == 1
+            and isinstance(statement.targets[0], ast.Name)
+            and statement.targets[0].id == "operations"
+            and isinstance(statement.value, (ast.List, ast.Tuple))
+        ):
+            return [item for item in statement.value.elts if isinstance(item, ast.Call)]
+    return []
+
+
+def _literal_str(node: ast.expr | None) -> str | None:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _base_name(node: ast.expr) -> str | None:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
@@ -1,3 +1,4 @@
+from hashlib import sha256
 from pathlib import Path
 
 from tortoise_pathway.operations import Operation
@@ -8,6 +9,10 @@ class Migration:
 
     dependencies: list[tuple[str, str]]
     operations: list[Operation]
+    # the migrations a squashed migration replaces
+    replaces: list[tuple[str, str]] = []
+    # whether the operations run in a transaction, disable it for statements that can't
+    atomic: bool = True
     app_name: str | None = None
 
     @classmethod
@@ -31,6 +36,13 @@ class Migration:
         module_path = module.replace(".", "/")
         return Path(f"{module_path}.py")
 
+    @classmethod
+    def checksum(cls) -> str:
+        """
+        Return the SHA-256 hex digest of the migration file content.
+        """
+        return sha256(cls.path().read_bytes()).hexdigest()
+
     @classmethod
     def display_name(cls) -> str:
         return f"{cls.app_name} -> {cls.name()}"
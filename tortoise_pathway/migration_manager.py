@@ -1,34 +1,84 @@
 from collections import defaultdict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from graphlib import CycleError, TopologicalSorter
+import importlib.metadata
 import inspect
 import datetime
+import time
 from pathlib import Path
-from typing import AsyncGenerator, Dict, List, Optional, Type, cast
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncGenerator,
+    Dict,
+    List,
+    Optional,
+    Type,
+    cast,
+)
 
+from pypika_tortoise import Table
 from tortoise import Tortoise, connections
-
+from tortoise.exceptions import OperationalError
+from tortoise.fields.relational import ManyToManyFieldInstance, RelationalField
+from tortoise.transactions import in_transaction
+
+from tortoise_pathway import __version__
+from tortoise_pathway.fingerprint import hash_tree
+from tortoise_pathway.lock import LOCK_TTL, MigrationLock, get_migration_lock
+from tortoise_pathway.manifest import MigrationManifest, parse_migration_file
 from tortoise_pathway.migration import Migration
+from tortoise_pathway.operations import AddField, AddIndex, CreateModel, RunSQL
 from tortoise_pathway.operations.operation import Operation
-from tortoise_pathway.schema import get_schema_manager
+from tortoise_pathway.optimizer import optimize_operations
+from tortoise_pathway.schema import execute_script, get_schema_manager
 from tortoise_pathway.schema_differ import SchemaDiffer
 from tortoise_pathway.state import State
+from tortoise_pathway.state_cache import STATE_CACHE_FILE, StateCache
 from tortoise_pathway.generators import (
     generate_empty_migration,
     generate_auto_migration,
+    generate_merge_migration,
 )
 
 
+AppFingerprint = Dict[str, str]
+
+MigrationKey = tuple[str, str]
+
+# How `apply_migrations` uses transactions.
+TRANSACTION_MODES = ("migration", "batch", "none")
+
+# The rows recorded by one INSERT, to stay below the parameter limits of the databases.
+MAX_RECORDS_PER_INSERT = 500
+
+
 class MigrationManager:
     """Manages migrations for Tortoise ORM models."""
 
     app_names: list[str]
     base_migrations_dir: Path
     migrations: list[Type[Migration]]
+    dependency_aliases: Dict[MigrationKey, MigrationKey]
     applied_migrations: set[tuple[str, str]]
     migration_state: State
     applied_state: State
+    state_cache: StateCache | None
+    lazy: bool
+    jobs: int
 
-    def __init__(self, app_names: list[str], migrations_dir: str = "migrations"):
+    def __init__(
+        self,
+        app_names: list[str],
+        migrations_dir: str = "migrations",
+        state_cache: bool = False,
+        lazy: bool = False,
+        jobs: int = 1,
+    ):
         self.app_names = app_names
+        self.lazy = lazy
+        self.jobs = jobs
         if Path(migrations_dir).is_absolute():
             self.base_migrations_dir = Path(migrations_dir).relative_to(Path.cwd())
         else:
@@ -36,41 +86,145 @@ class MigrationManager:
 
         # Set the app-specific migrations directory
         self.migrations = []
+        self.dependency_aliases = {}
         self.applied_migrations = set()
+        # the timestamps recorded by `record_migrations`, by app and migration name
+        self.recorded_at: Dict[MigrationKey, datetime.datetime] = {}
         self.migration_state = State()
         self.applied_state = State()
 
+        # The replayed state is cached in the base migrations directory, keyed by
+        # the checksums of the migration files.
+        self.state_cache = None
+        if state_cache:
+            self.state_cache = StateCache(self.base_migrations_dir / STATE_CACHE_FILE)
+
     def get_migrations_dir(self, app_name: str) -> Path:
         return self.base_migrations_dir / app_name
 
-    async def initialize(self, connection=None) -> None:
-        """Initialize the migration system."""
+    def lock(
+        self,
+        timeout: Optional[float] = None,
+        connection=None,
+        ttl: Optional[float] = LOCK_TTL,
+    ) -> MigrationLock:
+        """
+        Get the lock that serializes migrations across processes, see `tortoise_pathway.lock`.
+
+        Acquire it before `initialize`, so that the applied migrations are loaded after the
+        process that held the lock has applied them.
+
+        Args:
+            timeout: How long to wait for the lock in seconds, None to wait indefinitely.
+            connection: Database connection to use.
+            ttl: How long the lock row lives without being refreshed by its holder in
+                seconds, None to keep it until it's released. Ignored on PostgreSQL.
+        """
+        conn = connection or Tortoise.get_connection("default")
+        return get_migration_lock(conn, timeout, ttl)
+
+    async def initialize(self, connection=None, rebuild_state: bool = True) -> None:
+        """
+        Initialize the migration system.
+
+        Args:
+            connection: Database connection to use.
+            rebuild_state: Whether to replay the migrations to build the states. Without the
+                states, the migrations can only be listed, e.g. to show which are pending.
+        """
         # Create migrations table if it doesn't exist
         await self._ensure_migration_table_exists(connection)
 
         # Load applied migrations from database
-        await self._load_applied_migrations(connection)
+        await self._load_applied_migrations(connection=connection)
 
+        self.load_migrations(rebuild_state=rebuild_state)
+
+    def load_migrations(self, rebuild_state: bool = True) -> None:
+        """Discover the migrations and build the states without querying the database."""
         # Discover available migrations
         self._discover_migrations()
 
         # Rebuild state from migrations
-        self._rebuild_state()
+        if rebuild_state:
+            self._rebuild_state()
 
     async def _ensure_migration_table_exists(self, connection=None) -> None:
-        """Create migration history table if it doesn't exist."""
+        """Create migration history table if it doesn't exist, or upgrade it."""
         conn = connection or Tortoise.get_connection("default")
 
+        try:
+            await conn.execute_query(
+                "SELECT app, name, checksum, duration_ms, tool_version "
+                "FROM tortoise_migrations WHERE 1 = 0"
+            )
+        except OperationalError:
+            await self._create_migration_table(conn)
         await conn.execute_script(
             """
-        CREATE TABLE IF NOT EXISTS tortoise_migrations (
-            app VARCHAR(100) NOT NULL,
-            name VARCHAR(255) NOT NULL,
-            applied_at TIMESTAMP NOT NULL
+        CREATE TABLE IF NOT EXISTS tortoise_migrations_state (
+            app VARCHAR(100) NOT NULL PRIMARY KEY,
+            head VARCHAR(255) NOT NULL,
+            fingerprint VARCHAR(64) NOT NULL,
+            updated_at TIMESTAMP NOT NULL
         )
         """
         )
 
+    async def _create_migration_table(self, conn) -> None:
+        """
+        Create the migration history table, keyed by app and name and indexed by the
+        time the migrations were applied.
+
+        A table of an older version, without the primary key and the checksum, duration
+        and tool version columns, is replaced by the new table with the same records.
+        The upgrade runs in a transaction, so it's either complete or not started.
+        """
+        try:
+            await conn.execute_query(
+                "SELECT app, name FROM tortoise_migrations WHERE 1 = 0"
+            )
+            upgrade = True
+        except OperationalError:
+            upgrade = False
+
+        async with in_transaction(conn.connection_name) as tx:
+            if upgrade:
+                await execute_script(
+                    tx,
+                    "ALTER TABLE tortoise_migrations RENAME TO tortoise_migrations_old",
+                )
+            await execute_script(
+                tx,
+                """
+            CREATE TABLE IF NOT EXISTS tortoise_migrations (
+                app VARCHAR(100) NOT NULL,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP NOT NULL,
+                checksum VARCHAR(64),
+                duration_ms INT,
+                tool_version VARCHAR(32),
+                PRIMARY KEY (app, name)
+            )
+            """,
+            )
+            await execute_script(
+                tx,
+                "CREATE INDEX IF NOT EXISTS idx_tortoise_migrations_applied_at "
+                "ON tortoise_migrations (applied_at)",
+            )
+            if upgrade:
+                # older versions could record a migration more than once
+                await execute_script(
+                    tx,
+                    """
+                INSERT INTO tortoise_migrations (app, name, applied_at)
+                SELECT app, name, MIN(applied_at) FROM tortoise_migrations_old
+                GROUP BY app, name
+                """,
+                )
+                await execute_script(tx, "DROP TABLE tortoise_migrations_old")
+
     async def _load_applied_migrations(self, app: str = None, connection=None) -> None:
         """Load list of applied migrations from the database."""
         conn = connection or Tortoise.get_connection("default")
@@ -86,16 +240,37 @@ class MigrationManager:
 
     def _discover_migrations(self) -> None:
         """Discover available migrations in the migrations directory and sort them based on dependencies."""
+        executor = None
+        if self.jobs > 1:
+            # importing is mostly waiting for the filesystem, which doesn't hold the GIL
+            executor = ThreadPoolExecutor(max_workers=self.jobs)
+
         migrations = []
-        for app_name in self.app_names:
-            app_migrations = load_migrations_from_disk(
-                app_name, self.get_migrations_dir(app_name)
-            )
-            migrations.extend(app_migrations)
-        self.migrations = sort_migrations(migrations)
+        try:
+            for app_name in self.app_names:
+                app_migrations = load_migrations_from_disk(
+                    app_name,
+                    self.get_migrations_dir(app_name),
+                    lazy=self.lazy,
+                    executor=executor,
+                )
+                migrations.extend(app_migrations)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        migrations, self.dependency_aliases, applied_squashed = resolve_replacements(
+            migrations, self.applied_migrations
+        )
+        self.applied_migrations |= applied_squashed
+        self.migrations = sort_migrations(migrations, self.dependency_aliases)
 
     async def create_migrations(
-        self, name: str = None, app: str = None, auto: bool = True
+        self,
+        name: str = None,
+        app: str = None,
+        auto: bool = True,
+        concurrent_indexes: bool = False,
     ) -> AsyncGenerator[Type[Migration], None]:
         """
         Create new migration files and yield the Migration instances.  If app is specified, the migration will be created for that app only (and all its dependencies).
@@ -104,6 +279,8 @@ class MigrationManager:
             name: The descriptive name for the migration. If None, a name will be generated based on detected changes.
             app: The app to create the migration for. If None, the migration will be created for all apps.
             auto: Whether to auto-generate migration operations based on model changes
+            concurrent_indexes: Whether the indexes of existing tables are added and dropped
+                concurrently, see `AddIndex`.
 
         Returns:
             An async generator of Migration instances representing the newly created migrations.
@@ -111,13 +288,24 @@ class MigrationManager:
 
         Raises:
             ImportError: If the migration file couldn't be loaded or no Migration class was found
-            ValueError: If no app is specified for an empty migration
+            ValueError: If no app is specified for an empty migration or the migration graph
+                has multiple leaves
         """
+        leaves = self.get_leaves()
+        if len(leaves) > 1:
+            raise ValueError(
+                "Conflicting migrations detected, the migration graph has multiple leaves: "
+                f"{', '.join(leaf.display_name() for leaf in leaves)}. "
+                "Run the merge command to merge them."
+            )
+
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
 
         if auto:
             # Generate migration content based on model changes compared to existing migrations state
-            differ = SchemaDiffer(self.migration_state)
+            differ = SchemaDiffer(
+                self.migration_state, concurrent_indexes=concurrent_indexes
+            )
             all_changes = await differ.detect_changes()
 
             # Calculate changes by app
@@ -149,89 +337,503 @@ class MigrationManager:
 
         # Generate migrations for all effected apps
         for app_name in apps_updated:
-            migrations_dir = self.get_migrations_dir(app_name)
-
-            # Make sure app migrations directory exists
-            migrations_dir.mkdir(parents=True, exist_ok=True)
-
             changes = changes_by_app.get(app_name)
             file_name = name or (
                 gen_name_from_changes(changes) if changes else "migration"
             )
             migration_name = f"{timestamp}_{file_name}"
 
-            # Create migration file path
-            migration_file = migrations_dir / f"{migration_name}.py"
-
-            dependencies = []
-            if self.migrations:
-                last_migration = self.migrations[-1]
-                dependencies = [(last_migration.app_name, last_migration.name())]
+            dependencies = [(leaf.app_name, leaf.name()) for leaf in self.get_leaves()]
 
             if changes:
                 content = generate_auto_migration(migration_name, changes, dependencies)
             else:
                 content = generate_empty_migration(migration_name, dependencies)
 
-            with open(migration_file, "w") as f:
-                f.write(content)
+            yield self._write_migration(app_name, migration_name, content)
 
-            # Load the migration module and instantiate the migration
-            try:
-                migration = load_migration_file(migrations_dir / f"{migration_name}.py")
-                self.migrations.append(migration)
+    def get_leaves(self) -> list[Type[Migration]]:
+        """Get the migrations that no other migration depends on."""
+        return find_leaves(self.migrations, self.dependency_aliases)
 
-                for operation in migration.operations:
-                    self.migration_state.apply_operation(operation)
-                self.migration_state.snapshot(migration_name)
+    def create_merge_migration(
+        self, app: str | None = None, name: str | None = None
+    ) -> Optional[Type[Migration]]:
+        """
+        Create a migration that depends on all leaves, to merge the branches of the
+        migration graph.
 
-                # Inject app name
-                migration.app_name = app_name
+        Args:
+            app: The app to create the migration for. Defaults to the app of the leaves if
+                they all belong to the same app.
+            name: The descriptive name for the migration, "merge" by default.
 
-                yield migration
+        Returns:
+            The merge migration, or None if there is nothing to merge.
+
+        Raises:
+            ValueError: If the leaves belong to different apps and no app is specified.
+        """
+        leaves = self.get_leaves()
+        if len(leaves) < 2:
+            return None
+
+        if app is None:
+            leaf_apps = {leaf.app_name for leaf in leaves}
+            if len(leaf_apps) > 1:
+                raise ValueError(
+                    f"The leaves belong to apps {', '.join(sorted(leaf_apps))}, specify the app"
+                )
+            app = leaf_apps.pop()
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        migration_name = f"{timestamp}_{name or 'merge'}"
+        content = generate_merge_migration(
+            migration_name, [(leaf.app_name, leaf.name()) for leaf in leaves]
+        )
+        return self._write_migration(app, migration_name, content)
 
-            except (ImportError, AttributeError) as e:
-                raise ImportError(f"Failed to load newly created migration: {e}")
+    def squash_migrations(
+        self,
+        app: str,
+        end: str,
+        start: str | None = None,
+        name: str | None = None,
+    ) -> Type[Migration]:
+        """
+        Create a migration that replaces a range of migrations of an app with the shortest
+        equivalent list of operations.
+
+        The squashed migration is used instead of the migrations it replaces, unless a
+        database has only applied some of them. Once all databases are migrated past the
+        range, the replaced migrations can be deleted.
+
+        Args:
+            app: The app to squash the migrations of.
+            end: The name of the last migration to squash.
+            start: The name of the first migration to squash. Defaults to the first
+                migration of the app.
+            name: The descriptive name for the migration, "squashed" by default.
+
+        Returns:
+            The squashed migration.
+
+        Raises:
+            ValueError: If the range is invalid, or a migration of another app depends on
+                a squashed migration and the squashed migration depends on it too.
+        """
+        app_migrations = [m for m in self.migrations if m.app_name == app]
+        names = [m.name() for m in app_migrations]
+        if end not in names:
+            raise ValueError(f"Migration {app} -> {end} not found")
+        if start is not None and start not in names:
+            raise ValueError(f"Migration {app} -> {start} not found")
+
+        start_index = names.index(start) if start is not None else 0
+        end_index = names.index(end)
+        if start_index >= end_index:
+            raise ValueError("At least two migrations are needed to squash")
+
+        squashed = app_migrations[start_index : end_index + 1]
+        squashed_keys = [_migration_key(migration) for migration in squashed]
+
+        dependencies: list[MigrationKey] = []
+        for migration in squashed:
+            for dependency in _dependencies(migration, self.dependency_aliases):
+                if dependency not in squashed_keys and dependency not in dependencies:
+                    dependencies.append(dependency)
+
+        # a migration in between that depends on the squashed migrations would make the
+        # squashed migration depend on itself
+        ancestors = self._ancestors(dependencies)
+        for key in squashed_keys:
+            if key in ancestors:
+                raise ValueError(
+                    f"Can't squash {key[0]} -> {key[1]}, migrations of other apps that the "
+                    "squashed migrations depend on depend on it"
+                )
+
+        # the migrations that are squashed again are replaced by the squashed migration
+        replaces: list[MigrationKey] = []
+        for migration in squashed:
+            replaces.extend(tuple(replaced) for replaced in migration.replaces)
+            replaces.append(_migration_key(migration))
+
+        operations = optimize_operations(
+            [operation for migration in squashed for operation in migration.operations]
+        )
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        migration_name = f"{timestamp}_{name or 'squashed'}"
+        if operations:
+            content = generate_auto_migration(
+                migration_name, operations, dependencies, replaces=replaces
+            )
+        else:
+            content = generate_empty_migration(
+                migration_name, dependencies, replaces=replaces
+            )
+        self._write_migration_file(app, migration_name, content)
+
+        # the squashed migration replaces the migrations in the graph and in both states
+        self.load_migrations()
+        return next(
+            m for m in self.migrations if _migration_key(m) == (app, migration_name)
+        )
+
+    def _ancestors(self, keys: list[MigrationKey]) -> set[MigrationKey]:
+        """Get the migrations the given migrations depend on, directly or indirectly."""
+        by_key = {_migration_key(migration): migration for migration in self.migrations}
+        ancestors: set[MigrationKey] = set()
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            if key in ancestors or key not in by_key:
+                continue
+            ancestors.add(key)
+            stack.extend(_dependencies(by_key[key], self.dependency_aliases))
+        return ancestors
+
+    def _write_migration(
+        self, app_name: str, migration_name: str, content: str
+    ) -> Type[Migration]:
+        """Write a new migration file, load it and apply it to the migration state."""
+        migration_file = self._write_migration_file(app_name, migration_name, content)
+
+        # Load the migration module and instantiate the migration
+        try:
+            migration = load_migration_file(migration_file)
+        except (ImportError, AttributeError) as e:
+            raise ImportError(f"Failed to load newly created migration: {e}")
+
+        self.migrations.append(migration)
+
+        for operation in migration.operations:
+            self.migration_state.apply_operation(operation)
+        self.migration_state.snapshot(migration_name)
+
+        # Inject app name
+        migration.app_name = app_name
+
+        return migration
+
+    def _write_migration_file(
+        self, app_name: str, migration_name: str, content: str
+    ) -> Path:
+        """Write a new migration file and update the manifest of the app."""
+        migrations_dir = self.get_migrations_dir(app_name)
+
+        # Make sure app migrations directory exists
+        migrations_dir.mkdir(parents=True, exist_ok=True)
+
+        # Create migration file path
+        migration_file = migrations_dir / f"{migration_name}.py"
+        with open(migration_file, "w") as f:
+            f.write(content)
+
+        manifest = MigrationManifest(migrations_dir)
+        manifest.load()
+        manifest.refresh()
+        manifest.save()
+
+        return migration_file
 
     async def apply_migrations(
-        self, app: str = None, connection=None
+        self,
+        app: str = None,
+        connection=None,
+        optimize: bool = False,
+        transaction: str = "migration",
     ) -> AsyncGenerator[Type[Migration], None]:
         """
         Apply pending migrations.
 
+        A migration is yielded once its transaction is committed, so a migration that
+        fails is rolled back together with the ones in the same transaction. Migrations
+        with `atomic = False` or with operations that can't run in a transaction, e.g.
+        `AddIndex(..., concurrently=True)`, always run outside of a transaction.
+
+        Args:
+            app: The app to apply the migrations of. If None, all pending migrations are applied.
+            connection: Database connection to use.
+            optimize: Whether to optimize the operations of all pending migrations together,
+                see `tortoise_pathway.optimizer`. The optimized operations are applied in one
+                transaction, or without a transaction if any of the migrations is not atomic.
+            transaction: One of `TRANSACTION_MODES`: "migration" to apply every migration in
+                its own transaction, "batch" to apply all pending migrations in one
+                transaction, split around the migrations that are not atomic, or "none" to
+                apply all migrations outside of a transaction.
+
         Returns:
             An async generator of Migration instances that were applied
+
+        Raises:
+            ValueError: If the transaction mode is unknown.
         """
+        if transaction not in TRANSACTION_MODES:
+            raise ValueError(
+                f"Unknown transaction mode {transaction!r}, "
+                f"expected one of {', '.join(TRANSACTION_MODES)}"
+            )
+
         conn = connection or Tortoise.get_connection("default")
 
         # Get pending migrations
         pending_migrations = self.get_pending_migrations(app=app)
 
-        # Apply each migration
-        for migration in pending_migrations:
-            migration_name = migration.name()
+        if optimize:
+            batches = [pending_migrations] if pending_migrations else []
+        elif transaction == "batch":
+            batches = _atomic_batches(pending_migrations)
+        else:
+            batches = [[migration] for migration in pending_migrations]
 
-            try:
-                # Apply migration
-                for operation in migration.operations:
-                    await operation.apply(self.applied_state)
-                    self.applied_state.apply_operation(operation)
+        for batch in batches:
+            atomic = transaction != "none" and all(
+                _is_atomic(migration) for migration in batch
+            )
+            await self._apply_batch(batch, conn, atomic=atomic, optimize=optimize)
+            for migration in batch:
+                yield migration
+
+    async def _apply_batch(
+        self,
+        migrations: list[Type[Migration]],
+        connection,
+        atomic: bool,
+        optimize: bool = False,
+    ) -> None:
+        """
+        Apply the migrations and record them, in one transaction if atomic is set.
+
+        The applied state and migrations are restored if a migration fails.
+        """
+        applied_state = self.applied_state.copy()
+        applied_migrations = set(self.applied_migrations)
 
-                # Record that migration was applied
-                now = datetime.datetime.now().isoformat()
-                # inlining the values helps to avoid the complexity of choosing the correct placeholders
-                # for the backend. The probability of SQL injection here is close to 0.
-                await conn.execute_query(
-                    f"INSERT INTO tortoise_migrations (app, name, applied_at) VALUES ('{migration.app_name}', '{migration_name}', '{now}')",
+        try:
+            async with _transaction(connection, atomic) as conn:
+                if optimize:
+                    operations = optimize_operations(
+                        [
+                            operation
+                            for migration in migrations
+                            for operation in migration.operations
+                        ]
+                    )
+                    # the optimized operations are applied against their own state
+                    await self.execute_operations(
+                        operations, self.applied_state.copy(), conn, atomic
+                    )
+
+                durations: Dict[MigrationKey, int] = {}
+                for migration in migrations:
+                    if optimize:
+                        # the migrations are applied already, only the state follows them
+                        for operation in migration.operations:
+                            self.applied_state.apply_operation(operation)
+                    else:
+                        started = time.perf_counter()
+                        await self.execute_operations(
+                            migration.operations, self.applied_state, conn, atomic
+                        )
+                        durations[_migration_key(migration)] = round(
+                            (time.perf_counter() - started) * 1000
+                        )
+                    self.applied_state.snapshot(migration.name())
+
+                await self.record_migrations(
+                    migrations, connection=conn, durations=durations
                 )
+                for app_name in dict.fromkeys(
+                    migration.app_name for migration in migrations
+                ):
+                    await self.record_applied_state(app_name, connection=conn)
+        except BaseException:
+            self.applied_state = applied_state
+            self.applied_migrations = applied_migrations
+            raise
 
-                self.applied_migrations.add((migration.app_name, migration_name))
-                self.applied_state.snapshot(migration_name)
+    async def execute_operations(
+        self,
+        operations: list[Operation],
+        state: State,
+        connection,
+        atomic: bool,
+    ) -> None:
+        """
+        Apply the operations to the database and to the state, in as few round trips as
+        the database allows.
 
-                yield migration
-            except Exception:
-                # TODO: Rollback transaction if supported
-                raise
+        The SQL of every operation is rendered against the state as it is before the
+        operation, like `Operation.apply` does, and the SQL of consecutive operations is
+        run as one script. Operations that override `apply`, e.g. custom operations, and
+        operations that can't run in a transaction are applied by themselves.
+
+        Scripts only run in one round trip in a transaction on PostgreSQL: outside of a
+        transaction, PostgreSQL would run the script in a transaction of its own, which
+        statements like `CREATE INDEX CONCURRENTLY` refuse, and SQLite runs the statements
+        one by one anyway. If a script fails, its operations are run one by one to find
+        the one that failed, which is added as a note to the exception.
+
+        Args:
+            operations: The operations to apply.
+            state: The state before the operations, they are applied to it.
+            connection: Database connection to use.
+            atomic: Whether the connection is in a transaction.
+        """
+        schema_manager = get_schema_manager(connection)
+        script: list[tuple[Operation, str]] = []
+        for operation in operations:
+            if operation.atomic and type(operation).apply is Operation.apply:
+                sql = operation.forward_sql(state=state, schema_manager=schema_manager)
+                if sql.strip():
+                    script.append((operation, sql))
+            else:
+                await _execute_script(script, connection, atomic)
+                script = []
+                await operation.apply(state, connection.connection_name)
+            state.apply_operation(operation)
+        await _execute_script(script, connection, atomic)
+
+    async def record_migrations(
+        self,
+        migrations: list[Type[Migration]],
+        connection=None,
+        durations: Optional[Dict[MigrationKey, int]] = None,
+    ) -> Dict[MigrationKey, datetime.datetime]:
+        """
+        Record the migrations as applied, with one parameterized INSERT of all rows.
+
+        The migrations they replace are recorded too, so that a squashed migration stays
+        applied when the replaced migrations are deleted, and vice versa. Every row gets
+        a distinct timestamp in the order of the migrations, so that the last migration
+        is the last one applied. The rows of the migrations also have the checksum of the
+        migration file, the duration and the version of tortoise-pathway.
+
+        Args:
+            migrations: The migrations in the order they were applied.
+            connection: Database connection to use.
+            durations: The time it took to apply the migrations in milliseconds, by app and
+                migration name. Migrations without a duration, e.g. the ones applied in an
+                optimized batch, are recorded without it.
+
+        Returns:
+            The recorded timestamps, by app and migration name.
+        """
+        conn = connection or Tortoise.get_connection("default")
+        schema_manager = get_schema_manager(conn)
+
+        durations = durations or {}
+        version = tool_version()
+
+        rows = []
+        for migration in migrations:
+            key = _migration_key(migration)
+            rows.extend((*replaced, None, None) for replaced in migration.replaces)
+            rows.append((*key, _checksum(migration), durations.get(key)))
+
+        now = datetime.datetime.now()
+        recorded: Dict[MigrationKey, datetime.datetime] = {
+            (app_name, name): now + datetime.timedelta(microseconds=i)
+            for i, (app_name, name, _, _) in enumerate(rows)
+        }
+
+        table = Table("tortoise_migrations")
+        columns = ["app", "name", "applied_at", "checksum", "duration_ms"]
+        for start in range(0, len(rows), MAX_RECORDS_PER_INSERT):
+            query = conn.query_class.into(table).columns(*columns, "tool_version")
+            for app_name, name, checksum, duration_ms in rows[
+                start : start + MAX_RECORDS_PER_INSERT
+            ]:
+                applied_at = recorded[(app_name, name)]
+                query = query.insert(
+                    app_name,
+                    name,
+                    schema_manager.timestamp_parameter(applied_at),
+                    checksum,
+                    duration_ms,
+                    version,
+                )
+            await conn.execute_query(*query.get_parameterized_sql())
+
+        self.applied_migrations.update(
+            _migration_key(migration) for migration in migrations
+        )
+        self.recorded_at.update(recorded)
+        return recorded
+
+    async def bootstrap(
+        self, connection=None, run_sql: bool = False
+    ) -> list[Type[Migration]]:
+        """
+        Create the schema of a new database from the migration state and record all
+        migrations as applied, instead of applying every migration.
+
+        The tables are created in the order of their foreign keys, followed by their
+        indexes. RunSQL operations, e.g. data migrations, are skipped unless run_sql is
+        set, see `get_run_sql_migrations`.
+
+        Args:
+            connection: Database connection to use.
+            run_sql: Whether to run the RunSQL operations of the migrations, in the order of
+                the migrations, after the schema is created.
+
+        Returns:
+            The migrations that were recorded as applied.
+
+        Raises:
+            ValueError: If migrations were already applied to the database, or the foreign
+                keys of the models are circular.
+        """
+        conn = connection or Tortoise.get_connection("default")
+
+        if self.applied_migrations:
+            raise ValueError(
+                "The database already has applied migrations, only new databases can "
+                "be bootstrapped"
+            )
+
+        state = self.migration_state
+        applied_state = self.applied_state
+        applied_migrations = set(self.applied_migrations)
+
+        try:
+            async with _transaction(conn, True) as tx:
+                await self.execute_operations(
+                    schema_operations(state), state.copy(), tx, atomic=True
+                )
+
+                if run_sql:
+                    run_sql_operations = [
+                        operation
+                        for migration in self.get_run_sql_migrations()
+                        for operation in migration.operations
+                        if isinstance(operation, RunSQL)
+                    ]
+                    await self.execute_operations(
+                        run_sql_operations, state.copy(), tx, atomic=True
+                    )
+
+                await self.record_migrations(self.migrations, connection=tx)
+
+                self.applied_state = state.copy()
+                for app_name in {migration.app_name for migration in self.migrations}:
+                    await self.record_applied_state(app_name, connection=tx)
+        except BaseException:
+            self.applied_state = applied_state
+            self.applied_migrations = applied_migrations
+            raise
+
+        return list(self.migrations)
+
+    def get_run_sql_migrations(self) -> list[Type[Migration]]:
+        """Get the migrations with RunSQL operations, which `bootstrap` skips by default."""
+        return [
+            migration
+            for migration in self.migrations
+            if any(isinstance(operation, RunSQL) for operation in migration.operations)
+        ]
 
     async def revert_migration(
         self,
@@ -243,11 +845,16 @@ class MigrationManager:
         Revert the last applied migration or a specific migration.
 
         Args:
+            app: The app of the migration. Required for a migration name that several apps
+                have, otherwise it's looked up by the name.
             migration_name: Name of specific migration to revert, or None for the last applied
             connection: Database connection to use
 
         Returns:
             Migration instance that was reverted, or None if no migration was reverted
+
+        Raises:
+            ValueError: If the migration is not found, not applied or ambiguous without app
         """
         conn = connection or Tortoise.get_connection("default")
 
@@ -265,38 +872,141 @@ class MigrationManager:
             migration_name = cast(str, record["name"])
             app = cast(str, record["app"])
 
-        if (app, migration_name) not in set(
-            [(m.app_name, m.name()) for m in self.migrations]
-        ):
-            raise ValueError(f"Migration {app} -> {migration_name} not found")
+        candidates = [
+            m
+            for m in self.migrations
+            if m.name() == migration_name and (app is None or m.app_name == app)
+        ]
+        if not candidates:
+            raise ValueError(f"Migration {app or '*'} -> {migration_name} not found")
+        if len(candidates) > 1:
+            apps = ", ".join(sorted(m.app_name for m in candidates))
+            raise ValueError(
+                f"Migration {migration_name} exists in several apps ({apps}), "
+                "specify the app"
+            )
+        migration = candidates[0]
+        app = migration.app_name
 
         if (app, migration_name) not in self.applied_migrations:
             raise ValueError(f"Migration {migration_name} is not applied")
 
-        # Revert the migration
-        migration = next(m for m in self.migrations if m.name() == migration_name)
+        applied_state = self.applied_state.copy()
+        applied_migrations = set(self.applied_migrations)
 
         try:
-            for operation in reversed(migration.operations):
-                await operation.revert(self.applied_state)
-                # TODO: should be reverting, not applying
-                self.applied_state.apply_operation(operation)
-            # Remove migration record
-            await conn.execute_query(
-                "DELETE FROM tortoise_migrations WHERE app = ? AND name = ?",
-                [app, migration_name],
+            async with _transaction(conn, _is_atomic(migration)) as tx:
+                for operation in reversed(migration.operations):
+                    await operation.revert(self.applied_state, tx.connection_name)
+                    # TODO: should be reverting, not applying
+                    self.applied_state.apply_operation(operation)
+                # Remove migration record, and the records of the migrations it replaces
+                table = Table("tortoise_migrations")
+                for record_app, record_name in [
+                    *migration.replaces,
+                    (app, migration_name),
+                ]:
+                    query = (
+                        tx.query_class.from_(table)
+                        .where((table.app == record_app) & (table.name == record_name))
+                        .delete()
+                    )
+                    await tx.execute_query(*query.get_parameterized_sql())
+
+                self.applied_migrations.remove((app, migration_name))
+
+                # Rebuild state from remaining applied migrations
+                self.applied_state = self.applied_state.prev()
+                await self.record_applied_state(app, connection=tx)
+        except BaseException:
+            self.applied_state = applied_state
+            self.applied_migrations = applied_migrations
+            raise
+
+        return migration
+
+    async def record_applied_state(self, app: str, connection=None) -> None:
+        """
+        Record the last applied migration of the app and the fingerprint of its applied
+        state in the database, for `check` to compare them without loading the migrations.
+        """
+        conn = connection or Tortoise.get_connection("default")
+        schema_manager = get_schema_manager(conn)
+        table = Table("tortoise_migrations_state")
+
+        query = conn.query_class.from_(table).where(table.app == app).delete()
+        await conn.execute_query(*query.get_parameterized_sql())
+
+        applied = self.get_applied_migrations(app=app)
+        if not applied:
+            return
+
+        query = (
+            conn.query_class.into(table)
+            .columns("app", "head", "fingerprint", "updated_at")
+            .insert(
+                app,
+                applied[-1].name(),
+                self._app_fingerprint(self.applied_state, app),
+                schema_manager.timestamp_parameter(datetime.datetime.now()),
             )
+        )
+        await conn.execute_query(*query.get_parameterized_sql())
+
+    def get_fingerprints(self) -> Dict[str, AppFingerprint]:
+        """
+        Get the last migration and the fingerprint of the state of every app that has
+        migrations, as they are recorded in the database once all migrations are applied.
+        """
+        heads = {migration.app_name: migration.name() for migration in self.migrations}
+        return {
+            app: {
+                "head": head,
+                "fingerprint": self._app_fingerprint(self.migration_state, app),
+            }
+            for app, head in heads.items()
+        }
 
-            self.applied_migrations.remove((app, migration_name))
+    async def check(
+        self, expected: Dict[str, AppFingerprint], connection=None
+    ) -> list[str]:
+        """
+        Check whether the database is fully migrated, without loading the migrations.
 
-            # Rebuild state from remaining applied migrations
-            self.applied_state = self.applied_state.prev()
+        This method doesn't require `initialize`, it only reads the state recorded by
+        `apply_migrations` and `revert_migration`.
 
-            return migration
+        Args:
+            expected: The fingerprints from `get_fingerprints`, usually computed at build time.
+            connection: Database connection to use.
 
-        except Exception:
-            # TODO: Rollback transaction if supported
-            raise
+        Returns:
+            The names of the apps whose recorded state doesn't match the expected one.
+        """
+        conn = connection or Tortoise.get_connection("default")
+
+        try:
+            _, records = await conn.execute_query(
+                "SELECT app, head, fingerprint FROM tortoise_migrations_state"
+            )
+        except OperationalError:
+            # the table doesn't exist, nothing has been migrated yet
+            records = []
+
+        recorded = {
+            record["app"]: {
+                "head": record["head"],
+                "fingerprint": record["fingerprint"],
+            }
+            for record in records
+        }
+        return [app for app in sorted(expected) if recorded.get(app) != expected[app]]
+
+    @staticmethod
+    def _app_fingerprint(state: State, app: str) -> str:
+        if app not in state.get_schema():
+            return hash_tree({})
+        return state.app_fingerprint(app)
 
     def get_pending_migrations(self, app: str | None = None) -> list[Type[Migration]]:
         """
@@ -336,7 +1046,7 @@ class MigrationManager:
         Returns:
             SQL statements
         """
-        # we need to copy the state because the state is modified when SQL is generated
+        # we need to copy the state because the operations are applied to it below
         state = self.applied_state.copy()
         # Tortoise doesn't support the databases of different dialects in the same connection,
         # hence we can just use the default connection
@@ -353,20 +1063,78 @@ class MigrationManager:
 
         return "\n".join(sql_statements)
 
+    def get_bootstrap_sql(self, run_sql: bool = False) -> str:
+        """
+        Get the SQL statements that `bootstrap` runs, without running them.
+
+        Args:
+            run_sql: Whether to include the RunSQL operations of the migrations.
+
+        Returns:
+            SQL statements
+        """
+        state = self.migration_state
+        schema_manager = get_schema_manager(connections.get("default"))
+        sql_statements = [
+            operation.forward_sql(state=state, schema_manager=schema_manager)
+            for operation in schema_operations(state)
+        ]
+        if run_sql:
+            for migration in self.get_run_sql_migrations():
+                sql_statements.append(f"-- RunSQL of: {migration.display_name()}")
+                sql_statements.extend(
+                    operation.forward_sql(state=state, schema_manager=schema_manager)
+                    for operation in migration.operations
+                    if isinstance(operation, RunSQL)
+                )
+
+        return "\n".join(sql_statements)
+
     def _rebuild_state(self) -> None:
-        """Build the state from applied migrations."""
-        self.migration_state = State()
+        """
+        Build the state of all migrations and the state of the applied migrations.
 
-        for migration in self.migrations:
-            for operation in migration.operations:
-                self.migration_state.apply_operation(operation)
-            self.migration_state.snapshot(migration.name())
+        Both states are built in a single replay: the applied state forks from the
+        migration state after the longest prefix of migrations that are all applied,
+        which is usually all of them, and replays the remaining applied migrations.
+        """
+        applied_migrations = self.get_applied_migrations()
+        applied_prefix = 0
+        for applied, migration in zip(applied_migrations, self.migrations):
+            if applied is not migration:
+                break
+            applied_prefix += 1
 
-        self.applied_state = State()
-        for migration in self.get_applied_migrations():
-            for operation in migration.operations:
-                self.applied_state.apply_operation(operation)
-            self.applied_state.snapshot(migration.name())
+        state, replayed = State(), 0
+        if self.state_cache is not None:
+            state, replayed = self.state_cache.restore(self.migrations)
+
+        applied_state = None
+        if applied_prefix < replayed:
+            applied_state = state.rewind(applied_prefix)
+
+        for i, migration in enumerate(self.migrations[replayed:], start=replayed):
+            if i == applied_prefix:
+                applied_state = state.copy()
+            self._replay_migration(state, migration)
+
+        if applied_state is None:
+            applied_state = state.copy()
+
+        self.migration_state = state
+        if self.state_cache is not None:
+            self.state_cache.save(self.migrations, self.migration_state)
+
+        for migration in applied_migrations[applied_prefix:]:
+            self._replay_migration(applied_state, migration)
+        self.applied_state = applied_state
+
+    @staticmethod
+    def _replay_migration(state: State, migration: Type[Migration]) -> None:
+        """Apply the operations of the migration to the state and take a snapshot."""
+        for operation in migration.operations:
+            state.apply_operation(operation)
+        state.snapshot(migration.name())
 
 
 def gen_name_from_changes(changes: List[Operation]) -> str:
@@ -401,9 +1169,22 @@ def gen_name_from_changes(changes: List[Operation]) -> str:
 
 
 def load_migrations_from_disk(
-    app_name: str, migrations_dir: Path
+    app_name: str,
+    migrations_dir: Path,
+    lazy: bool = False,
+    executor: Executor | None = None,
 ) -> List[Type[Migration]]:
-    """Load migrations from the migrations directory."""
+    """
+    Load migrations from the migrations directory.
+
+    Args:
+        app_name: The app the migrations belong to.
+        migrations_dir: The directory of the app migrations.
+        lazy: Whether to parse the migration files instead of importing them. The modules
+            are imported when the operations of the migrations are accessed for the first time.
+        executor: The executor to import the migration files concurrently on. The migrations
+            are returned and the errors are reported in the order of the files regardless.
+    """
     # Ensure the app-specific migrations directory exists
     if not migrations_dir.exists():
         migrations_dir.mkdir(parents=True, exist_ok=True)
@@ -412,15 +1193,44 @@ def load_migrations_from_disk(
     # Get all Python files and sort them by name for idempotency
     migration_files = sorted(migrations_dir.glob("*.py"))
 
+    manifest = None
+    if lazy:
+        # only the files that changed since the manifest was written are parsed
+        manifest = MigrationManifest(migrations_dir)
+        manifest.load()
+        manifest.refresh()
+        if manifest.path.exists():
+            manifest.save()
+
+    migration_files = [
+        file_path
+        for file_path in migration_files
+        if not file_path.name.startswith("__")
+    ]
+
+    imports: dict[Path, Future[Type[Migration]]] = {}
+    if executor is not None:
+        for file_path in migration_files:
+            if not (manifest and manifest.parsed(file_path.stem)):
+                imports[file_path] = executor.submit(load_migration_file, file_path)
+
     loaded_migrations = []
     for file_path in migration_files:
-        if file_path.name.startswith("__"):
-            continue
-
         migration_name = file_path.stem
 
         try:
-            migration = load_migration_file(file_path)
+            parsed = manifest.parsed(migration_name) if manifest else None
+            if parsed:
+                loaded_migrations.append(
+                    load_lazy_migration(file_path, app_name, parsed)
+                )
+                continue
+
+            # the attributes can't be determined without running the module
+            if file_path in imports:
+                migration = imports[file_path].result()
+            else:
+                migration = load_migration_file(file_path)
 
             # Set app_name for operations where the app_name is hard to determine,
             # for instance, RunSQL operations.
@@ -439,58 +1249,299 @@ def load_migrations_from_disk(
     return loaded_migrations
 
 
-def sort_migrations(migrations: list[Type[Migration]]) -> list[Type[Migration]]:
-    """Sort migrations based on dependencies."""
-    root = None
-    # for traversing the dependency graph from the root to the leaves
-    reverse_dependency_graph: dict[tuple[str, str], list[Type[Migration]]] = (
-        defaultdict(list)
-    )
+def sort_migrations(
+    migrations: list[Type[Migration]],
+    aliases: Dict[MigrationKey, MigrationKey] | None = None,
+) -> list[Type[Migration]]:
+    """
+    Sort migrations based on dependencies.
 
-    for migration in migrations:
-        for dependency in migration.dependencies:
-            reverse_dependency_graph[dependency].append(migration)
+    Migrations that don't depend on each other are sorted by name, then by app. There can
+    be several root migrations, e.g. one per app or the first migrations of two branches.
+
+    Args:
+        migrations: The migrations to sort.
+        aliases: Dependencies on migrations that are replaced by other migrations, see
+            `resolve_replacements`.
 
-        if not migration.dependencies:
-            if root:
+    Raises:
+        ValueError: If there is no root migration, a dependency is missing or the
+            dependencies are circular.
+    """
+    if migrations and all(migration.dependencies for migration in migrations):
+        raise ValueError("No root migration found")
+
+    by_key = {_migration_key(migration): migration for migration in migrations}
+    sorter: TopologicalSorter[MigrationKey] = TopologicalSorter()
+    for key, migration in by_key.items():
+        dependencies = _dependencies(migration, aliases)
+        for dependency in dependencies:
+            if dependency not in by_key:
                 raise ValueError(
-                    f"Multiple root migrations found: {root.name()} and {migration.name()}"
+                    f"Migration {key[0]} -> {key[1]} depends on missing migration "
+                    f"{dependency[0]} -> {dependency[1]}"
                 )
-            root = migration
+        sorter.add(key, *dependencies)
 
-    if migrations and root is None:
-        raise ValueError("No root migration found")
+    try:
+        sorter.prepare()
+    except CycleError as e:
+        cycle = " -> ".join(f"{app} {name}" for app, name in e.args[1])
+        raise ValueError(f"Circular dependency detected: {cycle}") from None
 
     sorted_migrations = []
-    if root is None:
-        return sorted_migrations
+    while sorter.is_active():
+        # the order of independent migrations must not depend on the order of the files
+        for key in sorted(sorter.get_ready(), key=lambda key: (key[1], str(key[0]))):
+            sorted_migrations.append(by_key[key])
+            sorter.done(key)
+
+    return sorted_migrations
+
+
+def find_leaves(
+    migrations: list[Type[Migration]],
+    aliases: Dict[MigrationKey, MigrationKey] | None = None,
+) -> list[Type[Migration]]:
+    """
+    Find the migrations that no other migration depends on, in the order of the migrations.
+
+    A graph of migrations with more than one leaf has branches that need to be merged.
+    """
+    dependencies = {
+        dependency
+        for migration in migrations
+        for dependency in _dependencies(migration, aliases)
+    }
+    return [
+        migration
+        for migration in migrations
+        if _migration_key(migration) not in dependencies
+    ]
+
+
+async def _execute_script(
+    script: list[tuple[Operation, str]], connection, atomic: bool
+) -> None:
+    """Run the SQL of the operations, see `MigrationManager.execute_operations`."""
+    if atomic and len(script) > 1 and connection.capabilities.dialect == "postgres":
+        statements = [sql.strip().rstrip(";") + ";" for _, sql in script]
+        try:
+            await connection.execute_script(
+                "\n".join(
+                    [
+                        "SAVEPOINT pathway_operations;",
+                        *statements,
+                        "RELEASE SAVEPOINT pathway_operations;",
+                    ]
+                )
+            )
+            return
+        except Exception:
+            # run the operations one by one to find the one that fails
+            await connection.execute_script("ROLLBACK TO SAVEPOINT pathway_operations")
+
+    for operation, sql in script:
+        try:
+            await execute_script(connection, sql)
+        except Exception as e:
+            e.add_note(f"The failed operation: {_describe(operation)}")
+            raise
+
+
+def _describe(operation: Operation) -> str:
+    try:
+        return str(operation)
+    except NotImplementedError:
+        return type(operation).__name__
 
-    visited: Dict[str, int] = defaultdict(int)
-    stack: List[Type[Migration]] = [root]
 
-    while stack:
-        migration = stack.pop()
-        migration_key = (migration.app_name, migration.name())
-        visited[migration_key] += 1
+def _transaction(connection, atomic: bool) -> AsyncContextManager:
+    """A transaction on the connection if atomic is set, otherwise the connection itself."""
+    if not atomic:
+        return nullcontext(connection)
+    return in_transaction(connection.connection_name)
 
-        if visited[migration_key] < len(migration.dependencies):
-            # wait for other branches before proceeding further
+
+def _atomic_batches(migrations: list[Type[Migration]]) -> list[list[Type[Migration]]]:
+    """Split the migrations into batches of atomic migrations and single non-atomic ones."""
+    batches: list[list[Type[Migration]]] = []
+    for migration in migrations:
+        if _is_atomic(migration) and batches and _is_atomic(batches[-1][-1]):
+            batches[-1].append(migration)
+        else:
+            batches.append([migration])
+    return batches
+
+
+def _is_atomic(migration: Type[Migration]) -> bool:
+    """Whether the migration and all of its operations can run in a transaction."""
+    return migration.atomic and all(
+        operation.atomic for operation in migration.operations
+    )
+
+
+def tool_version() -> str:
+    """The version of tortoise-pathway that is recorded with the applied migrations."""
+    try:
+        return importlib.metadata.version("tortoise-pathway")
+    except importlib.metadata.PackageNotFoundError:
+        return __version__
+
+
+def _checksum(migration: Type[Migration]) -> Optional[str]:
+    try:
+        return migration.checksum()
+    except OSError:
+        # e.g. a migration that was not loaded from a file
+        return None
+
+
+def schema_operations(state: State) -> list[Operation]:
+    """
+    Get the operations that create the schema of the state in an empty database.
+
+    The models are created in the order of their foreign keys, models that don't refer
+    to each other by app and name. Many-to-many fields are added like `AddField` adds
+    them once all models are created, from one side of the relation only, followed by
+    the indexes.
+
+    Raises:
+        ValueError: If the foreign keys of the models are circular.
+    """
+    models: Dict[MigrationKey, dict] = {
+        (app_name, model_name): model
+        for app_name, app in state.get_schema().items()
+        for model_name, model in app["models"].items()
+    }
+
+    sorter: TopologicalSorter[MigrationKey] = TopologicalSorter()
+    for key, model in models.items():
+        references = []
+        for field in model["fields"].values():
+            if issubclass(field.field_class, RelationalField) and not issubclass(
+                field.field_class, ManyToManyFieldInstance
+            ):
+                reference = Operation._split_model_reference(field.model_name)
+                if reference != key:
+                    references.append(reference)
+        sorter.add(key, *references)
+
+    try:
+        sorter.prepare()
+    except CycleError as e:
+        cycle = " -> ".join(f"{app}.{model}" for app, model in e.args[1])
+        raise ValueError(f"Circular foreign keys: {cycle}") from None
+
+    create_models: list[Operation] = []
+    add_m2m_fields: list[Operation] = []
+    add_indexes: list[Operation] = []
+    # the relations whose many-to-many field was added, from either side
+    m2m_relations: set[frozenset[tuple[str, str]]] = set()
+    while sorter.is_active():
+        for key in sorted(sorter.get_ready()):
+            sorter.done(key)
+            if key not in models:
+                # a reference to a model of another app that isn't managed
+                continue
+            model = models[key]
+            reference = f"{key[0]}.{key[1]}"
+            create_models.append(
+                CreateModel(
+                    model=reference,
+                    table=model["table"],
+                    fields={
+                        name: field.to_field()
+                        for name, field in model["fields"].items()
+                        if not issubclass(field.field_class, ManyToManyFieldInstance)
+                    },
+                )
+            )
+            for name, field in model["fields"].items():
+                if not issubclass(field.field_class, ManyToManyFieldInstance):
+                    continue
+                # the state has the field on both models, with the name of the other side
+                # as the related name
+                relation = frozenset(
+                    [(reference, name), (field.model_name, field.related_name)]
+                )
+                if relation in m2m_relations:
+                    continue
+                m2m_relations.add(relation)
+                add_m2m_fields.append(AddField(reference, field.to_field(), name))
+            add_indexes.extend(
+                AddIndex(model=reference, index=index)
+                for index in model["indexes"].values()
+            )
+    return create_models + add_m2m_fields + add_indexes
+
+
+def resolve_replacements(
+    migrations: list[Type[Migration]], applied: set[MigrationKey]
+) -> tuple[list[Type[Migration]], Dict[MigrationKey, MigrationKey], set[MigrationKey]]:
+    """
+    Choose between squashed migrations and the migrations they replace.
+
+    A squashed migration is used instead of the migrations it replaces unless only some of
+    them are applied. In that case, the replaced migrations are used until all of them are
+    applied. The replaced migrations don't have to exist.
+
+    Args:
+        migrations: The migrations found on disk.
+        applied: The applied migrations.
+
+    Returns:
+        A tuple of the migrations to use, the aliases of the dependencies on the migrations
+        that are not used, and the squashed migrations that are applied because all the
+        migrations they replace are applied.
+    """
+    removed: set[MigrationKey] = set()
+    aliases: Dict[MigrationKey, MigrationKey] = {}
+    applied_squashed: set[MigrationKey] = set()
+
+    for migration in migrations:
+        replaces = [tuple(replaced) for replaced in migration.replaces]
+        if not replaces:
             continue
 
-        if migration != root and visited[migration_key] > len(migration.dependencies):
-            raise ValueError(f"Circular dependency detected to {migration_key}")
+        key = _migration_key(migration)
+        applied_count = sum(replaced in applied for replaced in replaces)
+        if key in applied or applied_count in (0, len(replaces)):
+            if key not in applied and applied_count:
+                applied_squashed.add(key)
+            removed.update(replaces)
+            aliases.update((replaced, key) for replaced in replaces)
+        else:
+            # the database is in the middle of the replaced migrations
+            removed.add(key)
+            aliases[key] = replaces[-1]
 
-        sorted_migrations.append(migration)
+    kept = [
+        migration
+        for migration in migrations
+        if _migration_key(migration) not in removed
+    ]
+    return kept, aliases, applied_squashed
 
-        for next_node in reverse_dependency_graph[migration_key]:
-            stack.append(next_node)
 
-    if len(sorted_migrations) != len(migrations):
-        raise ValueError(
-            f"Circular dependency detected to {migration.app_name} {migration.name()}"
-        )
+def _migration_key(migration: Type[Migration]) -> MigrationKey:
+    return (migration.app_name, migration.name())
 
-    return sorted_migrations
+
+def _dependencies(
+    migration: Type[Migration], aliases: Dict[MigrationKey, MigrationKey] | None
+) -> list[MigrationKey]:
+    dependencies = []
+    for dependency in migration.dependencies:
+        dependency = tuple(dependency)
+        seen = set()
+        # squashed migrations can be squashed again
+        while aliases and dependency in aliases and dependency not in seen:
+            seen.add(dependency)
+            dependency = aliases[dependency]
+        if dependency not in dependencies:
+            dependencies.append(dependency)
+    return dependencies
 
 
 def load_migration_file(migration_path: Path) -> Type[Migration]:
@@ -509,6 +1560,64 @@ def load_migration_file(migration_path: Path) -> Type[Migration]:
     raise ImportError(f"No Migration class found in the module {module_path}")
 
 
+def load_lazy_migration(
+    migration_path: Path,
+    app_name: str,
+    parsed: tuple[str, dict[str, Any]] | None = None,
+) -> Type[Migration]:
+    """
+    Create a Migration class from the parsed migration file, without importing it.
+
+    The class has the same name, module and literal attributes as the class in the file.
+    The module is imported when the operations are accessed for the first time.
+
+    Args:
+        migration_path: The path to the migration file.
+        app_name: The app the migration belongs to.
+        parsed: The class name and attributes of the migration, e.g. from the manifest.
+            The file is parsed if they are not given.
+
+    Raises:
+        ValueError: If the file can't be parsed, see `parse_migration_file`.
+    """
+    class_name, attributes = parsed or parse_migration_file(migration_path)
+    path_without_ext = migration_path.with_suffix("")
+    module_path = str(path_without_ext).replace("/", ".").replace("\\", ".")
+
+    return cast(
+        Type[Migration],
+        type(
+            class_name,
+            (Migration,),
+            {
+                **attributes,
+                "__module__": module_path,
+                "app_name": app_name,
+                "operations": _LazyOperations(migration_path),
+            },
+        ),
+    )
+
+
+class _LazyOperations:
+    """Class attribute that imports the migration module when it's accessed."""
+
+    def __init__(self, migration_path: Path):
+        self.migration_path = migration_path
+
+    def __get__(self, instance: Any, owner: Type[Migration]) -> list[Operation]:
+        migration = load_migration_file(self.migration_path)
+
+        operations = migration.operations
+        for operation in operations:
+            if not operation.app_name:
+                operation.app_name = owner.app_name
+
+        # replace the descriptor so that the module is only loaded once
+        owner.operations = operations
+        return operations
+
+
 def flatten_app_dependencies(
     app_dependencies: dict[str, list[str]],
     app_name: str,
@@ -6,6 +6,7 @@ from tortoise_pathway.operations.operation import Operation
 from tortoise_pathway.operations.add_field import AddField
 from tortoise_pathway.operations.add_index import AddIndex
 from tortoise_pathway.operations.alter_field import AlterField
+from tortoise_pathway.operations.backfill_field import BackfillField
 from tortoise_pathway.operations.create_model import CreateModel
 from tortoise_pathway.operations.drop_field import DropField
 from tortoise_pathway.operations.drop_index import DropIndex
@@ -20,6 +21,7 @@ __all__ = [
     "AddField",
     "AddIndex",
     "AlterField",
+    "BackfillField",
     "CreateModel",
     "DropField",
     "DropIndex",
@@ -15,18 +15,31 @@ if TYPE_CHECKING:
 
 
 class AddField(Operation):
-    """Add a new field to an existing model."""
+    """
+    Add a new field to an existing model.
+
+    Args:
+        model: Model reference in the format "{app_name}.{model_name}".
+        field_object: The field to add.
+        field_name: The name of the field.
+        online: Add the foreign key constraint of a relational field without blocking writes
+            to the table while the rows are checked, on PostgreSQL. The operation can't run
+            in a transaction, so its migration is applied outside of one.
+    """
 
     def __init__(
         self,
         model: str,
         field_object: Field,
         field_name: str,
+        online: bool = False,
     ):
         super().__init__(model)
         self.field_object = field_object
         self.field_name = field_name
         self._db_column = field_db_column(field_object, field_name)
+        self.online = online
+        self.atomic = not online
 
     def forward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
         """Generate SQL for adding a column."""
@@ -43,6 +56,7 @@ class AddField(Operation):
                 related_table,
                 to_field,
                 getattr(self.field_object, "null", False),
+                online=self.online,
             )
 
         return schema_manager.add_column(
@@ -65,5 +79,7 @@ class AddField(Operation):
         lines.append(f'    model="{self.model}",')
         lines.append(f"    field_object={field_to_migration(self.field_object)},")
         lines.append(f'    field_name="{self.field_name}",')
+        if self.online:
+            lines.append("    online=True,")
         lines.append(")")
         return "\n".join(lines)
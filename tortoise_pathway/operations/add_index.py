@@ -8,6 +8,7 @@ from tortoise.indexes import Index
 from tortoise_pathway.index_ext import UniqueIndex
 
 from tortoise_pathway.operations.operation import Operation
+from tortoise_pathway.schema import get_schema_manager
 from tortoise_pathway.schema.base import BaseSchemaManager
 
 if TYPE_CHECKING:
@@ -15,12 +16,23 @@ if TYPE_CHECKING:
 
 
 class AddIndex(Operation):
-    """Add an index to a table."""
+    """
+    Add an index to a table.
+
+    Args:
+        model: Model reference in the format "{app_name}.{model_name}".
+        index: The index, it must have a name.
+        concurrently: Build the index without locking writes to the table, with
+            `CREATE INDEX CONCURRENTLY` on PostgreSQL. The operation can't run in a
+            transaction, so its migration is applied outside of one. Other databases build
+            the index normally.
+    """
 
     def __init__(
         self,
         model: str,
         index: Index,
+        concurrently: bool = False,
     ):
         if not index.name:
             raise ValueError("Index name is required")
@@ -30,6 +42,22 @@ class AddIndex(Operation):
         self.index_name = index.name
         self.unique = isinstance(index, UniqueIndex)
         self.fields = index.fields
+        self.concurrently = concurrently
+        self.atomic = not concurrently
+
+    async def prepare(self, state: "State", connection) -> None:
+        """Drop the invalid index that a failed concurrent build left behind."""
+        if connection.capabilities.dialect != "postgres":
+            return
+        _, records = await connection.execute_query(
+            "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+            f"WHERE pg_class.relname = '{self.index_name}' AND NOT pg_index.indisvalid"
+        )
+        if records:
+            schema_manager = get_schema_manager(connection)
+            await connection.execute_script(
+                schema_manager.drop_index(self.index_name, concurrently=True)
+            )
 
     def forward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
         """Generate SQL for adding an index."""
@@ -42,12 +70,17 @@ class AddIndex(Operation):
                 column_name = field_name
             column_names.append(column_name)  # Get actual column names from field names
         return schema_manager.add_index(
-            table_name, self.index_name, column_names, self.unique, self.index.INDEX_TYPE
+            table_name,
+            self.index_name,
+            column_names,
+            self.unique,
+            self.index.INDEX_TYPE,
+            concurrently=self.concurrently,
         )
 
     def backward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
         """Generate SQL for dropping an index."""
-        return schema_manager.drop_index(self.index_name)
+        return schema_manager.drop_index(self.index_name, concurrently=self.concurrently)
 
     def to_migration(self) -> str:
         """Generate Python code to add an index in a migration."""
@@ -64,5 +97,7 @@ class AddIndex(Operation):
             lines.append(f'        name="{self.index.name}",')
 
         lines.append("    ),")
+        if self.concurrently:
+            lines.append("    concurrently=True,")
         lines.append(")")
         return "\n".join(lines)
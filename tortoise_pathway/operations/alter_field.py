@@ -16,17 +16,30 @@ if TYPE_CHECKING:
 
 
 class AlterField(Operation):
-    """Alter the properties of an existing field."""
+    """
+    Alter the properties of an existing field.
+
+    Args:
+        model: Model reference in the format "{app_name}.{model_name}".
+        field_object: The new definition of the field.
+        field_name: The name of the field.
+        online: Make the column NOT NULL without blocking writes to the table while the rows
+            are checked, on PostgreSQL. The operation can't run in a transaction, so its
+            migration is applied outside of one.
+    """
 
     def __init__(
         self,
         model: str,
         field_object: Field,
         field_name: str,
+        online: bool = False,
     ):
         super().__init__(model)
         self.field_object = field_object
         self.field_name = field_name
+        self.online = online
+        self.atomic = not online
 
     def forward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
         """Generate SQL for altering a column."""
@@ -41,17 +54,18 @@ class AlterField(Operation):
         return schema_manager.alter_column(
             self.get_table_name(state),
             self.field_name,
-            prev_field,
+            prev_field.to_field(),
             self.field_object,
+            online=self.online,
         )
 
     def backward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
-        prev_field = state.prev().get_field(self.model_name, self.field_name)
+        prev_field = state.prev().get_field(self.app_name, self.model_name, self.field_name)
         if prev_field is None:
             raise ValueError(f"Field {self.field_name} not found in model {self.model_name}")
-        return AlterField(self.model, prev_field, self.field_name).forward_sql(
-            state, schema_manager
-        )
+        return AlterField(
+            self.model, prev_field.to_field(), self.field_name, online=self.online
+        ).forward_sql(state, schema_manager)
 
     def to_migration(self) -> str:
         """Generate Python code to alter a field in a migration."""
@@ -60,6 +74,8 @@ class AlterField(Operation):
         lines.append(f'    model="{self.model}",')
         lines.append(f"    field_object={field_to_migration(self.field_object)},")
         lines.append(f'    field_name="{self.field_name}",')
+        if self.online:
+            lines.append("    online=True,")
         lines.append(")")
         return "\n".join(lines)
 
@@ -69,14 +85,15 @@ class AlterField(Operation):
         table_name = self.get_table_name(state)
         temp_table_name = f"__new__{table_name}"
 
-        # Step 1: Begin transaction
-        sql = "BEGIN TRANSACTION;\n"
+        # Step 1: Begin transaction, a savepoint also works in the transaction of a migration
+        sql = "SAVEPOINT alter_field;\n"
 
         # Step 2: Create a new table with the desired schema
         # First, get all fields from the model
-        model_fields = state.get_fields(self.app_name, self.model_name)
-        if model_fields is None:
-            raise ValueError(f"Model {self.model_name} not found in state")
+        model_fields = {
+            field_name: field_spec.to_field()
+            for field_name, field_spec in state.get_fields(self.app_name, self.model_name).items()
+        }
 
         # Replace the altered field with the new field object
         model_fields[self.field_name] = self.field_object
@@ -111,5 +128,5 @@ class AlterField(Operation):
         sql += f"ALTER TABLE {temp_table_name} RENAME TO {table_name};\n"
 
         # Complete the transaction
-        sql += "COMMIT;"
+        sql += "RELEASE SAVEPOINT alter_field;"
         return sql
@@ -0,0 +1,225 @@
+"""
+BackfillField operation for Tortoise ORM migrations.
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, Any
+
+from pypika_tortoise import Table
+from tortoise import connections
+from tortoise.fields import Field
+from tortoise.fields.relational import RelationalField
+from tortoise.transactions import in_transaction
+
+from tortoise_pathway.field_ext import FieldSpec, field_to_migration
+from tortoise_pathway.operations.add_field import AddField
+from tortoise_pathway.operations.alter_field import AlterField
+from tortoise_pathway.schema import get_schema_manager
+from tortoise_pathway.schema.base import BaseSchemaManager
+
+if TYPE_CHECKING:
+    from tortoise_pathway.state import State
+
+
+class BackfillField(AddField):
+    """
+    Add a NOT NULL field to a populated table without locking it for the whole update.
+
+    The column is added as nullable, the rows are filled in batches ordered by the primary
+    key, every batch in a transaction of its own, and the column is made NOT NULL at the end,
+    online on PostgreSQL. The operation can't run in a transaction, so its migration is
+    applied outside of one.
+
+    An interrupted backfill resumes where it stopped when the migration is applied again:
+    the column is only added if it's missing, and only the rows that are still NULL are
+    filled.
+
+    Args:
+        model: Model reference in the format "{app_name}.{model_name}".
+        field_object: The field to add, it can't be nullable or relational.
+        field_name: The name of the field.
+        default: The value of the existing rows, or a callable that returns the value of
+            every row. Defaults to the default of the field.
+        batch_size: How many rows are filled in a transaction.
+        sleep: How long to wait between the batches in seconds, to leave room for the load
+            of the application.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        field_object: Field,
+        field_name: str,
+        default: Any = None,
+        batch_size: int = 1000,
+        sleep: float = 0.0,
+    ):
+        if isinstance(field_object, RelationalField):
+            raise ValueError("Relational fields can't be backfilled")
+        if field_object.null:
+            raise ValueError("Nullable fields don't need a backfill, use AddField")
+        if default is None and field_object.default is None:
+            raise ValueError(
+                f"Field {field_name} has no default to backfill the rows with, "
+                "pass the value of the existing rows as `default`"
+            )
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        super().__init__(model, field_object, field_name)
+        self.default = default
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.atomic = False
+
+    async def apply(self, state: "State", connection_name: str = "default") -> None:
+        """
+        Add the column, fill it batch by batch and make it NOT NULL.
+
+        Args:
+            state: State object that contains schema information.
+            connection_name: The database connection name to use.
+        """
+        connection = connections.get(connection_name)
+        schema_manager = get_schema_manager(connection)
+        table_name = self.get_table_name(state)
+
+        if not await _column_exists(connection, table_name, self._db_column):
+            await self._execute(
+                connection,
+                schema_manager.add_column(table_name, self._db_column, self._nullable_field()),
+            )
+        await self._backfill(state, connection, table_name)
+        await self._execute(connection, self._set_not_null_sql(state, schema_manager))
+
+    def forward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
+        """Generate SQL for adding the column, the rows are filled by `apply`."""
+        table_name = self.get_table_name(state)
+        add_column = schema_manager.add_column(table_name, self._db_column, self._nullable_field())
+        return (
+            f"{add_column};\n"
+            f"-- {table_name}.{self._db_column} is filled in batches of {self.batch_size} rows\n"
+            f"{self._set_not_null_sql(state, schema_manager)}"
+        )
+
+    def to_migration(self) -> str:
+        """Generate Python code to backfill a field in a migration."""
+        lines = []
+        lines.append("BackfillField(")
+        lines.append(f'    model="{self.model}",')
+        lines.append(f"    field_object={field_to_migration(self.field_object)},")
+        lines.append(f'    field_name="{self.field_name}",')
+        if callable(self.default):
+            check_default_importable(self.model, self.field_name, self.default)
+            lines.append(f"    default={self.default.__name__},")
+        elif self.default is not None:
+            lines.append(f"    default={self.default!r},")
+        if self.batch_size != 1000:
+            lines.append(f"    batch_size={self.batch_size},")
+        if self.sleep:
+            lines.append(f"    sleep={self.sleep},")
+        lines.append(")")
+        return "\n".join(lines)
+
+    def _nullable_field(self) -> Field:
+        return FieldSpec.from_field(self.field_object).replace(null=True, default=None).to_field()
+
+    def _set_not_null_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
+        # the SQL is rendered against the state with the nullable column
+        added = state.copy()
+        added.apply_operation(AddField(self.model, self._nullable_field(), self.field_name))
+        return AlterField(self.model, self.field_object, self.field_name, online=True).forward_sql(
+            added, schema_manager
+        )
+
+    def _default(self) -> Any:
+        return self.default if self.default is not None else self.field_object.default
+
+    def _value(self) -> Any:
+        default = self._default()
+        value = default() if callable(default) else default
+        return self.field_object.to_db_value(value, None)
+
+    async def _backfill(self, state: "State", connection, table_name: str) -> None:
+        pk_column = _pk_column(state, self.app_name, self.model_name)
+        table = Table(table_name)
+        column, pk = table[self._db_column], table[pk_column]
+        last_key = None
+        while True:
+            condition = column.isnull()
+            if last_key is not None:
+                condition &= pk > last_key
+            query = (
+                connection.query_class.from_(table)
+                .select(pk)
+                .where(condition)
+                .orderby(pk)
+                .limit(self.batch_size)
+            )
+            _, rows = await connection.execute_query(*query.get_parameterized_sql())
+            keys = [row[pk_column] for row in rows]
+            if not keys:
+                return
+
+            async with in_transaction(connection.connection_name) as tx:
+                if callable(self._default()):
+                    # every row gets a value of its own
+                    updates = [
+                        connection.query_class.update(table)
+                        .set(column, self._value())
+                        .where(pk == key)
+                        .get_parameterized_sql()
+                        for key in keys
+                    ]
+                    await tx.execute_many(updates[0][0], [values for _, values in updates])
+                else:
+                    query = (
+                        connection.query_class.update(table)
+                        .set(column, self._value())
+                        .where(column.isnull() & (pk >= keys[0]) & (pk <= keys[-1]))
+                    )
+                    await tx.execute_query(*query.get_parameterized_sql())
+
+            if len(keys) < self.batch_size:
+                return
+            last_key = keys[-1]
+            await asyncio.sleep(self.sleep)
+
+
+def check_default_importable(model: str, field_name: str, default: Any) -> None:
+    """
+    Check that a migration file can import a callable default by its name, e.g. `uuid4`.
+
+    Raises:
+        ValueError: If the default is a lambda, a nested function or a method.
+    """
+    name = getattr(default, "__name__", "")
+    if (
+        getattr(default, "__module__", None)
+        and not name.startswith("<")
+        and getattr(default, "__qualname__", None) == name
+    ):
+        return
+    raise ValueError(
+        f"The default of {model}.{field_name}, {getattr(default, '__qualname__', default)!r}, "
+        "can't be imported by a migration. Use a function defined at the module level"
+    )
+
+
+def _pk_column(state: "State", app_name: str, model_name: str) -> str:
+    for field_name, field in state.get_fields(app_name, model_name).items():
+        if getattr(field, "pk", False):
+            return state.get_column_name(app_name, model_name, field_name) or field_name
+    raise ValueError(f"Model {app_name}.{model_name} has no primary key to backfill by")
+
+
+async def _column_exists(connection, table_name: str, column_name: str) -> bool:
+    if connection.capabilities.dialect == "sqlite":
+        sql = f"SELECT 1 FROM pragma_table_info('{table_name}') WHERE name = '{column_name}'"
+    else:
+        sql = (
+            "SELECT 1 FROM information_schema.columns "
+            f"WHERE table_name = '{table_name}' AND column_name = '{column_name}'"
+        )
+    _, records = await connection.execute_query(sql)
+    return bool(records)
@@ -32,10 +32,10 @@ class DropField(Operation):
         return schema_manager.drop_column(self.get_table_name(state), column_name)
 
     def backward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
-        field = state.prev().get_field(self.model_name, self.field_name)
+        field = state.prev().get_field(self.app_name, self.model_name, self.field_name)
         if field is None:
             raise ValueError(f"Field {self.field_name} not found in model {self.model_name}")
-        return AddField(self.model, field, self.field_name).forward_sql(state, schema_manager)
+        return AddField(self.model, field.to_field(), self.field_name).forward_sql(state, schema_manager)
 
     def to_migration(self) -> str:
         """Generate Python code to drop a field in a migration."""
@@ -13,28 +13,41 @@ if TYPE_CHECKING:
 
 
 class DropIndex(Operation):
-    """Drop an index from a table."""
+    """
+    Drop an index from a table.
+
+    Args:
+        model: Model reference in the format "{app_name}.{model_name}".
+        index_name: The name of the index.
+        concurrently: Drop the index without locking the table, with
+            `DROP INDEX CONCURRENTLY` on PostgreSQL, see `AddIndex`.
+    """
 
     def __init__(
         self,
         model: str,
         index_name: str,
+        concurrently: bool = False,
     ):
         if not index_name:
             raise ValueError("index_name is required")
 
         super().__init__(model)
         self.index_name = index_name
+        self.concurrently = concurrently
+        self.atomic = not concurrently
 
     def forward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
-        return schema_manager.drop_index(self.index_name)
+        return schema_manager.drop_index(self.index_name, concurrently=self.concurrently)
 
     def backward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
         """Generate SQL for adding an index."""
         index = state.prev().get_index(self.app_name, self.model_name, self.index_name)
         if index is None:
             raise ValueError(f"Index {self.index_name} not found in model {self.model}")
-        return AddIndex(self.model, index).forward_sql(state, schema_manager)
+        return AddIndex(self.model, index, concurrently=self.concurrently).forward_sql(
+            state, schema_manager
+        )
 
     def to_migration(self) -> str:
         """Generate Python code to drop an index in a migration."""
@@ -42,5 +55,7 @@ class DropIndex(Operation):
         lines.append("DropIndex(")
         lines.append(f'    model="{self.model}",')
         lines.append(f'    index_name="{self.index_name}",')
+        if self.concurrently:
+            lines.append("    concurrently=True,")
         lines.append(")")
         return "\n".join(lines)
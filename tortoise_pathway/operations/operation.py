@@ -7,7 +7,7 @@ from typing import TYPE_CHECKING
 
 from tortoise import connections
 
-from tortoise_pathway.schema import get_schema_manager
+from tortoise_pathway.schema import execute_script, get_schema_manager, split_statements
 from tortoise_pathway.schema.base import BaseSchemaManager
 
 if TYPE_CHECKING:
@@ -23,6 +23,8 @@ class Operation:
 
     app_name: str
     model_name: str | None
+    # whether the SQL of the operation can run in a transaction
+    atomic: bool = True
 
     def __init__(
         self,
@@ -108,9 +110,23 @@ class Operation:
             connection_name: The database connection name to use.
         """
         connection = connections.get(connection_name)
+        if not self.atomic:
+            await self.prepare(state, connection)
         schema_manager = get_schema_manager(connection)
         sql = self.forward_sql(state=state, schema_manager=schema_manager)
-        await connection.execute_script(sql)
+        await self._execute(connection, sql)
+
+    async def prepare(self, state: "State", connection) -> None:
+        """
+        Prepare the database before the SQL of a non-atomic operation is applied.
+
+        A non-atomic operation that fails isn't rolled back, so it may leave changes behind
+        that prevent applying it again, e.g. an invalid index. Subclasses clean them up here.
+
+        Args:
+            state: State object that contains schema information.
+            connection: The database connection to use.
+        """
 
     async def revert(self, state: "State", connection_name: str = "default") -> None:
         """
@@ -123,7 +139,17 @@ class Operation:
         connection = connections.get(connection_name)
         schema_manager = get_schema_manager(connection)
         sql = self.backward_sql(state=state, schema_manager=schema_manager)
-        await connection.execute_script(sql)
+        await self._execute(connection, sql)
+
+    async def _execute(self, connection, sql: str) -> None:
+        if self.atomic:
+            await execute_script(connection, sql)
+            return
+
+        # PostgreSQL runs a script in a transaction of its own, the statements of a
+        # non-atomic operation run one by one so that each of them is committed by itself
+        for statement in split_statements(sql):
+            await execute_script(connection, statement)
 
     def forward_sql(self, state: "State", schema_manager: BaseSchemaManager) -> str:
         """
@@ -0,0 +1,305 @@
+"""
+Optimizer of operation lists.
+
+The optimizer rewrites a list of operations into a shorter list that leads to the same
+schema, e.g. fields added to a model after it was created are folded into its CreateModel,
+consecutive changes of a field are coalesced into one, and a model or a field that is created
+and dropped again is not created at all.
+
+It works by reducing pairs of operations: for every operation, the following operations are
+scanned for one that can be combined with it. An operation can only be combined with an
+earlier one if it doesn't depend on any operation in between, i.e. they don't touch the same
+model, or the same fields of a model. A foreign key only needs the model it refers to, so the
+fields of that model can change around it, but the model can't be created, dropped or renamed.
+RunSQL operations are never reordered. Indexes stay separate operations, CreateModel only
+creates the table.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from tortoise.fields import Field
+from tortoise.fields.relational import ManyToManyFieldInstance, RelationalField
+
+from tortoise_pathway.field_ext import FieldSpec
+from tortoise_pathway.operations import (
+    AddField,
+    AddIndex,
+    AlterField,
+    BackfillField,
+    CreateModel,
+    DropField,
+    DropIndex,
+    DropModel,
+    Operation,
+    RenameField,
+    RenameModel,
+    RunSQL,
+)
+
+Reducer = Callable[[Operation, Operation], Optional[List[Operation]]]
+
+_reducers: Dict[Tuple[Type[Operation], Type[Operation]], Reducer] = {}
+
+
+def reducer(first: Type[Operation], second: Type[Operation]) -> Callable[[Reducer], Reducer]:
+    """
+    Register a function that combines two operations on the same model.
+
+    The function returns the operations that replace both, or None if they can't be combined.
+    The replacement is placed where the first operation was.
+    """
+
+    def decorator(func: Reducer) -> Reducer:
+        _reducers[(first, second)] = func
+        return func
+
+    return decorator
+
+
+def optimize_operations(operations: List[Operation]) -> List[Operation]:
+    """
+    Rewrite the operations into an equivalent list with fewer operations.
+
+    The operations are not modified, combined operations are new objects.
+    """
+    operations = list(operations)
+    while True:
+        reduced = _reduce_once(operations)
+        if reduced is None:
+            return operations
+        operations = reduced
+
+
+def _reduce_once(operations: List[Operation]) -> Optional[List[Operation]]:
+    for i, first in enumerate(operations):
+        for j in range(i + 1, len(operations)):
+            second = operations[j]
+            between = operations[i + 1 : j]
+
+            reduce = _reducers.get((type(first), type(second)))
+            replacement = None
+            if reduce is not None and first.model == second.model:
+                replacement = reduce(first, second)
+
+            if replacement is not None:
+                # the second operation moves to the first one, past the ones in between
+                movable = all(_independent(op, second) for op in between)
+                if not replacement:
+                    # both disappear, nothing in between may depend on the first one either
+                    movable = movable and all(_independent(op, first) for op in between)
+                if movable:
+                    return operations[:i] + replacement + between + operations[j + 1 :]
+    return None
+
+
+def _independent(a: Operation, b: Operation) -> bool:
+    """Whether the order of the two operations doesn't matter."""
+    if isinstance(a, RunSQL) or isinstance(b, RunSQL):
+        return False
+
+    # a foreign key needs the model it refers to, whatever its fields are
+    if _references(a) & _existence(b) or _references(b) & _existence(a):
+        return False
+
+    shared = _models(a) & _models(b)
+    if not shared:
+        return True
+
+    # operations on different fields of the same model
+    fields_a, fields_b = _fields(a), _fields(b)
+    return (
+        fields_a is not None
+        and fields_b is not None
+        and shared == {a.model} == {b.model}
+        and not fields_a & fields_b
+    )
+
+
+def _models(operation: Operation) -> set[str]:
+    """The models the operation changes."""
+    models = {operation.model}
+    if isinstance(operation, RenameModel) and operation.new_model_name:
+        models.add(f"{operation.app_name}.{operation.new_model_name}")
+    # M2M fields add the reverse relation to the model they refer to
+    models.update(field.model_name for field in _relational_fields(operation) if _is_m2m(field))
+    return models
+
+
+def _references(operation: Operation) -> set[str]:
+    """The models the foreign keys of the operation refer to."""
+    models = {field.model_name for field in _relational_fields(operation) if not _is_m2m(field)}
+    return models - {operation.model}
+
+
+def _existence(operation: Operation) -> set[str]:
+    """The models the operation creates, drops or renames."""
+    if isinstance(operation, (CreateModel, DropModel, RenameModel)):
+        return _models(operation)
+    return set()
+
+
+def _relational_fields(operation: Operation) -> List[RelationalField]:
+    fields: List[Field] = []
+    if isinstance(operation, CreateModel):
+        fields = list(operation.fields.values())
+    elif isinstance(operation, (AddField, AlterField)):
+        fields = [operation.field_object]
+    return [field for field in fields if isinstance(field, RelationalField)]
+
+
+def _fields(operation: Operation) -> Optional[set[str]]:
+    """The fields of its model the operation touches, or None if it touches the model."""
+    if isinstance(operation, (AddField, AlterField, DropField)):
+        return {operation.field_name}
+    if isinstance(operation, RenameField):
+        return {operation.field_name, operation.new_field_name or operation.field_name}
+    if isinstance(operation, AddIndex):
+        return set(operation.fields)
+    return None
+
+
+def _is_m2m(field: Field) -> bool:
+    # M2M fields also change the referred model in the state, they are kept separate
+    return isinstance(field, ManyToManyFieldInstance)
+
+
+def _create_model(operation: CreateModel, fields: Dict[str, Field]) -> CreateModel:
+    return CreateModel(model=operation.model, table=operation.table, fields=fields)
+
+
+@reducer(CreateModel, AddField)
+def _create_model_add_field(first: CreateModel, second: AddField) -> Optional[List[Operation]]:
+    if _is_m2m(second.field_object):
+        return None
+    return [_create_model(first, {**first.fields, second.field_name: second.field_object})]
+
+
+@reducer(CreateModel, BackfillField)
+def _create_model_backfill_field(
+    first: CreateModel, second: BackfillField
+) -> Optional[List[Operation]]:
+    # a new table has no rows to backfill, the field keeps the default like in the state
+    field = second.field_object
+    if second.default is not None:
+        field = FieldSpec.from_field(field).replace(default=second.default).to_field()
+    return [_create_model(first, {**first.fields, second.field_name: field})]
+
+
+@reducer(CreateModel, AlterField)
+def _create_model_alter_field(
+    first: CreateModel, second: AlterField
+) -> Optional[List[Operation]]:
+    field = first.fields.get(second.field_name)
+    if field is None or _is_m2m(field) or _is_m2m(second.field_object):
+        return None
+    return [_create_model(first, {**first.fields, second.field_name: second.field_object})]
+
+
+@reducer(CreateModel, DropField)
+def _create_model_drop_field(first: CreateModel, second: DropField) -> Optional[List[Operation]]:
+    field = first.fields.get(second.field_name)
+    if field is None or _is_m2m(field):
+        return None
+    fields = {name: field for name, field in first.fields.items() if name != second.field_name}
+    return [_create_model(first, fields)]
+
+
+@reducer(CreateModel, RenameField)
+def _create_model_rename_field(
+    first: CreateModel, second: RenameField
+) -> Optional[List[Operation]]:
+    field = first.fields.get(second.field_name)
+    if field is None or _is_m2m(field):
+        return None
+    if second.new_column_name:
+        field = FieldSpec.from_field(field).replace(source_field=second.new_column_name).to_field()
+    new_name = second.new_field_name or second.field_name
+    fields = {
+        (new_name if name == second.field_name else name): (
+            field if name == second.field_name else value
+        )
+        for name, value in first.fields.items()
+    }
+    return [_create_model(first, fields)]
+
+
+@reducer(CreateModel, RenameModel)
+def _create_model_rename_model(
+    first: CreateModel, second: RenameModel
+) -> Optional[List[Operation]]:
+    model = first.model
+    if second.new_model_name:
+        model = f"{first.app_name}.{second.new_model_name}"
+    table = second.new_table_name or first.table
+    return [CreateModel(model=model, table=table, fields=first.fields)]
+
+
+@reducer(CreateModel, DropModel)
+def _create_model_drop_model(first: CreateModel, second: DropModel) -> Optional[List[Operation]]:
+    return []
+
+
+@reducer(AddField, AlterField)
+def _add_field_alter_field(first: AddField, second: AlterField) -> Optional[List[Operation]]:
+    if first.field_name != second.field_name or _is_m2m(first.field_object):
+        return None
+    return [AddField(first.model, second.field_object, first.field_name, online=first.online)]
+
+
+@reducer(BackfillField, DropField)
+@reducer(AddField, DropField)
+def _add_field_drop_field(first: AddField, second: DropField) -> Optional[List[Operation]]:
+    if first.field_name != second.field_name or _is_m2m(first.field_object):
+        return None
+    return []
+
+
+@reducer(AddField, RenameField)
+def _add_field_rename_field(first: AddField, second: RenameField) -> Optional[List[Operation]]:
+    if first.field_name != second.field_name or _is_m2m(first.field_object):
+        return None
+    field = first.field_object
+    if second.new_column_name:
+        field = FieldSpec.from_field(field).replace(source_field=second.new_column_name).to_field()
+    field_name = second.new_field_name or first.field_name
+    return [AddField(first.model, field, field_name, online=first.online)]
+
+
+@reducer(AlterField, AlterField)
+def _alter_field_alter_field(first: AlterField, second: AlterField) -> Optional[List[Operation]]:
+    if first.field_name != second.field_name:
+        return None
+    return [second]
+
+
+@reducer(AlterField, DropField)
+def _alter_field_drop_field(first: AlterField, second: DropField) -> Optional[List[Operation]]:
+    if first.field_name != second.field_name:
+        return None
+    return [second]
+
+
+@reducer(RenameField, DropField)
+def _rename_field_drop_field(first: RenameField, second: DropField) -> Optional[List[Operation]]:
+    if (first.new_field_name or first.field_name) != second.field_name:
+        return None
+    return [DropField(first.model, first.field_name)]
+
+
+@reducer(AddIndex, DropIndex)
+def _add_index_drop_index(first: AddIndex, second: DropIndex) -> Optional[List[Operation]]:
+    if first.index_name != second.index_name:
+        return None
+    return []
+
+
+# the columns and indexes of a model are dropped with its table
+@reducer(AddField, DropModel)
+@reducer(BackfillField, DropModel)
+@reducer(AlterField, DropModel)
+@reducer(RenameField, DropModel)
+@reducer(AddIndex, DropModel)
+def _drop_model(first: Operation, second: DropModel) -> Optional[List[Operation]]:
+    if isinstance(first, AddField) and _is_m2m(first.field_object):
+        return None
+    return [second]
@@ -1,4 +1,5 @@
 import importlib
+import re
 
 from tortoise import BaseDBAsyncClient
 
@@ -9,3 +10,69 @@ def get_schema_manager(connection: BaseDBAsyncClient) -> BaseSchemaManager:
     dialect = connection.capabilities.dialect
     module = importlib.import_module(f"tortoise_pathway.schema.{dialect}")
     return module.schema_manager
+
+
+async def execute_script(connection: BaseDBAsyncClient, sql: str) -> None:
+    """
+    Run SQL statements on the connection.
+
+    The SQLite driver commits the pending transaction before it runs a script, so on SQLite
+    the statements are run one by one to stay in the transaction of the connection.
+    """
+    if connection.capabilities.dialect != "sqlite":
+        await connection.execute_script(sql)
+        return
+
+    for statement in split_statements(sql):
+        await connection.execute_query(statement)
+
+
+_TOKENS = re.compile(
+    r"""
+    '(?:[^']|'')*'          # string literal
+    | "(?:[^"]|"")*"        # quoted identifier
+    | `[^`]*`               # MySQL quoted identifier
+    | --[^\n]*              # line comment
+    | /\*.*?\*/             # block comment
+    | (\$\w*\$).*?\1        # PostgreSQL dollar-quoted string
+    | ;
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+_TRIGGER_BLOCK = re.compile(
+    r"\s*CREATE\s+(TEMP\s+|TEMPORARY\s+)?TRIGGER\b.*\bBEGIN\b", re.DOTALL | re.IGNORECASE
+)
+_BLOCK_END = re.compile(r"\bEND\s*;$", re.IGNORECASE)
+
+
+def split_statements(sql: str) -> list[str]:
+    """
+    Split SQL into statements, for any dialect.
+
+    Semicolons in string literals, quoted identifiers, comments, PostgreSQL dollar-quoted
+    bodies and the BEGIN ... END blocks of SQLite triggers are kept in their statement.
+    """
+    statements = []
+    start = 0
+    for match in _TOKENS.finditer(sql):
+        if match.group() != ";":
+            continue
+        statement = sql[start : match.end()]
+        code = _code(statement)
+        if _TRIGGER_BLOCK.match(code) and not _BLOCK_END.search(code):
+            # the semicolon ends a statement in the body of the trigger
+            continue
+        statements.append(statement)
+        start = match.end()
+    statements.append(sql[start:])
+    return [statement.strip() for statement in statements if _has_code(statement)]
+
+
+def _code(statement: str) -> str:
+    """The statement without its comments and literals."""
+    return _TOKENS.sub(lambda match: match.group() if match.group() == ";" else " ", statement)
+
+
+def _has_code(statement: str) -> bool:
+    code = "".join(line.split("--", 1)[0] for line in statement.splitlines())
+    return bool(code.strip(" \t\r\n;"))
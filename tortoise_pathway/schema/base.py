@@ -1,3 +1,4 @@
+import datetime
 from hashlib import sha256
 from typing import Any
 from tortoise.fields import Field, IntField
@@ -72,7 +73,12 @@ class BaseSchemaManager:
         return f"ALTER TABLE {table_name} DROP COLUMN {column_name}"
 
     def alter_column(
-        self, table_name: str, column_name: str, prev_field: Field, new_field: Field
+        self,
+        table_name: str,
+        column_name: str,
+        prev_field: Field,
+        new_field: Field,
+        online: bool = False,
     ) -> str:
         statements = []
         # Get SQL type using the get_for_dialect method
@@ -100,9 +106,7 @@ class BaseSchemaManager:
                     f"ALTER TABLE {table_name} ALTER COLUMN {column_name} DROP NOT NULL;"
                 )
             else:
-                statements.append(
-                    f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL;"
-                )
+                statements.extend(self._set_not_null(table_name, column_name, online))
 
         # Default value change
         if prev_field.default != new_field.default:
@@ -139,7 +143,13 @@ class BaseSchemaManager:
         return f"ALTER TABLE {table_name} RENAME COLUMN {column_name} TO {new_column_name}"
 
     def add_foreign_key_column(
-        self, table_name: str, column_name: str, related_table: str, to_column: str, null: bool
+        self,
+        table_name: str,
+        column_name: str,
+        related_table: str,
+        to_column: str,
+        null: bool,
+        online: bool = False,
     ) -> str:
         sql = f"ALTER TABLE {table_name} ADD COLUMN {column_name} INT"
         if not null:
@@ -164,16 +174,30 @@ class BaseSchemaManager:
         columns: list[str],
         unique: bool = False,
         index_type: str | None = None,
+        concurrently: bool = False,
     ) -> str:
         unique_prefix = "UNIQUE " if unique else ""
         columns_str = ", ".join(columns)
         index_type_str = f"USING {index_type}" if index_type else ""
-        return f"CREATE {unique_prefix}INDEX {index_name} ON {table_name} ({columns_str}) {index_type_str}".strip()
+        concurrently_str = self._concurrently(concurrently)
+        return f"CREATE {unique_prefix}INDEX {concurrently_str}{index_name} ON {table_name} ({columns_str}) {index_type_str}".strip()
 
-    def drop_index(self, index_name: str) -> str:
+    def drop_index(self, index_name: str, concurrently: bool = False) -> str:
         """Generate SQL for dropping an index."""
+        concurrently_str = self._concurrently(concurrently)
+        if concurrently_str:
+            # a retry may find the index already dropped
+            return f"DROP INDEX {concurrently_str}IF EXISTS {index_name}"
         return f"DROP INDEX {index_name}"
 
+    def _set_not_null(self, table_name: str, column_name: str, online: bool) -> list[str]:
+        # databases that can't validate constraints separately always check the rows here
+        return [f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL;"]
+
+    def _concurrently(self, concurrently: bool) -> str:
+        # databases that can't build indexes without locking the table build them normally
+        return ""
+
     def _field_definition_to_sql(self, field: Field) -> str:
         # TODO: subclasses should override this method
         nullable = getattr(field, "null", False)
@@ -240,6 +264,12 @@ class BaseSchemaManager:
 
         return encoders.get(type(default))(default)
 
+    def timestamp_parameter(self, value: datetime.datetime) -> Any:
+        """
+        Convert a timestamp to a query parameter for a TIMESTAMP column.
+        """
+        return value
+
     def _default_pk_type(self):
         return "INT"
 
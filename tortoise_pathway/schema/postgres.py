@@ -2,11 +2,63 @@ from tortoise_pathway.schema.base import BaseSchemaManager
 
 
 class PostgresSchemaManager(BaseSchemaManager):
+    """
+    Schema manager for PostgreSQL.
+
+    With `online` set, NOT NULL and foreign key constraints are added without checking the
+    rows under an ACCESS EXCLUSIVE lock: the constraint is added as NOT VALID, which only
+    locks the table briefly, and validated by a separate statement, which doesn't block
+    writes. The statements only hold their locks briefly outside of a transaction, and they
+    are written so that they can run again after a failure.
+    """
+
     def __init__(self):
         super().__init__("postgres")
 
+    def add_foreign_key_column(
+        self,
+        table_name: str,
+        column_name: str,
+        related_table: str,
+        to_column: str,
+        null: bool,
+        online: bool = False,
+    ) -> str:
+        if not online:
+            return super().add_foreign_key_column(
+                table_name, column_name, related_table, to_column, null
+            )
+
+        constraint = f"fk_{table_name}_{column_name}"
+        not_null = "" if null else " NOT NULL"
+        return (
+            f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column_name} INT{not_null};\n"
+            f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint};\n"
+            f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint} "
+            f"FOREIGN KEY ({column_name}) REFERENCES {related_table}({to_column}) NOT VALID;\n"
+            f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {constraint};"
+        )
+
     def _default_pk_type(self):
         return "SERIAL"
 
+    def _set_not_null(self, table_name: str, column_name: str, online: bool) -> list[str]:
+        if not online:
+            return super()._set_not_null(table_name, column_name, online)
+
+        # SET NOT NULL skips the scan of the table when a valid check proves the same
+        constraint = f"{table_name}_{column_name}_not_null"
+        return [
+            f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint};",
+            f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint} "
+            f"CHECK ({column_name} IS NOT NULL) NOT VALID;",
+            f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {constraint};",
+            f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL;",
+            f"ALTER TABLE {table_name} DROP CONSTRAINT {constraint};",
+        ]
+
+    def _concurrently(self, concurrently: bool) -> str:
+        return "CONCURRENTLY " if concurrently else ""
+
 
 schema_manager = PostgresSchemaManager()
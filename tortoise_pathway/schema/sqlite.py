@@ -1,3 +1,5 @@
+import datetime
+
 from tortoise.fields import Field, IntField
 
 from tortoise_pathway.schema.base import BaseSchemaManager
@@ -8,7 +10,13 @@ class SqliteSchemaManager(BaseSchemaManager):
         super().__init__("sqlite")
 
     def add_foreign_key_column(
-        self, table_name: str, column_name: str, related_table: str, to_column: str, null: bool
+        self,
+        table_name: str,
+        column_name: str,
+        related_table: str,
+        to_column: str,
+        null: bool,
+        online: bool = False,
     ) -> str:
         sql = f"ALTER TABLE {table_name} ADD COLUMN {column_name} INT"
 
@@ -24,9 +32,15 @@ class SqliteSchemaManager(BaseSchemaManager):
         column_name: str,
         prev_field: Field,
         new_field: Field,
+        online: bool = False,
     ) -> str:
         raise NotImplementedError("ALTER COLUMN is not supported in SQLite")
 
+    def timestamp_parameter(self, value: datetime.datetime) -> str:
+        # SQLite stores the timestamps as text, they have to sort like the ISO strings
+        # that were recorded before
+        return value.isoformat()
+
     def _default_pk_type(self):
         return "INTEGER"
 
@@ -10,10 +10,17 @@ from graphlib import CycleError, TopologicalSorter
 from typing import cast, List, Optional, Set, Tuple
 
 from tortoise import Tortoise
-from tortoise.fields.relational import ForeignKeyFieldInstance, ManyToManyFieldInstance
+from tortoise.fields import Field
+from tortoise.fields.relational import (
+    ForeignKeyFieldInstance,
+    ManyToManyFieldInstance,
+    RelationalField,
+)
 from tortoise.models import Model
 from tortoise.indexes import Index
 
+from tortoise_pathway.field_ext import FieldSpec
+from tortoise_pathway.fingerprint import hash_model, hash_tree
 from tortoise_pathway.index_ext import gen_index_name, UniqueIndex
 from tortoise_pathway.state import ModelSchema, Schema, State
 from tortoise_pathway.operations import (
@@ -25,13 +32,20 @@ from tortoise_pathway.operations import (
     AlterField,
     AddIndex,
     DropIndex,
+    BackfillField,
 )
+from tortoise_pathway.operations.backfill_field import check_default_importable
 
 
 class SchemaDiffer:
     """Detects differences between Tortoise models and database schema."""
 
-    def __init__(self, state: Optional[State] = None, connection=None):
+    def __init__(
+        self,
+        state: Optional[State] = None,
+        connection=None,
+        concurrent_indexes: bool = False,
+    ):
         """
         Initialize a schema differ for a specific app.
 
@@ -39,10 +53,15 @@ class SchemaDiffer:
             app_name: Name of the app to detect schema changes for
             state: Optional State object containing current state
             connection: Optional database connection
+            concurrent_indexes: Whether indexes of existing tables are added and dropped
+                concurrently, see `AddIndex`. Indexes of new tables are built normally.
         """
         self.connection = connection
+        self.concurrent_indexes = concurrent_indexes
         self.state = state or State()
         self._changes: list[Operation] = []
+        # models that have the same fingerprint in the state and in the Tortoise models
+        self._identical_models: set[tuple[str, str]] = set()
 
     def get_model_schema(self) -> Schema:
         """Get schema representation from Tortoise models for this app."""
@@ -62,7 +81,7 @@ class SchemaDiffer:
                 model_schema[model_name] = {
                     "table": table_name,
                     "fields": {},
-                    "indexes": [],
+                    "indexes": {},
                 }
 
                 # Get fields
@@ -89,15 +108,14 @@ class SchemaDiffer:
                                 index.name = gen_index_name(
                                     "idx", model._meta.db_table, index.fields
                                 )
-                            model_schema[model_name]["indexes"].append(index)
+                            model_schema[model_name]["indexes"][index.name] = index
                         elif isinstance(index, (list, tuple)):
-                            model_schema[model_name]["indexes"].append(
-                                Index(
-                                    fields=index,
-                                    name=gen_index_name(
-                                        "idx", model._meta.db_table, index
-                                    ),
-                                )
+                            index_name = gen_index_name(
+                                "idx", model._meta.db_table, index
+                            )
+                            model_schema[model_name]["indexes"][index_name] = Index(
+                                fields=index,
+                                name=index_name,
                             )
                         else:
                             raise ValueError(
@@ -107,13 +125,12 @@ class SchemaDiffer:
                 # Get unique constraints
                 if hasattr(model._meta, "unique_together"):
                     for unique_fields in model._meta.unique_together:
-                        model_schema[model_name]["indexes"].append(
-                            UniqueIndex(
-                                fields=unique_fields,
-                                name=gen_index_name(
-                                    "uniq", model._meta.db_table, unique_fields
-                                ),
-                            )
+                        index_name = gen_index_name(
+                            "uniq", model._meta.db_table, unique_fields
+                        )
+                        model_schema[model_name]["indexes"][index_name] = UniqueIndex(
+                            fields=unique_fields,
+                            name=index_name,
                         )
 
         return schema
@@ -212,7 +229,7 @@ class SchemaDiffer:
             )
 
             # Add separate AddIndex operations for each index
-            for index in model_info["indexes"]:
+            for index in model_info["indexes"].values():
                 self._changes.append(
                     AddIndex(
                         model=model_ref,
@@ -284,6 +301,8 @@ class SchemaDiffer:
         old_schema_models = SchemaDiffer._get_schema_app_model_pairs(current_schema)
         new_schema_models = SchemaDiffer._get_schema_app_model_pairs(model_schema)
         models_unchanged = old_schema_models & new_schema_models
+        # identical models have no field or index changes
+        models_unchanged -= self._identical_models
 
         # For tables that exist in both
         for app_name, model_name in sorted(models_unchanged):
@@ -313,6 +332,20 @@ class SchemaDiffer:
                     ):
                         continue
 
+                if _needs_backfill(field_obj):
+                    # the rows of the table need a value that only Python can compute,
+                    # which the migration imports, checked before any file is written
+                    check_default_importable(model_ref, field_name, field_obj.default)
+                    self._changes.append(
+                        BackfillField(
+                            model=model_ref,
+                            field_object=field_obj,
+                            field_name=field_name,
+                            default=field_obj.default,
+                        )
+                    )
+                    continue
+
                 self._changes.append(
                     AddField(
                         model=model_ref,
@@ -353,6 +386,8 @@ class SchemaDiffer:
         old_schema_models = SchemaDiffer._get_schema_app_model_pairs(current_schema)
         new_schema_models = SchemaDiffer._get_schema_app_model_pairs(model_schema)
         models_unchanged = old_schema_models & new_schema_models
+        # identical models have no field or index changes
+        models_unchanged -= self._identical_models
 
         for app_name, model_name in sorted(models_unchanged):
             model_ref = f"{app_name}.{model_name}"
@@ -360,13 +395,9 @@ class SchemaDiffer:
             current_model = current_schema[app_name]["models"][model_name]
             model_model = model_schema[app_name]["models"][model_name]
 
-            # Get indexes from both current schema and model schema
-            current_indexes = current_model.get("indexes", [])
-            model_indexes = model_model.get("indexes", [])
-
-            # Create maps of index names for easier comparison
-            current_index_map = {idx.name: idx for idx in current_indexes}
-            model_index_map = {idx.name: idx for idx in model_indexes}
+            # Get indexes by name from both current schema and model schema
+            current_index_map = current_model.get("indexes", {})
+            model_index_map = model_model.get("indexes", {})
 
             # Indexes to add (in model but not in current schema)
             for index_name in sorted(
@@ -377,6 +408,7 @@ class SchemaDiffer:
                     AddIndex(
                         model=model_ref,
                         index=index,
+                        concurrently=self.concurrent_indexes,
                     )
                 )
 
@@ -388,6 +420,7 @@ class SchemaDiffer:
                     DropIndex(
                         model=model_ref,
                         index_name=index_name,
+                        concurrently=self.concurrent_indexes,
                     )
                 )
 
@@ -409,6 +442,7 @@ class SchemaDiffer:
                         DropIndex(
                             model=model_ref,
                             index_name=index_name,
+                            concurrently=self.concurrent_indexes,
                         )
                     )
 
@@ -417,6 +451,7 @@ class SchemaDiffer:
                         AddIndex(
                             model=model_ref,
                             index=model_index,
+                            concurrently=self.concurrent_indexes,
                         )
                     )
 
@@ -431,6 +466,32 @@ class SchemaDiffer:
         current_schema = self.state.get_schema()
         model_schema = self.get_model_schema()
 
+        model_fingerprints = {
+            app_name: {
+                model_name: hash_model(model)
+                for model_name, model in app_schema["models"].items()
+            }
+            for app_name, app_schema in model_schema.items()
+        }
+        # a single comparison when nothing changed
+        schema_fingerprint = hash_tree(
+            {
+                app_name: hash_tree(models)
+                for app_name, models in model_fingerprints.items()
+                if models
+            }
+        )
+        if schema_fingerprint == self.state.fingerprint():
+            return self._changes
+
+        self._identical_models = {
+            (app_name, model_name)
+            for app_name, model_name in self._get_schema_app_model_pairs(current_schema)
+            & self._get_schema_app_model_pairs(model_schema)
+            if self.state.model_fingerprint(app_name, model_name)
+            == model_fingerprints[app_name][model_name]
+        }
+
         # Collect changes from each detection method
         await self._detect_create_models(current_schema, model_schema)
         await self._detect_drop_models(current_schema, model_schema)
@@ -475,17 +536,22 @@ class SchemaDiffer:
 
     def _are_fields_different(self, field1, field2) -> bool:
         """
-        Compare two Field objects to determine if they are effectively different.
+        Compare two fields to determine if they are effectively different.
 
         Args:
-            field1: First Field object
-            field2: Second Field object
+            field1: First Field object or FieldSpec
+            field2: Second Field object or FieldSpec
 
         Returns:
             True if the fields are different (require migration), False otherwise
         """
+        field1 = FieldSpec.from_field(field1)
+        field2 = FieldSpec.from_field(field2)
+        if field1 == field2:
+            return False
+
         # Check if they're the same class type
-        if field1.__class__.__name__ != field2.__class__.__name__:
+        if field1.field_class.__name__ != field2.field_class.__name__:
             return True
 
         # Check key field attributes that would require a migration
@@ -559,3 +625,13 @@ class SchemaDiffer:
                 return True
 
         return False
+
+
+def _needs_backfill(field: Field) -> bool:
+    """Whether a new NOT NULL field has a callable default, which the database can't apply."""
+    return (
+        not field.null
+        and callable(field.default)
+        and not field.pk
+        and not isinstance(field, RelationalField)
+    )
@@ -0,0 +1,226 @@
+"""
+JSON serialization of schemas and states.
+
+The format is versioned and only describes the schema, not the migrations it was built from:
+
+    {
+        "version": 1,
+        "apps": {
+            "<app>": {
+                "models": {
+                    "<model>": {
+                        "table": "<table>",
+                        "fields": {"<field>": {"class": "<module:class>", "attrs": {...}}},
+                        "indexes": {
+                            "<index>": {"class": "<module:class>", "fields": [...], "attrs": {...}}
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+Classes are stored by their import path, "<module>:<qualified name>". Attribute values that
+JSON can't represent, e.g. enums, decimals, dicts or callable defaults, are stored as objects
+tagged with a key that starts with "__", e.g. {"__decimal__": "0.00"}.
+"""
+
+import datetime
+import importlib
+import json
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict
+
+from tortoise.indexes import Index
+
+from tortoise_pathway.field_ext import FieldSpec
+from tortoise_pathway.state import ModelSchema, Schema, State
+
+FORMAT_VERSION = 1
+
+
+def schema_to_dict(schema: Schema) -> Dict[str, Any]:
+    """
+    Convert a schema to a JSON-compatible dict.
+
+    Args:
+        schema: The schema. The fields can be Field objects or FieldSpecs.
+
+    Raises:
+        TypeError: If the schema has a value that can't be serialized.
+    """
+    return {
+        "version": FORMAT_VERSION,
+        "apps": {
+            app_name: {
+                "models": {
+                    model_name: _model_to_dict(model)
+                    for model_name, model in app["models"].items()
+                }
+            }
+            for app_name, app in schema.items()
+        },
+    }
+
+
+def schema_from_dict(data: Dict[str, Any]) -> Schema:
+    """
+    Convert a dict created by `schema_to_dict` back to a schema.
+
+    Raises:
+        ValueError: If the data has an unsupported format version.
+        ImportError: If a class referenced by the data can't be imported.
+    """
+    version = data.get("version")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported schema format version: {version}")
+
+    return {
+        app_name: {
+            "models": {
+                model_name: _model_from_dict(model)
+                for model_name, model in app["models"].items()
+            }
+        }
+        for app_name, app in data["apps"].items()
+    }
+
+
+def schema_to_json(schema: Schema, indent: int | None = None) -> str:
+    """Serialize a schema to JSON. The output is compact unless indent is given."""
+    separators = (",", ":") if indent is None else None
+    return json.dumps(
+        schema_to_dict(schema), indent=indent, separators=separators, sort_keys=True
+    )
+
+
+def schema_from_json(data: str) -> Schema:
+    """Deserialize a schema from JSON."""
+    return schema_from_dict(json.loads(data))
+
+
+def state_to_json(state: State, indent: int | None = None) -> str:
+    """Serialize the schema of a state to JSON. The snapshots of the state are not included."""
+    return schema_to_json(state.get_schema(), indent=indent)
+
+
+def state_from_json(data: str) -> State:
+    """Deserialize a state from JSON."""
+    return State(schema_from_json(data))
+
+
+def _model_to_dict(model: ModelSchema) -> Dict[str, Any]:
+    fields = {}
+    for field_name, field in model.get("fields", {}).items():
+        spec = FieldSpec.from_field(field)
+        fields[field_name] = {
+            "class": _import_path(spec.field_class),
+            "attrs": {
+                attr: _value_to_json(value) for attr, value in spec.as_dict().items()
+            },
+        }
+
+    indexes = {}
+    for index_name, index in model.get("indexes", {}).items():
+        if index.expressions:
+            raise TypeError(f"Index {index_name} with expressions can't be serialized")
+        indexes[index_name] = {
+            "class": _import_path(index.__class__),
+            "fields": list(index.fields),
+            # e.g. the WHERE clause of a partial PostgreSQLIndex
+            "attrs": {
+                attr: _value_to_json(value)
+                for attr, value in vars(index).items()
+                if attr not in ("fields", "name", "expressions")
+            },
+        }
+
+    return {"table": model["table"], "fields": fields, "indexes": indexes}
+
+
+def _model_from_dict(data: Dict[str, Any]) -> ModelSchema:
+    fields = {
+        field_name: FieldSpec(
+            _import(field["class"]),
+            {attr: _value_from_json(value) for attr, value in field["attrs"].items()},
+        )
+        for field_name, field in data["fields"].items()
+    }
+
+    indexes: Dict[str, Index] = {}
+    for index_name, index_data in data["indexes"].items():
+        index_class = _import(index_data["class"])
+        index = index_class(fields=index_data["fields"], name=index_name)
+        for attr, value in index_data.get("attrs", {}).items():
+            setattr(index, attr, _value_from_json(value))
+        indexes[index_name] = index
+
+    return {"table": data["table"], "fields": fields, "indexes": indexes}
+
+
+def _value_to_json(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return {"__enum__": _import_path(value.__class__), "name": value.name}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, type) or callable(value):
+        return {"__import__": _import_path(value)}
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"__time__": value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        items = [_value_to_json(item) for item in value]
+        return items if isinstance(value, list) else {"__tuple__": items}
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError(f"Dict {value!r} with non-string keys can't be serialized")
+        items = {key: _value_to_json(item) for key, item in value.items()}
+        return {"__dict__": items}
+    raise TypeError(f"Value {value!r} of type {type(value).__name__} can't be serialized")
+
+
+def _value_from_json(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_value_from_json(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    if "__enum__" in value:
+        return _import(value["__enum__"])[value["name"]]
+    if "__import__" in value:
+        return _import(value["__import__"])
+    if "__decimal__" in value:
+        return Decimal(value["__decimal__"])
+    if "__datetime__" in value:
+        return datetime.datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return datetime.date.fromisoformat(value["__date__"])
+    if "__time__" in value:
+        return datetime.time.fromisoformat(value["__time__"])
+    if "__tuple__" in value:
+        return tuple(_value_from_json(item) for item in value["__tuple__"])
+    if "__dict__" in value:
+        return {key: _value_from_json(item) for key, item in value["__dict__"].items()}
+    raise ValueError(f"Unknown value {value!r}")
+
+
+def _import_path(value: Any) -> str:
+    path = f"{value.__module__}:{value.__qualname__}"
+    # e.g. <lambda> or <locals>, which aren't attributes of the module
+    if "<" in path:
+        raise TypeError(f"{path} can't be imported, hence can't be serialized")
+    return path
+
+
+def _import(path: str) -> Any:
+    module_name, _, qualname = path.partition(":")
+    value = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        value = getattr(value, name)
+    return value
@@ -5,31 +5,35 @@ This module provides the State class that manages the state of the models based
 on applied migrations, rather than the actual database state.
 """
 
-import copy
-from typing import Dict, List, Tuple, TypedDict, cast
+import warnings
+from typing import Callable, Dict, List, Mapping, Tuple, Type, TypedDict, TypeVar, cast
 
 from tortoise.fields import Field
 from tortoise.fields.relational import ManyToManyFieldInstance
 from tortoise.indexes import Index
 
+from tortoise_pathway.field_ext import FieldSpec
+from tortoise_pathway.fingerprint import hash_model, hash_tree
 from tortoise_pathway.operations import (
     Operation,
     CreateModel,
     DropModel,
     RenameModel,
     AddField,
+    BackfillField,
     DropField,
     AlterField,
     RenameField,
     AddIndex,
     DropIndex,
+    RunSQL,
 )
 
 
 class ModelSchema(TypedDict):
     table: str
-    fields: Dict[str, Field]
-    indexes: List[Index]
+    fields: Dict[str, FieldSpec]
+    indexes: Dict[str, Index]
 
 
 class AppSchema(TypedDict):
@@ -38,6 +42,11 @@ class AppSchema(TypedDict):
 
 Schema = Dict[str, AppSchema]
 
+T = TypeVar("T")
+OperationT = TypeVar("OperationT", bound=Operation)
+
+OperationHandler = Callable[["State", OperationT], None]
+
 
 class State:
     """
@@ -47,19 +56,112 @@ class State:
     the migrations that have been applied, rather than querying the actual
     database schema directly.
 
+    Operations are applied to the state by the handlers registered with
+    `State.register_operation`. Operations without a handler don't change the state,
+    with a warning.
+
     Attributes:
         schema: Dictionary mapping model names to their schema representations.
+        checkpoint_interval: The number of snapshots between two full checkpoints.
     """
 
+    checkpoint_interval: int = 50
+
+    _handlers: Dict[Type[Operation], OperationHandler] = {}
+    # handlers resolved for concrete operation classes, including the inherited ones
+    _resolved_handlers: Dict[Type[Operation], OperationHandler] = {}
+
     def __init__(self, schema: Schema | None = None):
         """
         Initialize an empty state.
 
         Args:
-            schema: The tortoise configuration.
+            schema: The tortoise configuration. Field objects in it are replaced by their
+                FieldSpecs.
         """
         self._schema: Schema = schema or {}
-        self._snapshots: List[Tuple[str, State]] = []
+        for app in self._schema.values():
+            for model in app["models"].values():
+                if "fields" in model:
+                    model["fields"] = _field_specs(model["fields"])
+                if isinstance(model.get("indexes"), list):
+                    model["indexes"] = {index.name: index for index in model["indexes"]}
+
+        # Snapshots are stored as a journal of the operations applied between them. Every
+        # checkpoint_interval snapshots, the full state is kept as a checkpoint, so that any
+        # historical state can be rebuilt by replaying a bounded number of migrations.
+        self._journal: List[Tuple[str, List[Operation]]] = []
+        self._checkpoints: Dict[int, State] = {}
+        self._operations: List[Operation] = []
+        self._rewound: Tuple[int, State] | None = None
+        self._applying = False
+
+        # Containers of the schema that are referenced by this state only, and hence can be
+        # modified in place. All other containers are shared with snapshots and copies of the
+        # state, so they are copied before being modified. Owning an app implies owning its
+        # models dict, owning a model implies owning its fields and indexes dicts.
+        # The containers are kept as values, so that their ids cannot be reused.
+        self._owned: Dict[int, object] = {}
+
+        # Fingerprints of the models by the ids of their containers, shared with the copies
+        # of the state. The containers are kept as values, like in _owned.
+        self._fingerprints: Dict[int, Tuple[ModelSchema, str]] = {}
+
+        if self._schema:
+            # the initial schema is where the journal starts from
+            self._checkpoints[0] = self._checkpoint()
+        else:
+            self._own(self._schema)
+
+    @classmethod
+    def register_operation(
+        cls,
+        operation_class: Type[OperationT],
+        handler: OperationHandler[OperationT] | None = None,
+    ):
+        """
+        Register the handler that applies operations of the given class to the state.
+
+        The handler is also used for the subclasses of the operation class that don't have
+        a handler of their own. A handler usually describes the effect of a custom operation
+        by applying the built-in operations with `state.apply_operation`. Can be used as a
+        decorator.
+
+        Args:
+            operation_class: The operation class.
+            handler: A function that takes the state and the operation.
+        """
+
+        def register(
+            handler: OperationHandler[OperationT],
+        ) -> OperationHandler[OperationT]:
+            cls._handlers[operation_class] = handler
+            cls._resolved_handlers.clear()
+            return handler
+
+        if handler is None:
+            return register
+        return register(handler)
+
+    @classmethod
+    def _get_handler(cls, operation_class: Type[Operation]) -> OperationHandler:
+        handler = cls._resolved_handlers.get(operation_class)
+        if handler is None:
+            for klass in operation_class.__mro__:
+                if klass in cls._handlers:
+                    handler = cls._handlers[klass]
+                    break
+            else:
+                # e.g. a custom operation of a migration written before handlers existed
+                warnings.warn(
+                    f"No state handler registered for {operation_class.__name__}, "
+                    "it doesn't change the state. Use State.register_operation "
+                    "to register one",
+                    stacklevel=3,
+                )
+                handler = _apply_unknown_operation
+            cls._resolved_handlers[operation_class] = handler
+        return handler
 
     def apply_operation(self, operation: Operation) -> None:
         """
@@ -68,26 +170,18 @@ class State:
         Args:
             operation: The Operation object to apply.
         """
-
-        # Handle each type of operation
-        if isinstance(operation, CreateModel):
-            self._apply_create_model(operation)
-        elif isinstance(operation, DropModel):
-            self._apply_drop_model(operation)
-        elif isinstance(operation, RenameModel):
-            self._apply_rename_model(operation)
-        elif isinstance(operation, AddField):
-            self._apply_add_field(operation)
-        elif isinstance(operation, DropField):
-            self._apply_drop_field(operation)
-        elif isinstance(operation, AlterField):
-            self._apply_alter_field(operation)
-        elif isinstance(operation, RenameField):
-            self._apply_rename_field(operation)
-        elif isinstance(operation, AddIndex):
-            self._apply_add_index(operation)
-        elif isinstance(operation, DropIndex):
-            self._apply_drop_index(operation)
+        handler = self._get_handler(operation.__class__)
+        if self._applying:
+            # applied by the handler of another operation, which is the one journaled
+            handler(self, operation)
+            return
+
+        self._operations.append(operation)
+        self._applying = True
+        try:
+            handler(self, operation)
+        finally:
+            self._applying = False
 
     def snapshot(self, name: str) -> None:
         """
@@ -96,54 +190,154 @@ class State:
         Args:
             name: The name of the snapshot.
         """
-        self._snapshots.append((name, self.copy()))
+        self._journal.append((name, self._operations))
+        self._operations = []
+        if len(self._journal) % self.checkpoint_interval == 0:
+            self._checkpoints[len(self._journal)] = self._checkpoint()
 
     def prev(self) -> "State":
         """
         Get the previous state.
         """
-        if len(self._snapshots) == 1:
+        if len(self._journal) <= 1:
             return State()
-        _, state = self._snapshots[-2]
-        return state
+        return self.rewind(len(self._journal) - 1)
+
+    def rewind(self, count: int) -> "State":
+        """
+        Get the state as it was right after the first `count` snapshots were taken.
+
+        The state is rebuilt from the nearest checkpoint by replaying the journal.
+
+        Args:
+            count: The number of snapshots to keep.
+        """
+        if count == len(self._journal) and not self._operations:
+            return self.copy()
+
+        # the same historical state is usually requested by every operation of a migration
+        if self._rewound is None or self._rewound[0] != count:
+            checkpoint = max((c for c in self._checkpoints if c <= count), default=0)
+            if checkpoint in self._checkpoints:
+                state = self._checkpoints[checkpoint].copy()
+            else:
+                state = State()
+            state.checkpoint_interval = self.checkpoint_interval
+            for _, operations in self._journal[checkpoint:count]:
+                for operation in operations:
+                    state.apply_operation(operation)
+
+            state._journal = self._journal[:count]
+            state._checkpoints = {
+                c: s for c, s in self._checkpoints.items() if c <= count
+            }
+            state._operations = []
+            self._rewound = (count, state)
+
+        return self._rewound[1].copy()
 
     def copy(self) -> "State":
         """
         Copy the state.
+
+        The copy shares the schema with this state. Apps and models are copied lazily,
+        when either of the states modifies them.
         """
-        return copy.deepcopy(self)
+        state = self._checkpoint()
+        state._journal = list(self._journal)
+        state._checkpoints = dict(self._checkpoints)
+        state._operations = list(self._operations)
+        return state
+
+    def _checkpoint(self) -> "State":
+        """Copy the schema of the state without the snapshots."""
+        state = State()
+        state.checkpoint_interval = self.checkpoint_interval
+        state._schema = self._schema
+        state._owned = {}
+        state._fingerprints = self._fingerprints
+        # the schema is shared from now on, so this state must not modify it in place either
+        self._owned = {}
+        return state
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # ids are meaningless for the unpickled or deep-copied containers
+        state["_owned"] = {}
+        state["_fingerprints"] = {}
+        state["_rewound"] = None
+        return state
+
+    def _own(self, container: T) -> T:
+        self._owned[id(container)] = container
+        return container
+
+    def _get_app_models(self, app_name: str) -> Dict[str, ModelSchema]:
+        if app_name not in self._schema:
+            raise KeyError(f"App {app_name} not found in schema")
 
-    def _get_app_models(
+        return self._schema[app_name]["models"]
+
+    def _mutable_app_models(
         self, app_name: str, create: bool = False
     ) -> Dict[str, ModelSchema]:
+        """Get the models of the app, copying the shared containers on the way."""
+        if id(self._schema) not in self._owned:
+            self._schema = self._own(dict(self._schema))
+
         if app_name not in self._schema:
             if not create:
                 raise KeyError(f"App {app_name} not found in schema")
-            self._schema[app_name] = {"models": {}}
+            self._schema[app_name] = self._own({"models": {}})
 
-        return self._schema[app_name]["models"]
+        app = self._schema[app_name]
+        if id(app) not in self._owned:
+            app = self._own({"models": dict(app["models"])})
+            self._schema[app_name] = app
+
+        return app["models"]
+
+    def _mutable_model(self, app_name: str, model_name: str) -> ModelSchema:
+        """Get the model, copying the shared containers on the way."""
+        app_models = self._mutable_app_models(app_name)
+        if model_name not in app_models:
+            raise KeyError(f"Model {model_name} not found in app {app_name}")
+
+        model = app_models[model_name]
+        if id(model) not in self._owned:
+            model = cast(ModelSchema, dict(model))
+            model["fields"] = dict(model["fields"])
+            if "indexes" in model:
+                model["indexes"] = dict(model["indexes"])
+            app_models[model_name] = self._own(model)
+
+        # the model is about to be modified
+        self._fingerprints.pop(id(model), None)
+        return model
 
     def _apply_create_model(self, operation: CreateModel) -> None:
         """Apply a CreateModel operation to the state."""
         # Create a new model entry
-        app_models = self._get_app_models(operation.app_name, create=True)
-        app_models[operation.model_name] = {
-            "table": operation.table,
-            "fields": operation.fields.copy(),
-            "indexes": [],
-        }
+        app_models = self._mutable_app_models(operation.app_name, create=True)
+        app_models[operation.model_name] = self._own(
+            {
+                "table": operation.table,
+                "fields": _field_specs(operation.fields),
+                "indexes": {},
+            }
+        )
 
     def _apply_drop_model(self, operation: DropModel) -> None:
         """Apply a DropModel operation to the state."""
-        app_models = self._get_app_models(operation.app_name)
+        app_models = self._mutable_app_models(operation.app_name)
         # Remove the model if it exists
         if operation.model_name in app_models:
             del app_models[operation.model_name]
 
     def _apply_rename_model(self, operation: RenameModel) -> None:
         """Apply a RenameModel operation to the state."""
-        app_models = self._get_app_models(operation.app_name)
-        model = app_models[operation.model_name]
+        model = self._mutable_model(operation.app_name, operation.model_name)
+        app_models = self._mutable_app_models(operation.app_name)
 
         if operation.new_table_name:
             model["table"] = operation.new_table_name
@@ -158,8 +352,8 @@ class State:
         field_obj = operation.field_object
         field_name = operation.field_name
         # Add the field directly to the state
-        app_models = self._get_app_models(operation.app_name)
-        app_models[model_name]["fields"][field_name] = field_obj
+        model = self._mutable_model(operation.app_name, model_name)
+        model["fields"][field_name] = FieldSpec.from_field(field_obj)
 
         # m2m fields are bidirectional, so we need to add the field to the referred model
         if isinstance(field_obj, ManyToManyFieldInstance):
@@ -167,21 +361,33 @@ class State:
             referred_model_app, referred_model_name = Operation._split_model_reference(
                 m2m_field.model_name
             )
-            referred_app_models = self._get_app_models(referred_model_app)
-            referred_app_models[referred_model_name]["fields"][
-                m2m_field.related_name
-            ] = ManyToManyFieldInstance(
-                model_name=f"{operation.app_name}.{operation.model_name}",
-                through=m2m_field.through,
-                related_name=field_name,
-                on_delete=m2m_field.on_delete,
+            referred_model = self._mutable_model(
+                referred_model_app, referred_model_name
             )
+            referred_model["fields"][m2m_field.related_name] = FieldSpec.from_field(
+                ManyToManyFieldInstance(
+                    model_name=f"{operation.app_name}.{operation.model_name}",
+                    through=m2m_field.through,
+                    related_name=field_name,
+                    on_delete=m2m_field.on_delete,
+                )
+            )
+
+    def _apply_backfill_field(self, operation: BackfillField) -> None:
+        """Apply a BackfillField operation, the field keeps the default of the rows."""
+        field = FieldSpec.from_field(operation.field_object)
+        if operation.default is not None:
+            # callable defaults aren't written to the fields of migrations
+            field = field.replace(default=operation.default)
+        model = self._mutable_model(operation.app_name, operation.model_name)
+        model["fields"][operation.field_name] = field
 
     def _apply_drop_field(self, operation: DropField) -> None:
         """Apply a DropField operation to the state."""
         field_name = operation.field_name
 
-        model_fields = self.get_fields(operation.app_name, operation.model_name)
+        model = self._mutable_model(operation.app_name, operation.model_name)
+        model_fields = model["fields"]
 
         # Remove the field from the state
         if field_name in model_fields:
@@ -192,44 +398,77 @@ class State:
         field_name = operation.field_name
         field_obj = operation.field_object
 
-        model_fields = self.get_fields(operation.app_name, operation.model_name)
+        model = self._mutable_model(operation.app_name, operation.model_name)
+        model_fields = model["fields"]
 
         # Verify the field exists
         if field_name in model_fields:
             # Replace with the new field object
-            model_fields[field_name] = field_obj
+            model_fields[field_name] = FieldSpec.from_field(field_obj)
 
     def _apply_rename_field(self, operation: RenameField) -> None:
         """Apply a RenameField operation to the state."""
         old_field_name = operation.field_name
         new_field_name = operation.new_field_name
 
-        model_fields = self.get_fields(operation.app_name, operation.model_name)
+        model = self._mutable_model(operation.app_name, operation.model_name)
+        model_fields = model["fields"]
 
         field_obj = model_fields[old_field_name]
+        if operation.new_column_name:
+            field_obj = field_obj.replace(source_field=operation.new_column_name)
+            model_fields[old_field_name] = field_obj
         if new_field_name:
             model_fields[new_field_name] = field_obj
             del model_fields[old_field_name]
-        if operation.new_column_name:
-            field_obj.source_field = operation.new_column_name
 
     def _apply_add_index(self, operation: AddIndex) -> None:
         """Apply an AddIndex operation to the state."""
-        model = self.get_model(operation.app_name, operation.model_name)
-        model["indexes"].append(operation.index)
+        model = self._mutable_model(operation.app_name, operation.model_name)
+        model["indexes"][operation.index.name] = operation.index
 
     def _apply_drop_index(self, operation: DropIndex) -> None:
         """Apply a DropIndex operation to the state."""
-        model = self.get_model(operation.app_name, operation.model_name)
-        for i, index in enumerate(model["indexes"]):
-            if index.name == operation.index_name:
-                del model["indexes"][i]
-                return
-
-        raise KeyError(
-            f"Index {operation.index_name} not found in {operation.model_name}"
+        model = self._mutable_model(operation.app_name, operation.model_name)
+        if operation.index_name not in model["indexes"]:
+            raise KeyError(
+                f"Index {operation.index_name} not found in {operation.model_name}"
+            )
+        del model["indexes"][operation.index_name]
+
+    def fingerprint(self) -> str:
+        """
+        Get the fingerprint of the schema.
+
+        States with the same fingerprint have the same schema, apps without models aside.
+        See `tortoise_pathway.fingerprint` for details.
+        """
+        return hash_tree(
+            {
+                app_name: self.app_fingerprint(app_name)
+                for app_name, app in self._schema.items()
+                if app["models"]
+            }
         )
 
+    def app_fingerprint(self, app_name: str) -> str:
+        """Get the fingerprint of the models of the app."""
+        return hash_tree(
+            {
+                model_name: self.model_fingerprint(app_name, model_name)
+                for model_name in self._get_app_models(app_name)
+            }
+        )
+
+    def model_fingerprint(self, app_name: str, model_name: str) -> str:
+        """Get the fingerprint of the model. Fingerprints are cached until the model changes."""
+        model = self.get_model(app_name, model_name)
+        cached = self._fingerprints.get(id(model))
+        if cached is None:
+            cached = (model, hash_model(model))
+            self._fingerprints[id(model)] = cached
+        return cached[1]
+
     def get_schema(self) -> Schema:
         """Get the entire schema representation."""
         return self._schema
@@ -258,9 +497,9 @@ class State:
         """
         return self._schema[app_name]["models"][model_name]["table"]
 
-    def get_field(self, app_name: str, model_name: str, field_name: str) -> Field:
+    def get_field(self, app_name: str, model_name: str, field_name: str) -> FieldSpec:
         """
-        Get the field object for a specific field.
+        Get the field spec for a specific field. Use FieldSpec.to_field() to get a Field object.
         """
         fields = self.get_fields(app_name, model_name)
         if field_name not in fields:
@@ -271,13 +510,22 @@ class State:
         """
         Get the Index object by name.
         """
+        indexes = self.get_indexes(app_name, model_name)
+        if index_name not in indexes:
+            raise KeyError(f"Index {index_name} not found in {model_name}")
+        return indexes[index_name]
+
+    def get_indexes(self, app_name: str, model_name: str) -> Dict[str, Index]:
+        """
+        Get all indexes for a specific model.
+
+        Returns:
+            Dictionary mapping index names to Index objects, in the order they were added.
+        """
         model = self.get_model(app_name, model_name)
-        for index in model["indexes"]:
-            if index.name == index_name:
-                return index
-        raise KeyError(f"Index {index_name} not found in {model_name}")
+        return model.get("indexes", {})
 
-    def get_fields(self, app_name: str, model_name: str) -> Dict[str, Field]:
+    def get_fields(self, app_name: str, model_name: str) -> Dict[str, FieldSpec]:
         """
         Get all fields for a specific model.
 
@@ -285,7 +533,7 @@ class State:
             model_name: The model name.
 
         Returns:
-            Dictionary mapping field names to Field objects, or None if model not found.
+            Dictionary mapping field names to FieldSpecs.
         """
         model = self.get_model(app_name, model_name)
         return model["fields"]
@@ -313,3 +561,29 @@ class State:
             pass  # Fall back to using field name as column name
 
         return field_name
+
+
+State.register_operation(CreateModel, State._apply_create_model)
+State.register_operation(DropModel, State._apply_drop_model)
+State.register_operation(RenameModel, State._apply_rename_model)
+State.register_operation(AddField, State._apply_add_field)
+State.register_operation(BackfillField, State._apply_backfill_field)
+State.register_operation(DropField, State._apply_drop_field)
+State.register_operation(AlterField, State._apply_alter_field)
+State.register_operation(RenameField, State._apply_rename_field)
+State.register_operation(AddIndex, State._apply_add_index)
+State.register_operation(DropIndex, State._apply_drop_index)
+
+
+@State.register_operation(RunSQL)
+def _apply_run_sql(state: State, operation: RunSQL) -> None:
+    # the effect of raw SQL on the schema is unknown
+    pass
+
+
+def _apply_unknown_operation(state: State, operation: Operation) -> None:
+    pass
+
+
+def _field_specs(fields: Mapping[str, "Field | FieldSpec"]) -> Dict[str, FieldSpec]:
+    return {name: FieldSpec.from_field(field) for name, field in fields.items()}
@@ -0,0 +1,125 @@
+"""
+On-disk cache of the State replayed from migrations.
+
+Replaying every operation of every migration is the most expensive part of
+initializing the migration manager. This module stores the replayed State together
+with the content hashes of the migrations it was built from, so that the replay can
+be skipped when the migration files are unchanged, or resumed when new migrations
+were only appended.
+"""
+
+import os
+import pickle
+from pathlib import Path
+from typing import Sequence, Type
+
+from tortoise_pathway.migration import Migration
+from tortoise_pathway.state import State
+
+STATE_CACHE_FILE = ".state_cache.pickle"
+
+# Bump when the pickled structure of State changes.
+CACHE_VERSION = 7
+
+CacheKey = tuple[str, str, str]
+
+
+class StateCache:
+    """
+    A pickled State keyed by the (app, name, checksum) of every replayed migration.
+
+    Args:
+        path: The path to the cache file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._keys: list[CacheKey] = []
+        self._state: State | None = None
+        self._checksums: dict[Type[Migration], CacheKey] = {}
+        self._loaded = False
+
+    def load(self) -> None:
+        """Load the cache file. A missing, outdated or corrupted file is treated as empty."""
+        self._loaded = True
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            # the cache is an optimization only, any failure to read it means a cache miss
+            return
+
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return
+
+        self._keys = data["keys"]
+        self._state = data["state"]
+
+    def restore(self, migrations: Sequence[Type[Migration]]) -> tuple[State, int]:
+        """
+        Restore the state for the longest cached prefix of the migrations.
+
+        Args:
+            migrations: The migrations in the order they are replayed.
+
+        Returns:
+            A tuple of the restored state and the number of migrations it already includes.
+        """
+        if not self._loaded:
+            self.load()
+
+        if self._state is None:
+            return State(), 0
+
+        count = 0
+        for cached_key, migration in zip(self._keys, migrations):
+            if cached_key != self._key(migration):
+                break
+            count += 1
+
+        return self._state.rewind(count), count
+
+    def save(self, migrations: Sequence[Type[Migration]], state: State) -> None:
+        """
+        Save the state replayed from the migrations, unless it is already cached. A state
+        that can't be written is not cached.
+
+        Args:
+            migrations: The migrations in the order they were replayed.
+            state: The state with a snapshot taken after every migration.
+        """
+        keys = [self._key(migration) for migration in migrations]
+        if keys == self._keys:
+            return
+
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {"version": CACHE_VERSION, "keys": keys, "state": state},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            # replace atomically so that concurrent readers never see a partial file
+            os.replace(tmp_path, self.path)
+        except Exception:
+            # e.g. a field with a lambda default can't be pickled, like a failure to read
+            # the cache, a failure to write it only means the next run replays again
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        self._keys = keys
+        self._state = state
+
+    def _key(self, migration: Type[Migration]) -> CacheKey:
+        if migration not in self._checksums:
+            self._checksums[migration] = (
+                migration.app_name or "",
+                migration.name(),
+                migration.checksum(),
+            )
+        return self._checksums[migration]